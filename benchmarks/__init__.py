@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of pyrigate's hot paths.
+
+Run all benchmarks with 'python -m benchmarks' from the repository root.
+Pins are simulated, so the benchmarks also run away from a raspberry pi.
+Results are written as JSON so that runs on the same machine can be
+compared to catch regressions, see 'python -m benchmarks --help'.
+
+"""
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""Run pyrigate's benchmarks and compare the results with an earlier run."""
+
+import json
+import sys
+
+import docopt
+
+import benchmarks.bench_config  # noqa: F401
+import benchmarks.bench_import  # noqa: F401
+import benchmarks.bench_log  # noqa: F401
+import benchmarks.bench_printing  # noqa: F401
+import benchmarks.bench_scheduler  # noqa: F401
+import benchmarks.bench_sensors  # noqa: F401
+import benchmarks.bench_units  # noqa: F401
+from benchmarks.harness import BENCHMARKS, compare, report, run, stderr
+
+
+def parse_commandline():
+    options = """Run with 'python -m benchmarks' from the repository root.
+
+    Usage:
+        benchmarks [options] [<benchmark>...]
+        benchmarks --list
+
+    Options:
+        -h, --help              Display this help message.
+        --list                  List the available benchmarks.
+        -o, --output <path>     Write the results as JSON to a file instead
+                                of stdout.
+        -c, --compare <path>    Compare the results with those of an earlier
+                                run and exit with status 1 on regressions.
+                                Results over their budget always exit with
+                                status 1.
+        -t, --threshold <frac>  Relative change counted as a regression
+                                [default: 0.1].
+        -r, --repeat <n>        Repeat each measurement n times and keep the
+                                best [default: 5].
+        -q, --quick             Use smaller sizes, e.g. on a Pi Zero.
+
+    """
+
+    return docopt.docopt(options)
+
+
+def main():
+    args = parse_commandline()
+
+    if args['--list']:
+        for name, func in BENCHMARKS:
+            print('{0:<12}{1}'.format(name, sys.modules[func.__module__]
+                                      .__doc__.strip()))
+
+        return 0
+
+    names = set(args['<benchmark>'])
+    unknown = names - {name for name, _ in BENCHMARKS}
+
+    if unknown:
+        stderr('Unknown benchmark(s): {0}', ', '.join(sorted(unknown)))
+        return 2
+
+    measured = run(names, args['--quick'], int(args['--repeat']))
+    results = report(measured, args['--quick'])
+    text = json.dumps(results, indent=2)
+
+    if args['--output']:
+        with open(args['--output'], 'w') as fh:
+            fh.write(text + '\n')
+    else:
+        print(text)
+
+    over_budget = [result for result in measured if result.over_budget]
+
+    for result in over_budget:
+        stderr('{0} is over budget: {1:.6g}{2} (budget {3:.6g}{2})',
+               result.name, result.value, result.unit, result.budget)
+
+    if not args['--compare']:
+        return 1 if over_budget else 0
+
+    with open(args['--compare']) as fh:
+        baseline = json.load(fh)
+
+    regressions = 0
+
+    for name, old, new, change, regressed in compare(
+            baseline, results, float(args['--threshold'])):
+        regressions += regressed
+        stderr('{0:<40}{1:>14.6g}{2:>14.6g}{3:>+9.1%}{4}', name, old, new,
+               change, '  REGRESSION' if regressed else '')
+
+    return 1 if regressions or over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""Loading and validating plant configurations."""
+
+import json
+import os
+
+from benchmarks.harness import benchmark, quiet
+from pyrigate.config import PlantConfiguration
+from pyrigate.main_controller import MainController
+from pyrigate.validation import plant_configuration_schema
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+            'saturday', 'sunday')
+
+
+def make_config(index):
+    """Return a valid plant configuration with a few schedules."""
+    return {
+        'name': 'plant-{0}'.format(index),
+        'description': 'Benchmark plant {0}'.format(index),
+        'scheme': {
+            'pump': 'main',
+            'amount': '{0}dl'.format(index % 9 + 1),
+            'when': [
+                {
+                    'on': WEEKDAYS[index % len(WEEKDAYS)],
+                    'at': ['07:30', '19:45'],
+                },
+                {
+                    'each': 'day',
+                    'at': ['{0:02d}:00'.format(index % 24)],
+                },
+            ],
+        },
+    }
+
+
+def write_configs(directory, count):
+    os.makedirs(directory)
+
+    for index in range(count):
+        path = os.path.join(directory, 'plant-{0}.json'.format(index))
+
+        with open(path, 'w') as fh:
+            json.dump(make_config(index), fh)
+
+
+@benchmark('config')
+def config_benchmarks(context):
+    counts = context.scale((1, 10, 100, 1000), (1, 10, 100))
+
+    config = make_config(0)
+    context.rate('validate', lambda: plant_configuration_schema.validate(
+        config), context.scale(2000, 200), unit='configs/s')
+
+    write_configs(context.path('single'), 1)
+    path = context.path('single', 'plant-0.json')
+    context.rate('parse', lambda: PlantConfiguration(path),
+                 context.scale(2000, 200), unit='configs/s')
+
+    # Loading a directory also walks it, logs each config and checks for
+    # duplicate names, as on start-up
+    for count in counts:
+        directory = context.path('configs-{0}'.format(count))
+        write_configs(directory, count)
+
+        def load():
+            controller = MainController({'-v': 0,
+                                         '--no-load-configs': False})
+
+            with quiet():
+                controller.load_configs(directory)
+
+        number = max(1, context.scale(2000, 200) // count)
+        seconds = context.measure(load, number) / number
+        context.record('load', count / seconds, 'configs/s', files=count)
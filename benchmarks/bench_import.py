@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""Start-up time of fresh interpreters importing pyrigate."""
+
+import os
+import re
+import subprocess
+import sys
+import time
+
+import pyrigate
+from benchmarks.harness import benchmark
+
+# Budgets in bare interpreter start-ups, so that they hold on any machine.
+# A Pi Zero starts Python an order of magnitude slower than a desktop, and
+# the budgets keep 'pyrigate --version' and a full start-up proportionally
+# fast there as well
+VERSION_BUDGET = 5.0
+CONTROLLER_BUDGET = 8.0
+
+VERSION = """\
+import sys
+sys.argv = ['pyrigate', '--version']
+from pyrigate.main import main
+try:
+    main()
+except SystemExit:
+    pass
+"""
+
+_IMPORTTIME_REGEX = re.compile(
+    r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(.+)$'
+)
+
+
+def environment():
+    """Return the environment of the interpreters to start."""
+    env = dict(os.environ)
+
+    # Start-up on a pi reads cached bytecode, so make sure it is written
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(pyrigate.__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + [path for path in [env.get('PYTHONPATH')] if path]
+    )
+
+    return env
+
+
+def start(code, env, *options):
+    """Run code in a fresh interpreter, returning its run time and stderr."""
+    begin = time.perf_counter()
+    process = subprocess.run([sys.executable] + list(options) + ['-c', code],
+                             env=env, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, universal_newlines=True,
+                             check=True)
+
+    return time.perf_counter() - begin, process.stderr
+
+
+def importtime(code, env):
+    """Return the cumulative import time in seconds of top-level imports."""
+    _, output = start(code, env, '-X', 'importtime')
+    times = {}
+
+    for line in output.splitlines():
+        m = _IMPORTTIME_REGEX.match(line)
+
+        if m and not m.group(3):
+            times[m.group(4)] = int(m.group(2)) / 1e6
+
+    return times
+
+
+@benchmark('import')
+def import_benchmarks(context):
+    env = environment()
+    number = context.scale(10, 3)
+    code = {
+        'baseline': 'pass',
+        'version': VERSION,
+        'controller': 'import pyrigate.main_controller',
+    }
+
+    # Write the bytecode and settings caches before measuring
+    for source in code.values():
+        start(source, env)
+
+    best = {name: min(start(source, env)[0] for _ in range(number))
+            for name, source in code.items()}
+    baseline = best['baseline']
+
+    context.record('baseline', baseline, 's', False)
+    context.record('version', best['version'], 's', False,
+                   budget=VERSION_BUDGET * baseline)
+    context.record('controller', best['controller'], 's', False,
+                   budget=CONTROLLER_BUDGET * baseline)
+
+    # The share of pyrigate itself, without starting the interpreter
+    for module, seconds in sorted(importtime(code['controller'],
+                                             env).items()):
+        if module.startswith('pyrigate'):
+            context.record('importtime', seconds, 's', False, module=module)
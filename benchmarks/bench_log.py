@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+"""Logging and console output."""
+
+from benchmarks.harness import benchmark, quiet
+from pyrigate.log import log, output, setup_logging
+from pyrigate.user_settings import settings
+
+
+@benchmark('log')
+def log_benchmarks(context):
+    number = context.scale(20000, 2000)
+    values = {key: settings[key] for key in ('verbosity', 'logging',
+                                             'log_dir')}
+
+    try:
+        settings['verbosity'] = 1
+
+        # Messages above the verbosity are dropped before formatting
+        context.rate('filtered', lambda: log('Sampled {0}: {1}', 'moisture',
+                                             0.42, verbosity=2), number)
+
+        with quiet():
+            context.rate('output', lambda: output('Sampled {0}: {1}',
+                                                  'moisture', 0.42), number)
+            context.rate('console', lambda: log('Sampled {0}: {1}',
+                                                'moisture', 0.42), number)
+
+            settings['logging'] = True
+            settings['log_dir'] = context.path('logs')
+            setup_logging()
+            context.rate('file', lambda: log('Sampled {0}: {1}',
+                                             'moisture', 0.42), number)
+    finally:
+        settings.update(values)
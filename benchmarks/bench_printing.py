@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+"""Rendering of tables in the command interpreter."""
+
+from benchmarks.harness import benchmark, quiet
+from pyrigate.utils.printing import print_columns
+
+
+@benchmark('printing')
+def printing_benchmarks(context):
+    headers = ['Name', 'Pin', 'Value', 'Rate', 'Last sampled']
+
+    for count in context.scale((100, 1000, 10000), (100, 1000)):
+        rows = [['sensor-{0}'.format(index), index % 40,
+                 round(index * 0.37, 2), '{0:.2f}/min'.format(index % 7),
+                 '2020-01-01 12:00:{0:02d}'.format(index % 60)]
+                for index in range(count)]
+        number = max(1, context.scale(100000, 10000) // count)
+
+        with quiet():
+            seconds = context.measure(lambda: print_columns(rows, headers),
+                                      number)
+
+        context.record('columns', count * number / seconds, 'rows/s',
+                       rows=count)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""Dispatching many due jobs through the schedule and the monitor."""
+
+import datetime
+import time
+
+import schedule
+
+from benchmarks.harness import benchmark, median, percentile
+from pyrigate.jobs import Job
+
+
+class BenchmarkJob(Job):
+    """A job that only records when it was dispatched."""
+
+    def __init__(self, index, starts):
+        super().__init__()
+        self._index = index
+        self._starts = starts
+
+    def schedule(self):
+        self._do(schedule.every(1).hours)
+        self._running = True
+
+    @property
+    def name(self):
+        return 'benchmark-{0}'.format(self._index)
+
+    @property
+    def tag(self):
+        return 'benchmark-job'
+
+    def task(self):
+        self._starts.append(time.time())
+        self._runs += 1
+
+
+@benchmark('scheduler')
+def scheduler_benchmarks(context):
+    count = context.scale(10000, 1000)
+    starts = []
+    jobs = [BenchmarkJob(index, starts) for index in range(count)]
+
+    for job in jobs:
+        job.schedule()
+
+    try:
+        # A tick of the schedule thread when nothing is due
+        context.rate('idle_tick', schedule.run_pending, context.scale(200, 20),
+                     unit='ticks/s', jobs=count)
+
+        dispatched, lags = [], []
+
+        for _ in range(context.repeat):
+            # Make every job due at once, as after a long blocking job
+            due = datetime.datetime.now()
+
+            for job in schedule.get_jobs('benchmark-job'):
+                job.next_run = due
+
+            del starts[:]
+            start = time.perf_counter()
+            schedule.run_pending()
+            seconds = time.perf_counter() - start
+
+            dispatched.append(len(starts) / seconds)
+            lags.extend(started - due.timestamp() for started in starts)
+
+        context.record('dispatch', max(dispatched), 'jobs/s', jobs=count)
+        context.record('lag.median', median(lags), 's', False, jobs=count)
+        context.record('lag.p99', percentile(lags, 99), 's', False,
+                       jobs=count)
+        context.record('lag.max', max(lags), 's', False, jobs=count)
+    finally:
+        schedule.clear('benchmark-job')
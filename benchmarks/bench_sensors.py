@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""Reading and sampling sensors on simulated pins."""
+
+import types
+
+from benchmarks.harness import benchmark
+from pyrigate.jobs import SensorSamplingJob
+from pyrigate.sensors.calibration import CalibrationTable
+from pyrigate.sensors.moisture import MoistureSensor
+
+
+@benchmark('sensors')
+def sensor_benchmarks(context):
+    number = context.scale(20000, 2000)
+
+    # A threshold of zero is never triggered by simulated (low) pins, so
+    # no alerts are sent
+    sensor = MoistureSensor('moisture', 5, 0, False)
+    context.rate('read', sensor.read, number, unit='reads/s')
+
+    calibrated = MoistureSensor(
+        'calibrated', 6, 0, True,
+        calibration=CalibrationTable([(0, 100.), (1023, 0.)])
+    )
+    context.rate('read_calibrated', calibrated.read, number, unit='reads/s')
+
+    # A sample also updates the sampler, metrics, statistics and history
+    context.rate('sample', sensor.sample, number, unit='samples/s')
+
+    # Most ticks of the sampling job find no sensor due
+    sensors = {
+        'sensor-{0}'.format(pin): MoistureSensor('sensor-{0}'.format(pin),
+                                                 pin, 0, False)
+        for pin in range(10, 20)
+    }
+
+    for each in sensors.values():
+        each.sampler.update(each.read())
+
+    job = SensorSamplingJob(types.SimpleNamespace(sensors=sensors))
+    context.rate('idle_tick', job.task, number, unit='ticks/s',
+                 sensors=len(sensors))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+"""Parsing of volumes, flow rates and durations."""
+
+from benchmarks.harness import benchmark
+from pyrigate.units import parse_duration, parse_flow_rate, parse_volume
+
+PARSERS = (
+    ('volume', parse_volume, ('0.1dl', '1.5 L', '250ml', '3 cl')),
+    ('flow_rate', parse_flow_rate, ('1.2L/min', '15 ml / s', '0.5l/h')),
+    ('duration', parse_duration, ('30s', '2 min', '1.5h', '250ms')),
+)
+
+
+@benchmark('units')
+def units_benchmarks(context):
+    number = context.scale(20000, 2000)
+
+    for name, parser, strings in PARSERS:
+        # Settings and configurations repeat the same few strings, which
+        # hit the cache, while the uncached parser shows the cost of a miss
+        uncached = parser.__wrapped__
+
+        def cached():
+            for string in strings:
+                parser(string)
+
+        def parse():
+            for string in strings:
+                uncached(string)
+
+        for label, func in (('cached', cached), ('uncached', parse)):
+            seconds = context.measure(func, number)
+            context.record('{0}.{1}'.format(name, label),
+                           number * len(strings) / seconds, 'parses/s')
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+"""Timing, results and comparison of benchmark runs."""
+
+import contextlib
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import pyrigate
+import pyrigate.gpio as gpio
+from pyrigate.gpio.simulator import SimulatorBackend
+from pyrigate.user_settings import settings
+
+FORMAT_VERSION = 1
+
+# Benchmark functions in the order they were registered
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Register a function as a benchmark.
+
+    The function is called with a Context and reports its results through
+    it.
+
+    """
+    def decorator(func):
+        BENCHMARKS.append((name, func))
+        return func
+
+    return decorator
+
+
+class Result:
+    """A single measured value."""
+
+    def __init__(self, name, value, unit, higher_is_better=True,
+                 params=None, budget=None):
+        self.name = name
+        self.value = value
+        self.unit = unit
+        self.higher_is_better = higher_is_better
+        self.params = params or {}
+        self.budget = budget
+
+    @property
+    def over_budget(self):
+        """Return True if the value is worse than its budget, if any."""
+        if self.budget is None:
+            return False
+
+        if self.higher_is_better:
+            return self.value < self.budget
+
+        return self.value > self.budget
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'value': self.value,
+            'unit': self.unit,
+            'higher_is_better': self.higher_is_better,
+            'params': self.params,
+            'budget': self.budget,
+        }
+
+
+def measure(func, number, repeat=5):
+    """Return the best time in seconds of calling func number times.
+
+    The best of several repeats is the least disturbed by other processes
+    and is what runs should be compared on.
+
+    """
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+
+        for _ in range(number):
+            func()
+
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of some values."""
+    values = sorted(values)
+
+    if not values:
+        return None
+
+    index = min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))
+
+    return values[index]
+
+
+class Context:
+    """Passed to benchmarks to scale them and collect their results."""
+
+    def __init__(self, directory, quick=False, repeat=5):
+        self.directory = directory
+        self.quick = quick
+        self.repeat = repeat
+        self.results = []
+        self._prefix = ''
+
+    def scale(self, full, quick):
+        """Return a size depending on whether this is a quick run."""
+        return quick if self.quick else full
+
+    def measure(self, func, number):
+        return measure(func, number, self.repeat)
+
+    def rate(self, name, func, number, unit='calls/s', **params):
+        """Measure calls of func per second and record it."""
+        seconds = self.measure(func, number)
+
+        return self.record(name, number / seconds, unit, True, **params)
+
+    def record(self, name, value, unit, higher_is_better=True, budget=None,
+               **params):
+        result = Result(self._prefix + name, value, unit, higher_is_better,
+                        params, budget)
+        self.results.append(result)
+
+        return result
+
+    @contextlib.contextmanager
+    def group(self, name):
+        """Prefix the names of results recorded in the block."""
+        self._prefix = name + '.'
+
+        try:
+            yield
+        finally:
+            self._prefix = ''
+
+    def path(self, *parts):
+        """Return a path in the benchmark's scratch directory."""
+        return os.path.join(self.directory, *parts)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Send console output to the null device, e.g. from benchmarked logs.
+
+    colorise binds sys.stdout when it is imported, so the file descriptors
+    are redirected rather than sys.stdout and sys.stderr.
+
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = [os.dup(1), os.dup(2)]
+    null = os.open(os.devnull, os.O_WRONLY)
+
+    try:
+        os.dup2(null, 1)
+        os.dup2(null, 2)
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+
+        for fd in saved + [null]:
+            os.close(fd)
+
+
+@contextlib.contextmanager
+def environment():
+    """Run in a scratch directory with simulated pins and no output.
+
+    All relative paths in the settings, such as those of the history and
+    statistics, end up in the scratch directory which is removed afterwards.
+
+    """
+    cwd = os.getcwd()
+    values = {key: settings[key] for key in ('verbosity', 'logging')}
+    backend = gpio.backend()
+
+    with tempfile.TemporaryDirectory(prefix='pyrigate-bench-') as directory:
+        os.chdir(directory)
+        gpio.use_backend(SimulatorBackend())
+        settings['verbosity'] = 0
+        settings['logging'] = False
+
+        try:
+            yield directory
+        finally:
+            os.chdir(cwd)
+            gpio.use_backend(backend)
+            settings.update(values)
+
+
+def run(names=None, quick=False, repeat=5):
+    """Run benchmarks, all by default, and return the results."""
+    results = []
+
+    with environment() as directory:
+        for name, func in BENCHMARKS:
+            if names and name not in names:
+                continue
+
+            scratch = os.path.join(directory, name)
+            os.makedirs(scratch)
+            context = Context(scratch, quick, repeat)
+
+            with context.group(name):
+                func(context)
+
+            results.extend(context.results)
+
+    return results
+
+
+def machine():
+    """Return a description of the machine the benchmarks ran on."""
+    # Like pyrigate.all_versions, only look for a raspberry pi on one
+    return {
+        'pyrigate': pyrigate.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'raspberry_pi': None if gpio.mocked() else pyrigate.rpi_specs(),
+    }
+
+
+def report(results, quick=False):
+    """Return the JSON-serialisable report of a run."""
+    return {
+        'format': FORMAT_VERSION,
+        'timestamp': time.time(),
+        'quick': quick,
+        'machine': machine(),
+        'results': [result.to_dict() for result in results],
+    }
+
+
+def result_key(result):
+    """Return the name of a reported result with its parameters, if any."""
+    params = result['params']
+
+    if not params:
+        return result['name']
+
+    return '{0}[{1}]'.format(result['name'], ','.join(
+        '{0}={1}'.format(name, params[name]) for name in sorted(params)
+    ))
+
+
+def compare(baseline, current, threshold=0.1):
+    """Compare the results of two reports.
+
+    Returns (key, baseline value, current value, relative change,
+    regressed) for each result found in both. The change is positive when
+    the current run is better, and a result regressed if it got worse by
+    more than the threshold.
+
+    """
+    old = {result_key(result): result for result in baseline['results']}
+    rows = []
+
+    for result in current['results']:
+        key = result_key(result)
+        previous = old.get(key)
+
+        if previous is None or not previous['value']:
+            continue
+
+        change = (result['value'] - previous['value']) / previous['value']
+
+        if not result['higher_is_better']:
+            change = -change
+
+        rows.append((key, previous['value'], result['value'],
+                     change, change < -threshold))
+
+    return rows
+
+
+def median(values):
+    return statistics.median(values) if values else None
+
+
+def stderr(msg, *args):
+    sys.stderr.write(msg.format(*args) + '\n')
@@ -1,14 +1,18 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-"""Core module for pyrigate."""
+"""Core module for pyrigate.
 
+Submodules are not imported here so that e.g. 'pyrigate --version' does not
+pay for loading the controller, settings and gpio backends.
+
+"""
+
+import functools
 import os
 import re
 import sys
 
-import pyrigate.gpio as gpio
-
 __version__ = '0.1.0'
 __author__ = 'Alexander Asp Bock'
 __license__ = 'MIT'
@@ -46,29 +50,21 @@ _REVISION_TO_MODEL = {
 }
 
 
-def rpi_specs():
-    """Return the specifications of the running Raspberry Pi system.
+_CPUINFO_REGEX = re.compile(r'^(Hardware|Revision)\s+:\s+(.+)$',
+                            re.MULTILINE)
 
-    Currently attempts to find the hardware, version and model of the Raspberry
-    Pi. Unknown or unavailable values are given as 'unknown'.
 
-    """
-    specs = {k: 'unknown' for k in ('hardware', 'version', 'model')}
-    regexes = [('hardware', re.compile(r'^Hardware\s+:\s+(.+)$')),
-               ('revision', re.compile(r'^Revision\s+:\s+(.+)$'))]
+@functools.lru_cache(maxsize=None)
+def _read_rpi_specs():
+    specs = {k: 'unknown' for k in ('hardware', 'revision', 'version',
+                                    'model')}
 
     if os.path.isfile('/proc/cpuinfo'):
         with open('/proc/cpuinfo', 'r') as fh:
-            for line in fh:
-                for key, regex in regexes:
-                    m = regex.match(line)
+            for key, value in _CPUINFO_REGEX.findall(fh.read()):
+                specs[key.lower()] = value
 
-                    if m:
-                        specs[key] = m.group(1)
-
-        try:
-            ['BCM2708', 'BCM2709', 'BCM2835'].index(specs['hardware'])
-        except IndexError:
+        if specs['hardware'] not in ('BCM2708', 'BCM2709', 'BCM2835'):
             specs['number'] = 'unknown'
 
         if os.path.isfile('/proc/device-tree/model'):
@@ -87,14 +83,27 @@ def rpi_specs():
     return specs
 
 
+def rpi_specs():
+    """Return the specifications of the running Raspberry Pi system.
+
+    Currently attempts to find the hardware, version and model of the Raspberry
+    Pi. Unknown or unavailable values are given as 'unknown'. The hardware
+    does not change while running, so it is only looked up once.
+
+    """
+    return dict(_read_rpi_specs())
+
+
 def all_versions():
     """Return a string with the current pyrigate, Python and RPi versions."""
+    import pyrigate.gpio as gpio
+
     msg = 'pyrigate v{0}, Python {1}, Raspberry Pi '
-    specs = rpi_specs()
 
     if gpio.mocked():
         msg += '(mocked)'
     else:
+        specs = rpi_specs()
         msg += '{0} ({1})'.format(specs['version'], specs['model'])
 
     return msg.format(__version__,
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+
+"""Isolated real-time actuation process.
+
+When enabled, a separate process owns all output pins. It runs with an
+elevated scheduling priority if permitted and enforces pump deadlines itself,
+so pumps are switched off on time even if the main process is held up by
+garbage collection, sending email or a slow job.
+
+The main process sends commands through a single-producer, single-consumer
+ring buffer in shared memory. A pipe is only used as a doorbell to wake the
+actuator up. When the main process dies the pipe is closed and the actuator
+returns all output pins to their initial values.
+
+"""
+
+import multiprocessing
+import os
+import signal
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+from pyrigate.gpio.backend import OUT, PUD_OFF, GpioBackend, ShadowRegister
+from pyrigate.log import log
+
+# Head (next command to write) and tail (next command to read)
+_HEADER = struct.Struct('<QQ')
+_INDEX = struct.Struct('<Q')
+
+# Sequence number, op, pin, value, final value and deadline
+_COMMAND = struct.Struct('<Qiiiiq')
+
+OP_SETUP = 1
+OP_OUTPUT = 2
+OP_OUTPUT_FOR = 3
+OP_STOP = 4
+
+_NO_INITIAL = -1
+
+
+class ActuatorError(Exception):
+    pass
+
+
+class CommandRing:
+    """Single-producer, single-consumer ring of commands in shared memory.
+
+    Only the producer writes the head and only the consumer writes the tail.
+    Each command carries its sequence number so the consumer never reads a
+    command before it has been written completely.
+
+    """
+
+    def __init__(self, capacity=256, name=None):
+        """Create a new ring or attach to an existing one by name."""
+        self.capacity = capacity
+        self._owner = name is None
+
+        if self._owner:
+            size = _HEADER.size + capacity * _COMMAND.size
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            _HEADER.pack_into(self._shm.buf, 0, 0, 0)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def __len__(self):
+        head, tail = _HEADER.unpack_from(self._shm.buf, 0)
+
+        return head - tail
+
+    def _offset(self, index):
+        return _HEADER.size + (index % self.capacity) * _COMMAND.size
+
+    def push(self, op, pin=0, value=0, final=0, deadline_ns=0):
+        """Append a command, returning False if the ring is full."""
+        buf = self._shm.buf
+        head, tail = _HEADER.unpack_from(buf, 0)
+
+        if head - tail >= self.capacity:
+            return False
+
+        _COMMAND.pack_into(buf, self._offset(head), head + 1, op, pin, value,
+                           final, deadline_ns)
+
+        # Publish the command only once it has been written
+        _INDEX.pack_into(buf, 0, head + 1)
+
+        return True
+
+    def pop(self):
+        """Remove and return the next command or None if there is none.
+
+        Commands are (op, pin, value, final, deadline_ns) tuples.
+
+        """
+        buf = self._shm.buf
+        head, tail = _HEADER.unpack_from(buf, 0)
+
+        if head == tail:
+            return None
+
+        sequence, *command = _COMMAND.unpack_from(buf, self._offset(tail))
+
+        if sequence != tail + 1:
+            return None
+
+        _INDEX.pack_into(buf, _INDEX.size, tail + 1)
+
+        return tuple(command)
+
+    def close(self):
+        """Detach from the ring and remove it if this process created it."""
+        self._shm.close()
+
+        if self._owner:
+            self._shm.unlink()
+
+
+def raise_priority(priority):
+    """Raise the priority of this process as far as permitted.
+
+    Returns a description of the resulting scheduling policy.
+
+    """
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+
+        return 'SCHED_FIFO priority {0}'.format(priority)
+    except (AttributeError, OSError):
+        pass
+
+    try:
+        os.nice(-10)
+
+        return 'nice -10'
+    except OSError:
+        return 'normal priority'
+
+
+class Actuator:
+    """Owner of all output pins in the actuation process."""
+
+    def __init__(self, ring, doorbell, backend, clock=time.monotonic_ns,
+                 spin_window=0.002):
+        self._ring = ring
+        self._doorbell = doorbell
+        self._register = ShadowRegister(backend)
+        self._clock = clock
+        self._spin_window_ns = int(spin_window * 1e9)
+        self._initial = {}
+        self._deadlines = {}
+
+    def handle(self, op, pin, value, final, deadline_ns):
+        """Handle a command, returning False if asked to stop."""
+        if op == OP_SETUP:
+            initial = None if value == _NO_INITIAL else value
+            self._register.setup(pin, OUT, initial=initial)
+
+            if initial is not None:
+                self._initial[pin] = initial
+        elif op == OP_OUTPUT:
+            self._deadlines.pop(pin, None)
+            self._register.output(pin, value)
+        elif op == OP_OUTPUT_FOR:
+            self._deadlines[pin] = (deadline_ns, final)
+            self._register.output(pin, value)
+        elif op == OP_STOP:
+            return False
+
+        return True
+
+    def _expire(self):
+        now = self._clock()
+
+        with self._register.batch():
+            for pin, (deadline_ns, final) in list(self._deadlines.items()):
+                if deadline_ns <= now:
+                    del self._deadlines[pin]
+                    self._register.output(pin, final)
+
+    def _drain(self):
+        with self._register.batch():
+            while True:
+                command = self._ring.pop()
+
+                if command is None:
+                    return True
+
+                if not self.handle(*command):
+                    return False
+
+    def run(self):
+        """Handle commands and deadlines until stopped or orphaned."""
+        try:
+            while True:
+                self._expire()
+                timeout = None
+
+                if self._deadlines:
+                    next_ns = min(d for d, _ in self._deadlines.values())
+                    timeout_ns = next_ns - self._clock()
+
+                    if timeout_ns <= self._spin_window_ns:
+                        while self._clock() < next_ns:
+                            pass
+
+                        continue
+
+                    timeout = (timeout_ns - self._spin_window_ns) / 1e9
+
+                if self._doorbell.poll(timeout):
+                    # Raises EOFError if the main process died
+                    while self._doorbell.poll(0):
+                        self._doorbell.recv_bytes()
+
+                if not self._drain():
+                    break
+        except (EOFError, OSError, SystemExit):
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Write the final value of pending deadlines and initial values."""
+        values = {pin: final for pin, (_, final) in self._deadlines.items()}
+        values.update(self._initial)
+        self._deadlines.clear()
+
+        self._register.output_many(values)
+        self._register.backend.cleanup()
+
+
+def _terminate(signum, frame):
+    raise SystemExit()
+
+
+def _actuator_main(ring_name, capacity, doorbell, native, chip, expander,
+                   priority):
+    from pyrigate.gpio import create_backend
+
+    # A daemonised main process blocks these signals in all its threads, and
+    # the blocked mask is inherited
+    signal.pthread_sigmask(signal.SIG_UNBLOCK,
+                           (signal.SIGINT, signal.SIGTERM))
+
+    # The main process handles ctrl-c and stops the actuator itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _terminate)
+
+    policy = raise_priority(priority)
+    ring = CommandRing(capacity, name=ring_name)
+    backend = create_backend(native, chip)
+
+    if expander:
+        from pyrigate.gpio.expander import create_expander
+        backend = create_expander(expander, backend)
+
+    backend.init()
+    doorbell.send(policy)
+
+    try:
+        Actuator(ring, doorbell, backend).run()
+    finally:
+        ring.close()
+
+
+class ActuatorBackend(GpioBackend):
+    """Gpio backend that sends output pin commands to an actuator process.
+
+    Inputs and edge detection stay in this process using the native backend.
+
+    """
+
+    name = 'actuator'
+    supports_batch = True
+    enforces_deadlines = True
+
+    def __init__(self, native='auto', chip='/dev/gpiochip0', expander=None,
+                 priority=50, capacity=256, timeout=10.0):
+        from pyrigate.gpio import create_backend
+
+        self._native = create_backend(native, chip)
+        self._args = (native, chip, expander, priority)
+        self._capacity = capacity
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._ring = None
+        self._doorbell = None
+        self._process = None
+        self.mocked = self._native.mocked
+        self.policy = None
+        self.overruns = 0
+
+    @property
+    def process(self):
+        return self._process
+
+    def init(self):
+        self._native.init()
+
+        context = multiprocessing.get_context('spawn')
+        self._ring = CommandRing(self._capacity)
+        self._doorbell, child_doorbell = context.Pipe()
+        self._process = context.Process(
+            target=_actuator_main,
+            args=(self._ring.name, self._capacity, child_doorbell) +
+            self._args,
+            name='pyrigate-actuator',
+            daemon=True
+        )
+        self._process.start()
+        child_doorbell.close()
+
+        if not self._doorbell.poll(self._timeout):
+            self._stop()
+            raise ActuatorError('Actuator process failed to start')
+
+        self.policy = self._doorbell.recv()
+        log("Actuator process {0} running with {1}", self._process.pid,
+            self.policy, verbosity=2)
+
+    def _send(self, commands):
+        if self._process is None:
+            raise ActuatorError('Actuator process is not running')
+
+        with self._lock:
+            for command in commands:
+                # Wait for the actuator to make room if the ring is full
+                deadline = time.monotonic() + self._timeout
+
+                while not self._ring.push(*command):
+                    self.overruns += 1
+
+                    if not self._process.is_alive() or\
+                            time.monotonic() > deadline:
+                        raise ActuatorError('Actuator process is not '
+                                            'responding')
+
+                    self._doorbell.send_bytes(b'\0')
+                    time.sleep(0.001)
+
+            self._doorbell.send_bytes(b'\0')
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF, initial=None):
+        if direction == OUT:
+            self._send([(OP_SETUP, pin,
+                         _NO_INITIAL if initial is None else initial)])
+        else:
+            self._native.setup(pin, direction, pull_up_down=pull_up_down,
+                               initial=initial)
+
+    def output(self, pin, value):
+        self._send([(OP_OUTPUT, pin, value)])
+
+    def output_many(self, values):
+        self._send([(OP_OUTPUT, pin, value) for pin, value in values.items()])
+
+    def output_for(self, pin, value, duration, final):
+        deadline_ns = time.monotonic_ns() + int(duration * 1e9)
+        self._send([(OP_OUTPUT_FOR, pin, value, final, deadline_ns)])
+
+    def input(self, pin):
+        return self._native.input(pin)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self._native.add_event_detect(pin, edge, callback=callback,
+                                      bouncetime=bouncetime)
+
+    def remove_event_detect(self, pin):
+        self._native.remove_event_detect(pin)
+
+    def _stop(self):
+        if self._process is not None:
+            try:
+                self._send([(OP_STOP,)])
+            except (ActuatorError, OSError):
+                pass
+
+            self._process.join(self._timeout)
+
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+
+            self._process = None
+
+        if self._doorbell is not None:
+            self._doorbell.close()
+            self._doorbell = None
+
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+
+    def cleanup(self):
+        self._stop()
+        self._native.cleanup()
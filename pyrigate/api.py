@@ -0,0 +1,558 @@
+# -*- coding: utf-8 -*-
+
+"""Local HTTP/JSON API for the companion app.
+
+The API is served by an asyncio server on its own thread, so it never
+blocks the command loop. Requests are handled by a small pool of worker
+threads, so an endpoint that waits, e.g. for the scheduler to finish a
+tick, or reads a lot of history never stalls the other clients. Connections are kept alive between requests, and
+read endpoints send an ETag so clients can revalidate with If-None-Match
+and get an empty 304 response when nothing changed.
+
+    GET  /configs                   Plant configurations
+    GET  /configs/<name>
+    GET  /jobs                      Scheduled jobs
+    POST /jobs/<name>/start         Start or stop the job of a configuration
+    POST /jobs/<name>/stop
+    POST /schedule/start            Schedule or cancel all jobs
+    POST /schedule/stop
+    GET  /pumps                     Pumps, tank levels and active runs
+    GET  /pumps/<name>
+    POST /pumps/<name>/pump         Pump {"amount": "1dl"}
+    POST /pumps/<name>/cancel       Cancel all runs of a pump
+    GET  /sensors                   Sensors and their last values
+    GET  /sensors/<name>
+    GET  /history?since=<seq>       Waterings and samples after a cursor,
+                                    see pyrigate.history
+
+Responses larger than COMPRESS_MIN_BYTES are gzip-compressed for clients
+that accept it. If a token is configured, every request must carry it in an
+'Authorization: Bearer <token>' header. Without a token, the API is only
+served on loopback addresses.
+
+"""
+
+import asyncio
+import concurrent.futures
+import gzip
+import hashlib
+import hmac
+import ipaddress
+import json
+import re
+import threading
+import urllib.parse
+
+from pyrigate.history import encode_records, get_history
+from pyrigate.log import log, warn
+from pyrigate.units import parse_volume
+
+_REASONS = {
+    200: 'OK',
+    202: 'Accepted',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    409: 'Conflict',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+}
+
+MAX_HEADER_LINES = 100
+
+COMPRESS_MIN_BYTES = 1024
+
+MAX_WORKERS = 4
+
+MAX_HISTORY_RECORDS = 5000
+
+
+class ApiError(Exception):
+    """An error reported to the client with a status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    """A parsed HTTP request."""
+
+    def __init__(self, method, path, query, version, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+
+        return connection != 'close'
+
+    def json(self):
+        """Return the JSON body or an empty dictionary."""
+        if not self.body:
+            return {}
+
+        try:
+            values = json.loads(self.body)
+        except ValueError as ex:
+            raise ApiError(400, 'Invalid JSON body: {0}'.format(ex))
+
+        if not isinstance(values, dict):
+            raise ApiError(400, 'JSON body must be an object')
+
+        return values
+
+
+def etag(body):
+    """Return a strong ETag for a response body."""
+    return '"{0}"'.format(hashlib.blake2b(body, digest_size=12).hexdigest())
+
+
+def is_loopback(host):
+    """Return True if a host only accepts connections from this machine."""
+    if host == 'localhost':
+        return True
+
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class ApiServer:
+    """Serves the API of a main controller from a background thread."""
+
+    def __init__(self, controller, host='127.0.0.1', port=8080, token=None,
+                 keep_alive=15.0, max_body=65536):
+        self._controller = controller
+        self._host = host
+        self._port = port
+        self._token = token
+        self._keep_alive = keep_alive
+        self._max_body = max_body
+        self._loop = None
+        self._server = None
+        self._executor = None
+        self._thread = None
+        self._started = threading.Event()
+        self._error = None
+        self._routes = [
+            ('GET', r'/configs', self.get_configs),
+            ('GET', r'/configs/([^/]+)', self.get_config),
+            ('GET', r'/jobs', self.get_jobs),
+            ('POST', r'/jobs/([^/]+)/(start|stop)', self.post_job),
+            ('POST', r'/schedule/(start|stop)', self.post_schedule),
+            ('GET', r'/pumps', self.get_pumps),
+            ('GET', r'/pumps/([^/]+)', self.get_pump),
+            ('POST', r'/pumps/([^/]+)/pump', self.post_pump),
+            ('POST', r'/pumps/([^/]+)/cancel', self.post_cancel),
+            ('GET', r'/sensors', self.get_sensors),
+            ('GET', r'/sensors/([^/]+)', self.get_sensor),
+            ('GET', r'/history', self.get_history),
+        ]
+        self._routes = [(method, re.compile(pattern + '$'), handler)
+                        for method, pattern, handler in self._routes]
+        self.connections = 0
+        self.requests = 0
+        self.not_modified = 0
+
+    @property
+    def address(self):
+        """Return the bound host and port or None if not serving."""
+        if not self._server:
+            return None
+
+        return self._server.sockets[0].getsockname()[:2]
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start serving, raising OSError if the address cannot be bound.
+
+        Raises ValueError if the host is not a loopback address and no token
+        is set, since anyone on the network could then start the pumps.
+
+        """
+        if self.running:
+            return
+
+        if not self._token and not is_loopback(self._host):
+            raise ValueError("Refusing to serve the API on '{0}' without a "
+                             "token".format(self._host))
+
+        self._started.clear()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='pyrigate-api',
+                                        daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+        if self._error:
+            self._thread.join()
+            self._thread = None
+            raise self._error
+
+        log('Serving API on {0}:{1}', *self.address)
+
+    def stop(self):
+        """Stop serving and close all connections."""
+        if not self.running:
+            return
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        self._loop = loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        try:
+            self._server = loop.run_until_complete(asyncio.start_server(
+                self._serve, self._host, self._port
+            ))
+        except OSError as ex:
+            self._error = ex
+            self._started.set()
+            loop.close()
+            return
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            MAX_WORKERS, thread_name_prefix='pyrigate-api-worker'
+        )
+        self._started.set()
+
+        try:
+            loop.run_forever()
+        finally:
+            self._server.close()
+            self._executor.shutdown(wait=False)
+
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+
+            loop.run_until_complete(asyncio.gather(
+                self._server.wait_closed(),
+                *asyncio.all_tasks(loop),
+                return_exceptions=True
+            ))
+            loop.close()
+            self._server = None
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read(reader),
+                                                     self._keep_alive)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                        ConnectionError):
+                    break
+                except ApiError as ex:
+                    await self._respond(writer, ex.status,
+                                        {'error': str(ex)}, keep_alive=False)
+                    break
+
+                if request is None:
+                    break
+
+                self.requests += 1
+                status, values, headers = await asyncio.get_running_loop()\
+                    .run_in_executor(self._executor, self._handle, request)
+                conditional = request.method in ('GET', 'HEAD')
+                await self._respond(
+                    writer, status, values, headers, request.keep_alive,
+                    head=request.method == 'HEAD',
+                    if_none_match=request.headers.get('if-none-match')
+                    if conditional else None,
+                    gzip_ok='gzip' in request.headers.get('accept-encoding',
+                                                          '')
+                )
+
+                if not request.keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read(self, reader):
+        line = await reader.readline()
+
+        if not line:
+            return None
+
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise ApiError(400, 'Malformed request line')
+
+        headers = {}
+
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+
+            if line in (b'\r\n', b'\n', b''):
+                break
+
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise ApiError(400, 'Too many headers')
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise ApiError(400, 'Invalid Content-Length')
+
+        if length > self._max_body:
+            raise ApiError(413, 'Request body is too large')
+
+        body = await reader.readexactly(length) if length > 0 else b''
+        url = urllib.parse.urlsplit(target)
+
+        return Request(method.upper(), urllib.parse.unquote(url.path),
+                       urllib.parse.parse_qs(url.query), version, headers,
+                       body)
+
+    def _authorized(self, request):
+        if not self._token:
+            return True
+
+        scheme, _, token = request.headers.get('authorization', '')\
+            .partition(' ')
+
+        return scheme.lower() == 'bearer' and\
+            hmac.compare_digest(token.strip(), self._token)
+
+    def _handle(self, request):
+        """Return the status, JSON values and headers of a response."""
+        if not self._authorized(request):
+            return 401, {'error': 'Missing or invalid token'},\
+                {'WWW-Authenticate': 'Bearer'}
+
+        method = 'GET' if request.method == 'HEAD' else request.method
+        allowed = []
+
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(request.path.rstrip('/') or '/')
+
+            if not match:
+                continue
+
+            if route_method != method:
+                allowed.append(route_method)
+                continue
+
+            try:
+                result = handler(request, *match.groups())
+            except ApiError as ex:
+                return ex.status, {'error': str(ex)}, {}
+            except Exception as ex:
+                warn("API request '{0} {1}' failed: {2}", request.method,
+                     request.path, ex)
+                return 500, {'error': 'Internal error'}, {}
+
+            if isinstance(result, tuple):
+                return result[0], result[1], {}
+
+            return 200, result, {}
+
+        if allowed:
+            return 405, {'error': 'Method not allowed'},\
+                {'Allow': ', '.join(sorted(set(allowed)))}
+
+        return 404, {'error': 'Not found'}, {}
+
+    async def _respond(self, writer, status, values, headers=None,
+                       keep_alive=True, head=False, if_none_match=None,
+                       gzip_ok=False):
+        body = json.dumps(values, separators=(',', ':')).encode('utf-8')
+        headers = dict(headers or {})
+        compressed = gzip_ok and len(body) >= COMPRESS_MIN_BYTES
+
+        if compressed:
+            body = gzip.compress(body, compresslevel=6, mtime=0)
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+
+        if status == 200:
+            # Computed from the sent bytes, so each encoding has its own tag
+            tag = etag(body)
+            headers['ETag'] = tag
+            headers['Cache-Control'] = 'no-cache'
+
+            if if_none_match and\
+                    tag in (value.strip() for value in
+                            if_none_match.split(',')) or if_none_match == '*':
+                status, body = 304, b''
+                self.not_modified += 1
+
+        lines = ['HTTP/1.1 {0} {1}'.format(status, _REASONS.get(status, ''))]
+        headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(body))
+        headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+
+        if keep_alive:
+            headers['Keep-Alive'] = 'timeout={0:g}'.format(self._keep_alive)
+
+        lines.extend('{0}: {1}'.format(name, value)
+                     for name, value in headers.items())
+        data = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        writer.write(data if head else data + body)
+        await writer.drain()
+
+    # Endpoints
+
+    def _config(self, name, config):
+        return {
+            'name': name,
+            'description': config.description,
+            'pump': config.scheme['pump'],
+            'zone': config.scheme['zone'],
+            'amount': config.scheme['amount'],
+            'schedule': config.schedule_description,
+            'running': self._controller.is_job_running(name),
+        }
+
+    def get_configs(self, request):
+        return [self._config(name, config)
+                for name, config in self._controller.configs.items()]
+
+    def get_config(self, request, name):
+        config = self._controller.configs.get(name)
+
+        if not config:
+            raise ApiError(404, "No configuration '{0}'".format(name))
+
+        return self._config(name, config)
+
+    def get_jobs(self, request):
+        return [
+            {
+                'name': name,
+                'tag': job.tag,
+                'runs': job.runs,
+                'running': job.running,
+                'schedule': job.description,
+            }
+            for name, job in self._controller.all_jobs.items()
+        ]
+
+    def post_job(self, request, name, action):
+        if name not in self._controller.configs:
+            raise ApiError(404, "No configuration '{0}'".format(name))
+
+        if action == 'start':
+            changed = self._controller.start_job(name)
+        else:
+            changed = self._controller.stop_job(name)
+
+        return {'name': name, 'changed': changed,
+                'running': self._controller.is_job_running(name)}
+
+    def post_schedule(self, request, action):
+        if action == 'start':
+            self._controller.schedule_tasks()
+        else:
+            self._controller.cancel_tasks()
+
+        return {'scheduled': action == 'start'}
+
+    def _pump(self, name, pump):
+        return {
+            'name': name,
+            'pin': pump.pin,
+            'flow_rate': pump.flow_rate,
+            'level': None if pump.tank is None else pump.level,
+            'runs': [{'id': run.id, 'remaining': run.remaining}
+                     for run in pump.runs],
+            'zones': list(pump.zones),
+        }
+
+    def _get_pump(self, name):
+        pump = self._controller.get_pump(name)
+
+        if not pump:
+            raise ApiError(404, "No pump '{0}'".format(name))
+
+        return pump
+
+    def get_pumps(self, request):
+        return [self._pump(name, pump)
+                for name, pump in self._controller.pumps.items()]
+
+    def get_pump(self, request, name):
+        return self._pump(name, self._get_pump(name))
+
+    def post_pump(self, request, name):
+        pump = self._get_pump(name)
+        amount = request.json().get('amount')
+
+        try:
+            volume = parse_volume(str(amount))
+        except ValueError:
+            raise ApiError(400, "Invalid amount '{0}'".format(amount))
+
+        run = pump.pump(volume)
+
+        if run is None:
+            raise ApiError(409, "Pump '{0}' is busy or its tank is empty"
+                           .format(name))
+
+        return 202, {'id': run.id, 'volume': volume}
+
+    def post_cancel(self, request, name):
+        return {'cancelled': self._get_pump(name).cancel()}
+
+    def _sensor(self, name, sensor):
+        return {
+            'name': name,
+            'type': type(sensor).__name__,
+            'analog': sensor.analog,
+            'threshold': sensor.threshold,
+            'rate': sensor.sampler.rate,
+            'last_value': sensor.last_value,
+        }
+
+    def get_sensors(self, request):
+        return [self._sensor(name, sensor)
+                for name, sensor in self._controller.sensors.items()]
+
+    def get_sensor(self, request, name):
+        sensor = self._controller.get_sensor(name)
+
+        if not sensor:
+            raise ApiError(404, "No sensor '{0}'".format(name))
+
+        return self._sensor(name, sensor)
+
+    def get_history(self, request):
+        try:
+            cursor = int(request.query.get('since', ['0'])[0])
+            limit = int(request.query.get('limit',
+                                          [str(MAX_HISTORY_RECORDS)])[0])
+        except ValueError:
+            raise ApiError(400, "'since' and 'limit' must be integers")
+
+        limit = max(1, min(limit, MAX_HISTORY_RECORDS))
+        history = get_history()
+        records, reset = history.since(cursor, limit + 1)
+        more = len(records) > limit
+
+        return encode_records(records[:limit], reset=reset, more=more,
+                              cursor=min(cursor, history.last_seq))
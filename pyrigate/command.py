@@ -3,17 +3,29 @@
 """Interpreter for user-entered commands."""
 
 import cmd
-import colorise
-import importlib
 import shlex
+import time
 
 import pyrigate
 import pyrigate.gpio as gpio
+import pyrigate.metrics as metrics
 import pyrigate.mail
+import pyrigate.trace as trace
+from pyrigate.lazy import lazy_import
 from pyrigate.log import output, warn
+from pyrigate.notify import get_notifier
+from pyrigate.outbox import OutboxError, get_outbox, send_mail
+from pyrigate.profiler import get_profiler
+from pyrigate.pump_runner import get_pump_runner
+from pyrigate.report import get_reporter
+from pyrigate.stats import PERIODS
+from pyrigate.units import parse_volume
+from pyrigate.watchdog import JOB_DURATION, SCHEDULER_LAG, get_monitor
 from pyrigate.user_settings import settings
 from pyrigate.utils.printing import print_dict, print_columns, print_list
 
+colorise = lazy_import('colorise')
+
 
 class CommandInterpreter(cmd.Cmd):
     """Interpreter for user-entered commands."""
@@ -61,9 +73,11 @@ class CommandInterpreter(cmd.Cmd):
         output(pyrigate.all_versions())
 
     def do_reload(self, line):
-        """Reload user settings."""
-        importlib.reload(pyrigate.user_settings)
-        output('Reloaded settings')
+        """Reload user settings and plant configurations."""
+        if self._controller.reload():
+            output('Reloaded settings and plant configurations')
+        else:
+            output('Failed to reload, keeping the current settings')
 
     def do_test_mail(self, line):
         """Test the mail system by sending a mail to the given address."""
@@ -85,13 +99,123 @@ class CommandInterpreter(cmd.Cmd):
                     'Test',
                     settings['email']['sender'],
                     settings['email']['subscribers'],
-                    'Subject: Test\nThis is a test mail sent from pyrigate',
+                    'This is a test mail sent from pyrigate',
                     server='localhost',
                     port=25
                 )
             except TimeoutError:
                 output("Operation timed out...")
 
+    def do_mail(self, line):
+        """Queue a mail to all subscribers in the outbox.
+
+        mail <subject> [<message>]
+
+        """
+        args = shlex.split(line)
+
+        if not args or len(args) > 2:
+            output('Usage: mail <subject> [<message>]')
+            return
+
+        try:
+            mail_id = send_mail(args[0], message=' '.join(args[1:]))
+            output("Queued mail '{0}'", mail_id)
+        except OutboxError as ex:
+            output(str(ex))
+
+    def do_outbox(self, line):
+        """Show queued mails or wait for them to be delivered.
+
+        outbox [flush]
+
+        """
+        args = shlex.split(line)
+
+        if not settings['email']:
+            output('Please set email settings to use the outbox')
+            return
+
+        outbox = get_outbox()
+
+        if args == ['flush']:
+            if not outbox.flush(timeout=60):
+                output('Timed out waiting for the outbox')
+        elif args:
+            output('Usage: outbox [flush]')
+            return
+
+        next_attempt = outbox.next_attempt
+
+        print_list([
+            ('Pending', outbox.pending),
+            ('Sent', outbox.sent),
+            ('Retries', outbox.retries),
+            ('Failed', outbox.failed),
+            ('Sessions', outbox.sessions),
+            ('Next attempt', 'N/A' if next_attempt is None else
+             time.strftime('%Y-%m-%d %H:%M:%S',
+                           time.localtime(next_attempt))),
+        ])
+
+    def do_alerts(self, line):
+        """Show alert counters or mail pending digests now.
+
+        alerts [flush]
+
+        """
+        args = shlex.split(line)
+        notifier = get_notifier()
+
+        if args == ['flush']:
+            output('Sent {0} digest(s)', notifier.flush_digests())
+        elif args:
+            output('Usage: alerts [flush]')
+            return
+
+        print_list([
+            ('Sent', notifier.sent),
+            ('Merged', notifier.merged),
+            ('Dropped', notifier.dropped),
+            ('Digests', notifier.digests),
+        ])
+
+        pending = notifier.pending()
+
+        if pending:
+            print_columns(
+                [[subscriber, count] for subscriber, count in pending.items()],
+                headers=['Subscriber', 'Pending alerts'],
+            )
+
+    def do_report(self, line):
+        """Show the status report of the last completed period.
+
+        report [<period>] [current]
+
+        The period is daily, weekly, monthly or yearly and defaults to the
+        status frequency. With 'current', report the period in progress.
+
+        """
+        args = shlex.split(line)
+        current = bool(args) and args[-1] == 'current'
+
+        if current:
+            args = args[:-1]
+
+        if len(args) > 1 or (args and args[0] not in PERIODS):
+            output('Usage: report [daily|weekly|monthly|yearly] [current]')
+            return
+
+        period = args[0] if args else settings['status_frequency']
+
+        if current:
+            report = get_reporter().report_current(period)
+        else:
+            report = get_reporter().report(period)
+
+        output(report.text.replace('{', '{{').replace('}', '}}'))
+
     def do_pump(self, line):
         """Pump a specfic amount (dl, cm, ml etc.).
 
@@ -115,26 +239,139 @@ class CommandInterpreter(cmd.Cmd):
                 pump.activate()
                 output("Pump '{0}' activated".format(pump.name))
             elif cmd == 'off':
+                pump.cancel()
                 pump.deactivate()
                 output("Pump '{0}' deactivated".format(pump.name))
             else:
                 try:
-                    pump.pump(float(args[1]))
+                    run = pump.pump(float(args[1]))
                 except ValueError:
                     warn(
                         "Cannot convert '{0}' to a floating-point value"
                         .format(args[1])
                     )
+                    return
+
+                if run:
+                    output("Started run #{0} of pump '{1}' for {2:.2f}s",
+                           run.id, pump.name, run.duration)
+
+    def do_cancel(self, line):
+        """Cancel a pump run.
+
+        cancel <run id>
+
+        """
+        arg = self.expect_args('cancel', line, 1)
+
+        if arg:
+            run = get_pump_runner().get_run(int(arg))\
+                if arg.isdigit() else None
+
+            if run and run.cancel():
+                output("Cancelled run #{0} of pump '{1}'",
+                       run.id, run.pump.name)
+            else:
+                warn("No active pump run with id '{0}'".format(arg))
 
     def do_pumps(self, line):
-        """Show all loaded pumps."""
+        """Show all loaded pumps and the remaining time of their runs."""
         pumps = self._controller.pumps
 
         if pumps:
-            self.columnise(pumps)
+            print_columns(
+                [
+                    [
+                        name,
+                        pump.pin,
+                        '{0:.2f} mL/s'.format(pump.flow_rate),
+                        'N/A' if pump.tank is None
+                        else '{0:.0f} mL'.format(pump.level),
+                        ', '.join(
+                            '#{0} ({1:.1f}s)'.format(run.id, run.remaining)
+                            for run in pump.runs
+                        ) or '-',
+                        ', '.join(pump.zones) or '-',
+                    ]
+                    for name, pump in pumps.items()
+                ],
+                headers=['Name', 'Pin', 'Flow rate', 'Level', 'Runs',
+                         'Zones'],
+            )
         else:
             print('No pumps loaded')
 
+    def do_timing(self, line):
+        """Show the on-time jitter of pumps.
+
+        timing [<name>]
+
+        """
+        args = shlex.split(line)
+        pumps = self._controller.pumps
+
+        if args:
+            pumps = {name: pumps[name] for name in args if name in pumps}
+
+        if not pumps:
+            output('No pumps to show timing for')
+            return
+
+        for name, pump in pumps.items():
+            timing = pump.timing
+
+            if not timing.count:
+                output("Pump '{0}' has not completed any runs", name)
+                continue
+
+            print_list([
+                ('Pump', name),
+                ('Runs', timing.count),
+                ('Mean overshoot',
+                 '{0:.3f}ms'.format(timing.mean_overshoot_ns / 1e6)),
+                ('Min/max overshoot', '{0:.3f}ms / {1:.3f}ms'.format(
+                    timing.min_overshoot_ns / 1e6,
+                    timing.max_overshoot_ns / 1e6
+                )),
+                ('Compensation',
+                 '{0:.3f}ms'.format(timing.compensation_ns / 1e6)),
+            ])
+            print_columns(
+                [[label, count] for label, count in timing.histogram()],
+                headers=['Overshoot', 'Runs'],
+            )
+
+    def do_refill(self, line):
+        """Mark a pump's tank as refilled.
+
+        refill <name> [<amount>]
+
+        Without an amount the tank is marked as full.
+
+        """
+        args = shlex.split(line)
+
+        if len(args) not in (1, 2):
+            output("Command 'refill' expected 1 or 2 arguments")
+            return
+
+        pump = self._controller.get_pump(args[0])
+
+        if not pump:
+            warn('No pump with that name')
+        elif not pump.tank:
+            warn("Pump '{0}' has no tank".format(pump.name))
+        else:
+            try:
+                level = parse_volume(args[1]) if len(args) == 2 else None
+            except ValueError as ex:
+                warn(str(ex))
+                return
+
+            pump.tank.refill(level)
+            output("Tank of pump '{0}' is at {1:.0f} mL",
+                   pump.name, pump.tank.level)
+
     def do_sensor(self, line):
         """Query the value of a sensor."""
         arg = self.expect_args('sensor', line, 1)
@@ -147,9 +384,23 @@ class CommandInterpreter(cmd.Cmd):
             output("No sensor called '{0}' registered".format(arg))
 
     def do_sensors(self, line):
-        """."""
-        if self._controller.sensors:
-            self.columnise(self._controller.sensors)
+        """Show all loaded sensors and their effective sampling rates."""
+        sensors = self._controller.sensors
+
+        if sensors:
+            print_columns(
+                [
+                    [
+                        name,
+                        sensor.pin,
+                        sensor.analog,
+                        '{0:.2f}/min'.format(sensor.sampler.rate),
+                        sensor.last_value,
+                    ]
+                    for name, sensor in sensors.items()
+                ],
+                headers=['Name', 'Pin', 'Analog?', 'Rate', 'Last value'],
+            )
         else:
             print('No sensors loaded')
 
@@ -184,6 +435,7 @@ class CommandInterpreter(cmd.Cmd):
                     ('Description', config.description),
                     ('Path', config.path),
                     ('Pump', config.scheme['pump']),
+                    ('Zone', config.scheme['zone'] or 'N/A'),
                     ('Amount', config.scheme['amount']),
                     ('Schedule', config.schedule_description),
                     ('Running?', self._controller.is_job_running(arg)),
@@ -232,9 +484,9 @@ class CommandInterpreter(cmd.Cmd):
                 pin = int(args[0])
                 value = int(args[1])
 
-                if pin in (gpio.LOW, gpio.HIGH):
-                    output("Wrote '{0}' on pin '{1}'",
-                           gpio.output(pin, value), pin)
+                if value in (gpio.LOW, gpio.HIGH):
+                    gpio.output(pin, value)
+                    output("Wrote '{0}' on pin '{1}'", value, pin)
                 else:
                     output("Output value must be either '{0}' or '{1}'",
                            gpio.LOW, gpio.HIGH)
@@ -286,6 +538,178 @@ class CommandInterpreter(cmd.Cmd):
                 padding=6,
             )
 
+    def do_api(self, line):
+        """Show the status of the HTTP/JSON API or start or stop it.
+
+        api [start | stop]
+
+        """
+        args = shlex.split(line)
+
+        if args == ['start']:
+            self._controller.start_api()
+        elif args == ['stop']:
+            self._controller.stop_api()
+        elif args:
+            output('Usage: api [start | stop]')
+            return
+
+        server = self._controller.api_server
+
+        if not server or not server.running:
+            output('API is not running')
+            return
+
+        print_list([
+            ('Address', '{0}:{1}'.format(*server.address)),
+            ('Connections', server.connections),
+            ('Requests', server.requests),
+            ('Not modified', server.not_modified),
+        ])
+
+    def do_metrics(self, line):
+        """Show metrics in the Prometheus text format.
+
+        metrics [<prefix>]
+
+        Only metrics whose names start with the prefix are shown, e.g.
+        'metrics pyrigate_pump'.
+
+        """
+        args = shlex.split(line)
+
+        if len(args) > 1:
+            output('Usage: metrics [<prefix>]')
+            return
+
+        text = metrics.expose(args[0] if args else '')
+        print(text.rstrip('\n') if text else 'No metrics')
+
+    def do_watchdog(self, line):
+        """Show scheduler lag and run times of jobs and recent violations.
+
+        Lag and run time percentiles are upper bounds of histogram buckets.
+
+        """
+        monitor = get_monitor()
+        rows = []
+
+        def seconds(value):
+            return '-' if value is None else '{0:g}s'.format(value)
+
+        for name in self._controller.all_jobs:
+            lag = SCHEDULER_LAG.labels(name)
+            duration = JOB_DURATION.labels(name)
+            last = monitor.last(name)
+            rows.append([
+                name,
+                duration.count,
+                seconds(lag.quantile(.5)),
+                seconds(lag.quantile(.99)),
+                seconds(duration.quantile(.99)),
+                '-' if last is None else '{0:.3f}s'.format(last.duration()),
+            ])
+
+        if rows:
+            print_columns(rows, headers=['Job', 'Runs', 'Lag p50', 'Lag p99',
+                                         'Run time p99', 'Last run time'])
+        else:
+            output('No jobs')
+
+        for dispatch in monitor.active():
+            output("Running: '{0}' for {1:.1f}s", dispatch.job,
+                   time.time() - dispatch.start)
+
+        for violation in list(monitor.violations)[-10:]:
+            output('{0} {1}', time.strftime('%H:%M:%S',
+                                            time.localtime(violation.when)),
+                   violation.describe().replace('{', '{{').replace('}', '}}'))
+
+    def do_profile(self, line):
+        """Sample the stacks of all threads to find where time is spent.
+
+        profile start [<rate>]
+        profile stop
+        profile dump <path>
+
+        The dump is in the collapsed stack format read by flamegraph tools,
+        e.g. 'flamegraph.pl <path> > profile.svg'.
+
+        """
+        args = shlex.split(line)
+        profiler = get_profiler()
+
+        if args and args[0] == 'start' and len(args) <= 2:
+            try:
+                rate = float(args[1]) if len(args) == 2 else None
+            except ValueError:
+                output("Invalid rate '{0}'", args[1])
+                return
+
+            if rate is not None and rate <= 0:
+                output('Rate must be positive')
+            elif profiler.start(rate):
+                output('Profiling at {0:g} samples/s', profiler.rate)
+            else:
+                output('Already profiling')
+        elif args == ['stop']:
+            if profiler.stop():
+                output('Took {0} samples in {1:.1f}s', profiler.samples,
+                       profiler.elapsed)
+
+                print_columns(
+                    [[role, count]
+                     for role, count in profiler.roles().most_common()],
+                    headers=['Thread role', 'Samples'],
+                )
+            else:
+                output('Not profiling')
+        elif len(args) == 2 and args[0] == 'dump':
+            if not profiler.samples:
+                output('No samples to dump')
+                return
+
+            try:
+                lines = profiler.dump(args[1])
+            except OSError as ex:
+                warn("Cannot write profile to '{0}': {1}", args[1], ex)
+                return
+
+            output("Wrote {0} stacks to '{1}'", lines, args[1])
+        else:
+            output('Usage: profile (start [<rate>] | stop | dump <path>)')
+
+    def do_trace(self, line):
+        """Record gpio writes, sensor reads and job dispatches to a trace.
+
+        trace start <path>
+        trace stop
+
+        Replay a trace with 'python -m pyrigate.replay <path>'.
+
+        """
+        args = shlex.split(line)
+
+        if len(args) == 2 and args[0] == 'start':
+            if trace.recording():
+                output('Already recording a trace')
+                return
+
+            try:
+                trace.start_recording(args[1])
+            except OSError as ex:
+                warn("Cannot record trace to '{0}': {1}", args[1], ex)
+                return
+
+            output("Recording trace to '{0}'", args[1])
+        elif args == ['stop']:
+            if not trace.recording():
+                output('Not recording a trace')
+            else:
+                output('Recorded {0} event(s)', trace.stop_recording())
+        else:
+            output('Usage: trace start <path> | trace stop')
+
     def do_quit(self, line):
         """Quit pyrigate."""
         raise KeyboardInterrupt
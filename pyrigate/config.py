@@ -6,7 +6,7 @@
 import json
 import os
 
-from pyrigate.validation import plant_configuration_schema
+from pyrigate.units import parse_volume
 
 
 class ConfigError(Exception):
@@ -27,6 +27,7 @@ class PlantConfiguration:
         self._path = path
         self._schedule_description = ''
         self._config = {}
+        self._volume = None
         self.load(path)
 
     @classmethod
@@ -37,6 +38,9 @@ class PlantConfiguration:
     def load(self, path):
         """Load a plant configuration from a file."""
         if path:
+            # Validation pulls in the schema library, so wait until needed
+            from pyrigate.validation import plant_configuration_schema
+
             self._path = path
 
             with open(path) as fh:
@@ -46,6 +50,8 @@ class PlantConfiguration:
                 self._schedule_description =\
                     self._create_description(self._config)
 
+                self._volume = parse_volume(self._config['scheme']['amount'])
+
                 return True
 
         return False
@@ -89,6 +95,11 @@ class PlantConfiguration:
     def schedule_description(self):
         return self._schedule_description
 
+    @property
+    def volume(self):
+        """Return the amount to water in millilitres."""
+        return self._volume
+
     @property
     def scheme(self):
         return self._config['scheme']
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+"""Support for running pyrigate as a service without a terminal.
+
+The daemon leaves all signal handling to its main thread: SIGHUP, SIGINT and
+SIGTERM are blocked before any other thread is started, so that the
+threads inherit the blocked mask and the main thread can sleep in sigwait
+until one of them arrives. Readiness, reloads and shutdown are reported to
+systemd through the sd_notify protocol when it started the service with
+Type=notify or Type=notify-reload, e.g.
+
+    [Service]
+    Type=notify
+    ExecStart=/usr/local/bin/pyrigate --daemon --pidfile=/run/pyrigate.pid
+    ExecReload=/bin/kill -HUP $MAINPID
+
+"""
+
+import os
+import signal
+import socket
+import time
+
+from pyrigate.log import warn
+
+SIGNALS = (signal.SIGHUP, signal.SIGINT, signal.SIGTERM)
+
+
+class PidFileError(Exception):
+    pass
+
+
+def notify(**values):
+    """Send a state change to the service manager, e.g. notify(READY=1).
+
+    Does nothing unless NOTIFY_SOCKET is set. Returns True if the state was
+    sent.
+
+    """
+    address = os.environ.get('NOTIFY_SOCKET')
+
+    if not address:
+        return False
+
+    if address[0] == '@':
+        # An abstract socket
+        address = '\0' + address[1:]
+
+    message = '\n'.join('{0}={1}'.format(name, value)
+                        for name, value in values.items())
+
+    try:
+        with socket.socket(socket.AF_UNIX,
+                           socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as sock:
+            sock.sendto(message.encode('utf-8'), address)
+    except OSError as ex:
+        warn('Failed to notify service manager: {0}', ex)
+        return False
+
+    return True
+
+
+def notify_reloading():
+    """Tell the service manager that settings are being reloaded."""
+    # Type=notify-reload requires the time the reload started
+    return notify(RELOADING=1,
+                  MONOTONIC_USEC=int(time.clock_gettime(time.CLOCK_MONOTONIC)
+                                     * 1e6))
+
+
+def block_signals():
+    """Block the daemon's signals in this and all threads started after."""
+    signal.pthread_sigmask(signal.SIG_BLOCK, SIGNALS)
+
+
+def unblock_signals():
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+
+
+def wait_for_signal():
+    """Sleep until one of the blocked signals arrives and return it."""
+    return signal.Signals(signal.sigwait(SIGNALS))
+
+
+def _running(pid):
+    if pid == os.getpid():
+        # Left behind by an earlier process with our pid, e.g. in a container
+        return False
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running as another user
+        pass
+
+    return True
+
+
+class PidFile:
+    """A file holding the pid of the running daemon."""
+
+    def __init__(self, path):
+        self._path = path
+        self._created = False
+
+    @property
+    def path(self):
+        return self._path
+
+    def read(self):
+        """Return the pid in the file or None."""
+        try:
+            with open(self._path) as fh:
+                return int(fh.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def create(self):
+        """Write the pid of this process to the file.
+
+        Raises PidFileError if another daemon is running or the file cannot be
+        written. A file left behind by a daemon that is no longer running is
+        replaced.
+
+        """
+        for _ in range(2):
+            try:
+                fd = os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                             0o644)
+                break
+            except FileExistsError:
+                pid = self.read()
+
+                if pid is not None and _running(pid):
+                    raise PidFileError('pyrigate is already running with pid '
+                                       '{0}'.format(pid))
+
+                try:
+                    os.remove(self._path)
+                except FileNotFoundError:
+                    pass
+                except OSError as ex:
+                    raise PidFileError(str(ex))
+            except OSError as ex:
+                raise PidFileError(str(ex))
+        else:
+            raise PidFileError("Cannot create pidfile '{0}'"
+                               .format(self._path))
+
+        with os.fdopen(fd, 'w') as fh:
+            fh.write('{0}\n'.format(os.getpid()))
+
+        self._created = True
+
+    def remove(self):
+        """Remove the file if it was created by this process."""
+        if self._created and self.read() == os.getpid():
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+
+        self._created = False
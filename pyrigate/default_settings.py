@@ -27,7 +27,30 @@ defaults = {
     # Enable colored output to the console
     'colors': True,
 
-    # Send a warning when water levels are below this level
+    # How to access gpio pins, one of 'auto', 'rpi' (RPi.GPIO), 'gpiod'
+    # (libgpiod, using 'gpio_chip'), 'sysfs' or 'simulator'. 'auto' uses
+    # RPi.GPIO if available and otherwise simulates all pins
+    'gpio_backend': 'auto',
+    'gpio_chip': '/dev/gpiochip0',
+
+    # Relays driven by a chain of 74HC595 shift registers on SPI, e.g.
+    # {'type': 'shift_register', 'chain_length': 4}, or by MCP23017 I2C port
+    # expanders, e.g. {'type': 'mcp23017', 'addresses': [0x20, 0x21]}. Their
+    # outputs are used as pins numbered from 'base_pin' (default 100)
+    'relay_expander': None,
+
+    # Drive all output pins from a separate process with an elevated
+    # (SCHED_FIFO) 'priority' that switches pumps off at their deadlines even
+    # if the main process stalls. Commands are passed through a shared memory
+    # ring buffer of 'capacity' commands
+    'actuator': {
+        'enabled': False,
+        'priority': 50,
+        'capacity': 256,
+    },
+
+    # Send an alert when water levels are below this level before watering. A
+    # bare number is in deciliters
     'warn_at_water_level': '0.1dl',
 
     # If True, send status updates to the addresses listed in email.subscribers
@@ -37,6 +60,22 @@ defaults = {
     # Send status updates with this frequency
     'status_frequency': 'weekly',
 
+    # Status reports are published to each of 'sinks' ('stdout', 'email',
+    # 'file' and 'json') on the first day of a period at 'time'. A custom
+    # 'template' file can replace the report text (see pyrigate.report). The
+    # 'file' sink appends to 'file_path', keeping 'file_backups' files of up to
+    # 'file_max_bytes' bytes, and the 'json' sink writes the latest report to
+    # 'json_path'
+    'reports': {
+        'sinks': ['stdout', 'email'],
+        'time': '08:00',
+        'template': None,
+        'file_path': './reports/status.txt',
+        'file_max_bytes': 1048576,
+        'file_backups': 4,
+        'json_path': './reports/status.json',
+    },
+
     # Email subconfiguration
     'email': {
         # The mail to send notifications from
@@ -55,8 +94,112 @@ defaults = {
         'use_ssl': True
     },
 
+    # Alerts, e.g. about low water levels or triggered sensors, are mailed to
+    # each subscriber at most 'rate_limit' times per 'rate_period' seconds and
+    # repeats of an alert within 'dedup_window' seconds are not mailed. Such
+    # alerts are mailed as a digest every 'digest_interval' seconds, with up to
+    # 'max_digest_entries' different alerts per digest
+    'notifications': {
+        'dedup_window': 3600.0,
+        'rate_limit': 4,
+        'rate_period': 3600.0,
+        'digest_interval': 21600.0,
+        'max_digest_entries': 100,
+    },
+
+    # Mails are spooled to 'spool_dir' and delivered in the background, up to
+    # 'batch_size' mails per SMTP session. Failed deliveries are retried after
+    # 'backoff' seconds, doubling up to 'max_backoff', and given up after
+    # 'max_attempts' attempts
+    'outbox': {
+        'spool_dir': './outbox',
+        'batch_size': 20,
+        'max_attempts': 10,
+        'backoff': 30.0,
+        'max_backoff': 3600.0,
+    },
+
+    # Daily, weekly, monthly and yearly statistics for status reports are
+    # saved to 'path' every 'save_interval' seconds if they changed. Set
+    # 'path' to null to keep them in memory only
+    'statistics': {
+        'path': './statistics.json',
+        'save_interval': 300.0,
+    },
+
+    # Waterings and sensor samples are kept in 'directory' for syncing to the
+    # companion app, in files of 'segment_records' records. Only the newest
+    # 'max_segments' files are kept
+    'history': {
+        'directory': './history',
+        'segment_records': 10000,
+        'max_segments': 20,
+    },
+
+    # The scheduler sleeps until the next job is due. Set 'max_sleep' to wake
+    # up at least every so many seconds, e.g. on a pi without a real-time
+    # clock whose time jumps when it is synchronised after boot
+    'scheduler': {
+        'max_sleep': None,
+    },
+
+    # Warn when a job starts more than 'lateness_budget' seconds after it was
+    # due or runs for more than 'max_runtime' seconds, naming the jobs that
+    # held up the scheduler. Jobs are checked when their budgets run out and
+    # at least every 'interval' seconds unless it is None. 'jobs' overrides
+    # the budgets per job name, e.g. {"Basil": {"max_runtime": 60}}
+    'watchdog': {
+        'enabled': True,
+        'interval': None,
+        'lateness_budget': 5.0,
+        'max_runtime': 30.0,
+        'jobs': {},
+    },
+
+    # The 'profile' command samples the stacks of all threads 'rate' times per
+    # second, keeping up to 'max_depth' frames per stack
+    'profiler': {
+        'rate': 100.0,
+        'max_depth': 64,
+    },
+
+    # Serve metrics in the Prometheus text format at /metrics on 'host' and
+    # 'port'
+    'metrics': {
+        'enabled': False,
+        'host': '127.0.0.1',
+        'port': 9464,
+    },
+
+    # Serve a local HTTP/JSON API for the companion app on 'host' and 'port'.
+    # If 'token' is set, clients must send it as a bearer token. The API
+    # starts pumps, so it is only served on other hosts than the loopback
+    # address, e.g. '0.0.0.0', if a token is set. Idle connections are closed
+    # after 'keep_alive' seconds
+    'api': {
+        'enabled': False,
+        'host': '127.0.0.1',
+        'port': 8080,
+        'token': None,
+        'keep_alive': 15.0,
+    },
+
     # A list of all connected pumps. Requires at least specifying the gpio
-    # output pin and flow rate
+    # output pin and flow rate.
+    #
+    # An optional 'tank' tracks the water level by integrating the volume
+    # pumped, e.g. {'capacity': '5l', 'level': '2l', 'sensor': 'tank-level'}.
+    # The tank starts out full unless 'level' is given and is corrected by the
+    # readings of the optional 'water_level' type sensor named by 'sensor'.
+    #
+    # An optional hall-effect 'flow_meter' makes the pump stop at a measured
+    # volume, e.g. {'pin': 17, 'pulses_per_litre': 450}. A metered run gives
+    # up after 'timeout' times its expected duration and each activation
+    # moves the flow rate towards the measured one by 'recalibration_weight'.
+    #
+    # A pump feeding a manifold of solenoid valves lists them as 'zones', e.g.
+    # {'herbs': {'pin': 20}, 'chili': {'pin': 21, 'flow_rate': '0.8L/min'}}.
+    # Plant configurations then select a zone in their scheme
     'pumps': {
         'main': {
             'pin': 7,
@@ -69,6 +212,14 @@ defaults = {
     # sensor needs to trigger some action when it is crossed.
     #
     # Only moisture sensors and the 'water' action are currently supported.
+    #
+    # An optional 'calibration' curve converts raw readings, e.g. ADC counts,
+    # to meaningful values such as moisture percent. It is a list of
+    # [raw, value] points that are linearly interpolated, e.g.
+    # [[520, 0], [430, 40], [260, 100]]
+    #
+    # DS18B20 temperature probes use type 'ds18b20' and the probe's 1-Wire id
+    # instead of a pin, e.g. {'type': 'ds18b20', 'device': '28-0316a2796aff'}
     'sensors': {
         'moisture-sensor': {
             'pin': 5,
@@ -76,5 +227,34 @@ defaults = {
             'trigger': 'water',
             'analog': False
         }
+    },
+
+    # Watering of zones sharing a pump. Zones due within 'batch_window'
+    # seconds of each other are watered in one continuous pump run, and the
+    # next zone's valve opens 'valve_overlap' seconds before the previous one
+    # closes
+    'sequencer': {
+        'batch_window': 2.0,
+        'valve_overlap': 0.5
+    },
+
+    # 1-Wire bus settings for DS18B20 temperature probes. All probes convert
+    # simultaneously which takes 'conversion_time' seconds
+    'onewire': {
+        'devices_dir': '/sys/bus/w1/devices',
+        'conversion_time': 0.75
+    },
+
+    # Adaptive sensor sampling. Sensors are sampled at 'floor_rate' samples
+    # per minute when readings are stable. The rate jumps to 'max_rate' after
+    # watering or when the variance of the last 'window' readings exceeds
+    # 'variance_threshold', then decays back with a half-life of 'half_life'
+    # seconds
+    'sampling': {
+        'floor_rate': 0.2,
+        'max_rate': 6.0,
+        'half_life': 900.0,
+        'variance_threshold': 0.01,
+        'window': 10
     }
 }
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""Hall-effect flow meters for closed-loop dosing."""
+
+import threading
+
+import pyrigate.gpio as gpio
+
+
+class GpioPulseSource:
+    """Delivers the pulses of a flow meter connected to a gpio input pin."""
+
+    def __init__(self, pin, bouncetime=None):
+        self._pin = pin
+        self._bouncetime = bouncetime
+
+    @property
+    def pin(self):
+        return self._pin
+
+    def start(self, callback):
+        """Call callback on every rising edge of the pin."""
+        kwargs = {'callback': lambda channel: callback()}
+
+        if self._bouncetime:
+            kwargs['bouncetime'] = self._bouncetime
+
+        gpio.setup(self._pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+        gpio.add_event_detect(self._pin, gpio.RISING, **kwargs)
+
+    def stop(self):
+        gpio.remove_event_detect(self._pin)
+
+
+class MockPulseSource:
+    """Pulse source whose pulses are emitted manually, e.g. in tests."""
+
+    def __init__(self):
+        self._callback = None
+
+    def start(self, callback):
+        self._callback = callback
+
+    def stop(self):
+        self._callback = None
+
+    def emit(self, count=1):
+        """Emit a number of pulses."""
+        for _ in range(count):
+            if self._callback:
+                self._callback()
+
+
+class FlowMeter:
+    """Counts the pulses of a flow meter and converts them to volume.
+
+    The pulse callback only increments a counter and checks a single armed
+    target so it stays cheap at high pulse rates. Volumes are in
+    millilitres.
+
+    """
+
+    def __init__(self, source, pulses_per_litre):
+        if pulses_per_litre <= 0:
+            raise ValueError('Pulses per litre must be positive')
+
+        self._source = source
+        self._ml_per_pulse = 1000. / pulses_per_litre
+        self._pulses = 0
+        self._target = None
+        self._on_target = None
+        self._lock = threading.Lock()
+        self._source.start(self._pulse)
+
+    def _pulse(self):
+        # Pulses are delivered from a single callback thread
+        self._pulses += 1
+
+        if self._target is not None and self._pulses >= self._target:
+            self._fire()
+
+    def _fire(self):
+        with self._lock:
+            on_target, self._target, self._on_target =\
+                self._on_target, None, None
+
+        if on_target:
+            on_target()
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def pulses(self):
+        """Return the number of pulses counted so far."""
+        return self._pulses
+
+    def volume(self, pulses):
+        """Convert a number of pulses to millilitres."""
+        return pulses * self._ml_per_pulse
+
+    def arm(self, volume, on_target, start=None):
+        """Call on_target once a volume has flowed through the meter.
+
+        The volume is counted from the pulse count start, which defaults to
+        the current count. Returns the starting pulse count.
+
+        """
+        with self._lock:
+            if start is None:
+                start = self._pulses
+
+            self._target = start + max(1, round(volume / self._ml_per_pulse))
+            self._on_target = on_target
+            reached = self._pulses >= self._target
+
+        if reached:
+            self._fire()
+
+        return start
+
+    def disarm(self):
+        """Cancel any armed target."""
+        with self._lock:
+            self._target = None
+            self._on_target = None
+
+    def close(self):
+        """Stop counting pulses."""
+        self.disarm()
+        self._source.stop()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""GPIO control functions.
+
+All functions go through a shadow register of the current output pin states
+that drops redundant writes, in front of one of several backends:
+
+    rpi        The RPi.GPIO library
+    gpiod      The libgpiod character device interface
+    sysfs      The deprecated /sys/class/gpio interface
+    simulator  Simulated pins that record all writes
+
+The 'auto' backend uses RPi.GPIO if it is available and otherwise simulates
+(mocks) all pins, e.g. when not running on a raspberry pi. Relays on shift
+registers or I2C port expanders are put in front of the backend as virtual
+pins, see pyrigate.gpio.expander. Output pins can also be driven from an
+isolated actuation process, see pyrigate.actuator.
+
+"""
+
+from pyrigate.gpio.backend import (  # noqa: F401
+    BOTH,
+    FALLING,
+    HIGH,
+    IN,
+    LOW,
+    OUT,
+    PUD_DOWN,
+    PUD_OFF,
+    PUD_UP,
+    RISING,
+    GpioBackend,
+    ShadowRegister,
+)
+from pyrigate.gpio.simulator import SimulatorBackend
+from pyrigate.log import log
+
+BCM = 11
+
+
+def create_backend(name, chip='/dev/gpiochip0'):
+    """Create a gpio backend by name."""
+    if name == 'auto':
+        try:
+            return create_backend('rpi')
+        except ImportError:
+            return SimulatorBackend()
+    elif name == 'rpi':
+        from pyrigate.gpio.rpi import RPiGpioBackend
+        return RPiGpioBackend()
+    elif name == 'gpiod':
+        from pyrigate.gpio.libgpiod import LibgpiodBackend
+        return LibgpiodBackend(chip)
+    elif name == 'sysfs':
+        from pyrigate.gpio.sysfs import SysfsBackend
+        return SysfsBackend()
+    elif name == 'simulator':
+        return SimulatorBackend()
+
+    raise ValueError("Unknown gpio backend '{0}'".format(name))
+
+
+_register = ShadowRegister(create_backend('auto'))
+
+
+def use_backend(backend):
+    """Route all gpio functions through a backend."""
+    global _register
+    _register = ShadowRegister(backend)
+
+
+def backend():
+    """Return the current gpio backend."""
+    return _register.backend
+
+
+def register():
+    """Return the shadow register of the current backend."""
+    return _register
+
+
+def mocked():
+    """Return True if gpio functions are being mocked."""
+    return _register.backend.mocked
+
+
+def setup(pin, direction, pull_up_down=PUD_OFF, initial=None):
+    """Configure a pin as an input or an output."""
+    _register.setup(pin, direction, pull_up_down=pull_up_down,
+                    initial=initial)
+
+
+def output(pin, value):
+    """Write a value to a pin, returning False if it already had it."""
+    return _register.output(pin, value)
+
+
+def output_for(pin, value, duration, final):
+    """Write a value to a pin and final after some seconds.
+
+    The final value is only written by backends that enforce deadlines
+    themselves, e.g. the isolated actuator process. Callers must still
+    write it when the deadline passes.
+
+    """
+    return _register.output_for(pin, value, duration, final)
+
+
+def output_many(values):
+    """Write a mapping of pins to values as a single update if possible."""
+    return _register.output_many(values)
+
+
+def batch():
+    """Return a context manager that combines writes into one update."""
+    return _register.batch()
+
+
+def flush():
+    """Apply the writes of the current batch now instead of at its end."""
+    _register.flush()
+
+
+def input(pin):
+    """Read the value of a pin."""
+    return _register.backend.input(pin)
+
+
+def add_event_detect(pin, edge, callback=None, bouncetime=None):
+    """Call callback(pin) on edges of an input pin."""
+    _register.backend.add_event_detect(pin, edge, callback=callback,
+                                       bouncetime=bouncetime)
+
+
+def remove_event_detect(pin):
+    """Stop detecting edges of an input pin."""
+    _register.backend.remove_event_detect(pin)
+
+
+def cleanup():
+    """Release all pins."""
+    _register.backend.cleanup()
+    _register.forget()
+
+
+def init(name='auto', chip='/dev/gpiochip0', expander=None, actuator=None):
+    """Initialise gpio functionality with a backend.
+
+    expander holds the settings of an optional relay expander and actuator
+    the settings of the optional isolated actuator process.
+
+    """
+    if actuator and actuator['enabled']:
+        from pyrigate.actuator import ActuatorBackend
+        use_backend(ActuatorBackend(name, chip, expander,
+                                    priority=actuator['priority'],
+                                    capacity=actuator['capacity']))
+    else:
+        # The 'auto' backend was already created on import
+        if name != 'auto' and name != _register.backend.name:
+            use_backend(create_backend(name, chip))
+
+        if expander:
+            from pyrigate.gpio.expander import create_expander
+            use_backend(create_expander(expander, _register.backend))
+
+    _register.backend.init()
+
+    if mocked():
+        log('Not on a raspberry pi, mocking GPIO functionality')
+    else:
+        log("GPIO interface initialised using '{0}' backend",
+            _register.backend.name, verbosity=2)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""Base class for gpio backends and the shadow register in front of them."""
+
+import contextlib
+import threading
+
+import pyrigate.metrics as metrics
+
+# Pin constants, equal to those of RPi.GPIO
+IN = 1
+OUT = 0
+
+HIGH = 1
+LOW = 0
+
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+
+RISING = 31
+FALLING = 32
+BOTH = 33
+
+PIN_WRITES = metrics.counter('pyrigate_gpio_writes_total',
+                             'Output pin changes, e.g. relay toggles',
+                             ('pin',))
+
+
+class GpioBackend:
+    """Interface of gpio backends.
+
+    Pins are always given as BCM numbers. Backends that can update several
+    output pins in a single operation override output_many and set
+    supports_batch. Backends that write final values of output_for
+    themselves set enforces_deadlines.
+
+    """
+
+    name = 'abstract'
+    mocked = False
+    supports_batch = False
+    enforces_deadlines = False
+
+    def init(self):
+        """Initialise the backend."""
+        pass
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF, initial=None):
+        """Configure a pin as an input or an output."""
+        raise NotImplementedError()
+
+    def output(self, pin, value):
+        """Write a value to an output pin."""
+        raise NotImplementedError()
+
+    def output_many(self, values):
+        """Write a mapping of output pins to values."""
+        for pin, value in values.items():
+            self.output(pin, value)
+
+    def output_for(self, pin, value, duration, final):
+        """Write a value to an output pin and final after some seconds.
+
+        The default only writes the value and leaves writing the final value
+        to the caller.
+
+        """
+        self.output(pin, value)
+
+    def input(self, pin):
+        """Read the value of a pin."""
+        raise NotImplementedError()
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        """Call callback(pin) on edges of an input pin."""
+        raise NotImplementedError()
+
+    def remove_event_detect(self, pin):
+        """Stop detecting edges of an input pin."""
+        raise NotImplementedError()
+
+    def cleanup(self):
+        """Release all pins."""
+        pass
+
+
+class ShadowRegister:
+    """Write-combining cache of output pin states in front of a backend.
+
+    Writes of a value a pin already has are dropped. Writes made inside
+    batch() are collected per thread and applied with a single call to the
+    backend's output_many when the outermost batch exits.
+
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._state = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.writes = 0
+        self.dropped = 0
+
+    @property
+    def backend(self):
+        return self._backend
+
+    def state(self, pin):
+        """Return the last value written to a pin or None if unknown."""
+        return self._state.get(pin)
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF, initial=None):
+        with self._lock:
+            self._backend.setup(pin, direction, pull_up_down=pull_up_down,
+                                initial=initial)
+
+            if direction == OUT and initial is not None:
+                self._state[pin] = initial
+            else:
+                self._state.pop(pin, None)
+
+    def output(self, pin, value):
+        """Write a pin, returning False if the write was redundant."""
+        pending = getattr(self._local, 'pending', None)
+
+        if pending is not None:
+            pending[pin] = value
+            return True
+
+        return bool(self.output_many({pin: value}))
+
+    def output_for(self, pin, value, duration, final):
+        """Write a pin and let the backend write final after some seconds.
+
+        Never dropped by backends that enforce deadlines since the deadline
+        may have changed.
+
+        """
+        if not self._backend.enforces_deadlines:
+            return self.output(pin, value)
+
+        pending = getattr(self._local, 'pending', None)
+
+        with self._lock:
+            if pending is not None and pin in pending:
+                del pending[pin]
+
+            self._backend.output_for(pin, value, duration, final)
+            self._state[pin] = value
+            self.writes += 1
+            PIN_WRITES.labels(pin).inc()
+
+    def output_many(self, values):
+        """Write several pins at once, returning the pins actually written.
+        """
+        with self._lock:
+            changed = {
+                pin: value for pin, value in values.items()
+                if self._state.get(pin) != value
+            }
+            self.dropped += len(values) - len(changed)
+
+            if changed:
+                if len(changed) == 1:
+                    self._backend.output(*next(iter(changed.items())))
+                else:
+                    self._backend.output_many(changed)
+
+                self._state.update(changed)
+                self.writes += len(changed)
+
+                for pin in changed:
+                    PIN_WRITES.labels(pin).inc()
+
+        return changed
+
+    def flush(self):
+        """Apply this thread's pending writes now, keeping any batch open.
+        """
+        pending = getattr(self._local, 'pending', None)
+
+        if pending:
+            values = dict(pending)
+            pending.clear()
+            self.output_many(values)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Collect this thread's writes and apply them as one update."""
+        outermost = getattr(self._local, 'pending', None) is None
+
+        if outermost:
+            self._local.pending = {}
+
+        try:
+            yield
+        finally:
+            if outermost:
+                pending, self._local.pending = self._local.pending, None
+
+                if pending:
+                    self.output_many(pending)
+
+    def forget(self):
+        """Forget all known pin states."""
+        with self._lock:
+            self._state.clear()
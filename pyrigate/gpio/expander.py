@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+"""Relay outputs on 74HC595 shift register chains and MCP23017 expanders.
+
+Expander outputs are addressed as virtual pins starting at a base pin, e.g.
+pins 100-131 for a chain of four 74HC595s. All other pins are passed on to
+a native backend. Output writes only update an in-memory frame of the
+expander's outputs, and the whole frame is sent in one bus transaction per
+output or output_many call. Writes collected by gpio.batch(), e.g. by the
+zone sequencer, therefore reach the bus as a single transaction.
+
+"""
+
+import threading
+
+from pyrigate.gpio.backend import HIGH, OUT, GpioBackend
+
+# MCP23017 registers with IOCON.BANK = 0
+_MCP23017_IODIRA = 0x00
+_MCP23017_OLATA = 0x14
+
+
+class SpiBus:
+    """SPI bus for shift register chains, using spidev."""
+
+    def __init__(self, bus=0, device=0, speed=1000000):
+        import spidev
+
+        self._spi = spidev.SpiDev()
+        self._spi.open(bus, device)
+        self._spi.max_speed_hz = speed
+
+    def transfer(self, messages):
+        for _, data in messages:
+            self._spi.writebytes2(data)
+
+    def close(self):
+        self._spi.close()
+
+
+class I2cBus:
+    """I2C bus for port expanders, using smbus2.
+
+    All messages of a transfer are sent in a single combined transaction.
+
+    """
+
+    def __init__(self, bus=1):
+        import smbus2
+
+        self._smbus2 = smbus2
+        self._bus = smbus2.SMBus(bus)
+
+    def transfer(self, messages):
+        self._bus.i2c_rdwr(*[
+            self._smbus2.i2c_msg.write(address, data)
+            for address, data in messages
+        ])
+
+    def close(self):
+        self._bus.close()
+
+
+class MockBus:
+    """Bus that records every transfer, e.g. for tests."""
+
+    def __init__(self):
+        self.frames = []
+
+    def transfer(self, messages):
+        self.frames.append([(address, bytes(data))
+                            for address, data in messages])
+
+    def close(self):
+        pass
+
+
+class FrameBackend(GpioBackend):
+    """Base class of backends keeping expander outputs in a frame."""
+
+    supports_batch = True
+
+    def __init__(self, bus, size, native, base_pin=100):
+        """Initialise with a bus, the number of outputs and a native backend.
+        """
+        self._bus = bus
+        self._size = size
+        self._native = native
+        self._base_pin = base_pin
+        self._lock = threading.Lock()
+
+        # All outputs start out high, i.e. active-low relays are off
+        self._frame = bytearray(b'\xff' * ((size + 7) // 8))
+
+    @property
+    def name(self):
+        return '{0}+{1}'.format(self.expander_name, self._native.name)
+
+    @property
+    def mocked(self):
+        return self._native.mocked
+
+    @property
+    def frame(self):
+        """Return a copy of the current frame."""
+        return bytes(self._frame)
+
+    def _expander_bit(self, pin):
+        offset = pin - self._base_pin
+
+        return offset if 0 <= offset < self._size else None
+
+    def _set_bit(self, bit, value):
+        """Set a bit of the frame, returning True if it changed."""
+        old = self._frame[bit // 8]
+
+        if value:
+            self._frame[bit // 8] |= 1 << (bit % 8)
+        else:
+            self._frame[bit // 8] &= ~(1 << (bit % 8))
+
+        return self._frame[bit // 8] != old
+
+    def init(self):
+        self._native.init()
+        self.flush()
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        bit = self._expander_bit(pin)
+
+        if bit is None:
+            self._native.setup(pin, direction, pull_up_down=pull_up_down,
+                               initial=initial)
+        elif direction != OUT:
+            raise ValueError('Expander pin {0} can only be an output'
+                             .format(pin))
+        elif initial is not None:
+            self.output(pin, initial)
+
+    def output(self, pin, value):
+        self.output_many({pin: value})
+
+    def output_many(self, values):
+        native = {}
+
+        with self._lock:
+            changed = False
+
+            for pin, value in values.items():
+                bit = self._expander_bit(pin)
+
+                if bit is None:
+                    native[pin] = value
+                elif self._set_bit(bit, value):
+                    changed = True
+
+            if changed:
+                self._bus.transfer(self.messages())
+
+        if len(native) == 1:
+            self._native.output(*next(iter(native.items())))
+        elif native:
+            self._native.output_many(native)
+
+    def flush(self):
+        """Send the whole frame to the expanders."""
+        with self._lock:
+            self._bus.transfer(self.messages())
+
+    def messages(self):
+        """Return the (address, data) messages that write the frame."""
+        raise NotImplementedError()
+
+    def input(self, pin):
+        bit = self._expander_bit(pin)
+
+        if bit is None:
+            return self._native.input(pin)
+
+        return HIGH if self._frame[bit // 8] & (1 << (bit % 8)) else 0
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self._native.add_event_detect(pin, edge, callback=callback,
+                                      bouncetime=bouncetime)
+
+    def remove_event_detect(self, pin):
+        self._native.remove_event_detect(pin)
+
+    def cleanup(self):
+        self._frame[:] = b'\xff' * len(self._frame)
+        self.flush()
+        self._bus.close()
+        self._native.cleanup()
+
+
+class ShiftRegisterBackend(FrameBackend):
+    """Outputs of a chain of 74HC595 shift registers."""
+
+    expander_name = 'shift_register'
+
+    def __init__(self, bus, chain_length, native, base_pin=100):
+        super().__init__(bus, 8 * chain_length, native, base_pin)
+
+    def messages(self):
+        # The first byte shifted out ends up in the last register
+        return [(None, bytes(reversed(self._frame)))]
+
+
+class Mcp23017Backend(FrameBackend):
+    """Outputs of one or more MCP23017 I2C port expanders."""
+
+    expander_name = 'mcp23017'
+
+    def __init__(self, bus, addresses, native, base_pin=100):
+        self._addresses = list(addresses)
+        super().__init__(bus, 16 * len(self._addresses), native, base_pin)
+
+    def init(self):
+        # The expanders power up with all latches low, so the frame is
+        # written before the ports become outputs, or every active-low relay
+        # would switch on in between
+        super().init()
+        self._bus.transfer([
+            (address, bytes([_MCP23017_IODIRA, 0x00, 0x00]))
+            for address in self._addresses
+        ])
+
+    def messages(self):
+        # Writes OLATA and OLATB of each expander with sequential addressing
+        return [
+            (address, bytes([_MCP23017_OLATA]) +
+             bytes(self._frame[2 * idx:2 * idx + 2]))
+            for idx, address in enumerate(self._addresses)
+        ]
+
+
+def create_expander(settings, native):
+    """Create an expander backend from settings in front of a native one."""
+    if settings['type'] == 'shift_register':
+        bus = SpiBus(settings['bus'], settings['device'])
+
+        return ShiftRegisterBackend(bus, settings['chain_length'], native,
+                                    settings['base_pin'])
+    elif settings['type'] == 'mcp23017':
+        bus = I2cBus(settings['bus'])
+
+        return Mcp23017Backend(bus, settings['addresses'], native,
+                               settings['base_pin'])
+
+    raise ValueError("Unknown relay expander '{0}'".format(settings['type']))
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+"""gpio backend using the libgpiod character device interface.
+
+Requires the libgpiod v2 python bindings. See
+https://git.kernel.org/pub/scm/libs/libgpiod/libgpiod.git for details.
+
+"""
+
+import datetime
+import threading
+
+from pyrigate.gpio.backend import BOTH, FALLING, HIGH, LOW, OUT, PUD_DOWN,\
+    PUD_UP, RISING, GpioBackend
+
+
+class LibgpiodBackend(GpioBackend):
+    """gpio backend using the libgpiod character device interface.
+
+    Each line gets its own line request when it is set up, and is only
+    reconfigured in place afterwards, e.g. to detect edges. Releasing a
+    requested line would let it float and glitch a relay it drives. A
+    multi-pin write sets the values of each request in a single call, and
+    lines with edge detection get a reader thread.
+
+    """
+
+    name = 'gpiod'
+    supports_batch = True
+
+    def __init__(self, chip='/dev/gpiochip0', consumer='pyrigate'):
+        # Raises ImportError if the bindings are not installed
+        import gpiod
+        from gpiod.line import Bias, Direction, Edge, Value
+
+        self._gpiod = gpiod
+        self._values = {HIGH: Value.ACTIVE, True: Value.ACTIVE,
+                        LOW: Value.INACTIVE, False: Value.INACTIVE}
+        self._biases = {PUD_UP: Bias.PULL_UP, PUD_DOWN: Bias.PULL_DOWN}
+        self._edges = {RISING: Edge.RISING, FALLING: Edge.FALLING,
+                       BOTH: Edge.BOTH}
+        self._direction = Direction
+        self._active = Value.ACTIVE
+        self._chip = chip
+        self._consumer = consumer
+        self._settings = {}
+        self._pulls = {}
+        self._outputs = {}
+        self._requests = {}
+        self._readers = {}
+
+    def _line_settings(self, pin, direction, pull_up_down=None, edge=None):
+        kwargs = {
+            'direction': self._direction.OUTPUT if direction == OUT
+            else self._direction.INPUT
+        }
+
+        if pull_up_down in self._biases:
+            kwargs['bias'] = self._biases[pull_up_down]
+
+        if edge is not None:
+            kwargs['edge_detection'] = self._edges[edge]
+
+        return kwargs
+
+    def _configure(self, pin):
+        """Apply the settings of a line, requesting it if needed."""
+        kwargs = self._settings[pin]
+
+        if pin in self._outputs:
+            kwargs = dict(kwargs, output_value=self._outputs[pin])
+
+        config = {pin: self._gpiod.LineSettings(**kwargs)}
+        request = self._requests.get(pin)
+
+        if request is None:
+            self._requests[pin] = self._gpiod.request_lines(
+                self._chip,
+                consumer=self._consumer,
+                config=config
+            )
+        else:
+            request.reconfigure_lines(config)
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        self._settings[pin] = self._line_settings(pin, direction,
+                                                  pull_up_down)
+        self._pulls[pin] = pull_up_down
+
+        if direction != OUT:
+            self._outputs.pop(pin, None)
+        elif initial is not None:
+            self._outputs[pin] = self._values[initial]
+
+        self._configure(pin)
+
+    def output(self, pin, value):
+        self._outputs[pin] = self._values[value]
+        self._requests[pin].set_value(pin, self._outputs[pin])
+
+    def output_many(self, values):
+        by_request = {}
+
+        for pin, value in values.items():
+            self._outputs[pin] = self._values[value]
+            request = self._requests[pin]
+            by_request.setdefault(id(request), (request, {}))[1][pin] =\
+                self._outputs[pin]
+
+        for request, request_values in by_request.values():
+            request.set_values(request_values)
+
+    def input(self, pin):
+        value = self._requests[pin].get_value(pin)
+
+        return HIGH if value == self._active else LOW
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        settings = self._line_settings(pin, None, self._pulls.get(pin), edge)
+
+        if bouncetime:
+            settings['debounce_period'] =\
+                datetime.timedelta(milliseconds=bouncetime)
+
+        self._settings[pin] = settings
+        self._outputs.pop(pin, None)
+        self._configure(pin)
+
+        stop = threading.Event()
+        reader = threading.Thread(target=self._read_events,
+                                  args=(pin, self._requests[pin], callback,
+                                        stop),
+                                  name='pyrigate-gpiod-{0}'.format(pin),
+                                  daemon=True)
+        self._readers[pin] = (reader, stop)
+        reader.start()
+
+    def _read_events(self, pin, request, callback, stop):
+        while not stop.is_set():
+            if request.wait_edge_events(0.1):
+                for _ in request.read_edge_events():
+                    if callback:
+                        callback(pin)
+
+    def remove_event_detect(self, pin):
+        reader, stop = self._readers.pop(pin, (None, None))
+
+        if reader:
+            stop.set()
+            reader.join()
+            self._settings[pin] = self._line_settings(pin, None,
+                                                      self._pulls.get(pin))
+            self._configure(pin)
+
+    def cleanup(self):
+        for pin in list(self._readers):
+            self.remove_event_detect(pin)
+
+        for request in self._requests.values():
+            request.release()
+
+        self._requests.clear()
+        self._settings.clear()
+        self._pulls.clear()
+        self._outputs.clear()
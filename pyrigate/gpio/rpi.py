@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""gpio backend using the RPi.GPIO library.
+
+See https://sourceforge.net/projects/raspberry-gpio-python/ for details.
+
+"""
+
+from pyrigate.gpio.backend import GpioBackend
+
+
+class RPiGpioBackend(GpioBackend):
+    """gpio backend using the RPi.GPIO library."""
+
+    name = 'rpi'
+    supports_batch = True
+
+    def __init__(self):
+        # Raises ImportError when not on a raspberry pi
+        import RPi.GPIO
+        self._gpio = RPi.GPIO
+
+    def init(self):
+        self._gpio.setmode(self._gpio.BCM)
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        kwargs = {}
+
+        if pull_up_down is not None:
+            kwargs['pull_up_down'] = pull_up_down
+
+        if initial is not None:
+            kwargs['initial'] = initial
+
+        self._gpio.setup(pin, direction, **kwargs)
+
+    def output(self, pin, value):
+        self._gpio.output(pin, value)
+
+    def output_many(self, values):
+        # RPi.GPIO accepts lists of channels and values in a single call
+        self._gpio.output(list(values.keys()), list(values.values()))
+
+    def input(self, pin):
+        return self._gpio.input(pin)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        kwargs = {}
+
+        if callback:
+            kwargs['callback'] = callback
+
+        if bouncetime:
+            kwargs['bouncetime'] = bouncetime
+
+        self._gpio.add_event_detect(pin, edge, **kwargs)
+
+    def remove_event_detect(self, pin):
+        self._gpio.remove_event_detect(pin)
+
+    def cleanup(self):
+        self._gpio.cleanup()
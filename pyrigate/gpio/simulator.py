@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""Recording gpio simulator used when not running on a raspberry pi."""
+
+import threading
+import time
+
+from pyrigate.gpio.backend import BOTH, HIGH, IN, LOW, OUT, PUD_UP, RISING,\
+    GpioBackend
+
+
+class SimulatorBackend(GpioBackend):
+    """Simulated pins that record every output operation.
+
+    Each call to output or output_many is recorded as a single
+    (monotonic_ns, {pin: value}) operation. Input values are set with
+    set_input, which also fires edge callbacks.
+
+    """
+
+    name = 'simulator'
+    mocked = True
+    supports_batch = True
+
+    def __init__(self, clock=time.monotonic_ns, max_records=10000):
+        self._clock = clock
+        self._max_records = max_records
+        self._lock = threading.Lock()
+        self.directions = {}
+        self.values = {}
+        self.records = []
+        self._callbacks = {}
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        with self._lock:
+            self.directions[pin] = direction
+
+            if direction == OUT and initial is not None:
+                self.values[pin] = initial
+            elif direction == IN:
+                self.values.setdefault(pin,
+                                       HIGH if pull_up_down == PUD_UP else LOW)
+
+    def _record(self, values):
+        with self._lock:
+            self.values.update(values)
+            self.records.append((self._clock(), dict(values)))
+
+            if self._max_records is not None and\
+                    len(self.records) > self._max_records:
+                del self.records[:len(self.records) - self._max_records]
+
+    def output(self, pin, value):
+        self._record({pin: value})
+
+    def output_many(self, values):
+        self._record(values)
+
+    def input(self, pin):
+        return self.values.get(pin, LOW)
+
+    def set_input(self, pin, value):
+        """Simulate a new value on an input pin."""
+        with self._lock:
+            old = self.values.get(pin, LOW)
+            self.values[pin] = value
+            edge, callback = self._callbacks.get(pin, (None, None))
+
+        if callback and old != value:
+            rising = value == HIGH
+
+            if edge == BOTH or (edge == RISING) == rising:
+                callback(pin)
+
+    def fire(self, pin, value=None):
+        """Call the edge callback of an input pin as if an edge occurred.
+
+        Unlike set_input, the callback is called even if the value of the
+        pin does not change.
+
+        """
+        with self._lock:
+            if value is not None:
+                self.values[pin] = value
+
+            _, callback = self._callbacks.get(pin, (None, None))
+
+        if callback:
+            callback(pin)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self._callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        self._callbacks.pop(pin, None)
+
+    def cleanup(self):
+        with self._lock:
+            self._callbacks.clear()
+            self.directions.clear()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""gpio backend using the deprecated /sys/class/gpio interface."""
+
+import os
+import select
+import threading
+
+from pyrigate.gpio.backend import BOTH, FALLING, HIGH, LOW, OUT, RISING,\
+    GpioBackend
+
+_EDGES = {RISING: 'rising', FALLING: 'falling', BOTH: 'both'}
+
+
+class SysfsBackend(GpioBackend):
+    """gpio backend using the deprecated /sys/class/gpio interface.
+
+    The kernel offers no pull-up/down configuration and no multi-pin writes
+    through sysfs.
+
+    """
+
+    name = 'sysfs'
+
+    def __init__(self, root='/sys/class/gpio'):
+        self._root = root
+        self._exported = set()
+        self._value_files = {}
+        self._watchers = {}
+
+    def _path(self, pin, name):
+        return os.path.join(self._root, 'gpio{0}'.format(pin), name)
+
+    def _write(self, path, value):
+        with open(path, 'w') as fh:
+            fh.write(value)
+
+    def _export(self, pin):
+        if pin not in self._exported:
+            if not os.path.exists(os.path.join(self._root,
+                                               'gpio{0}'.format(pin))):
+                self._write(os.path.join(self._root, 'export'), str(pin))
+
+            self._exported.add(pin)
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        self._export(pin)
+
+        if direction == OUT:
+            # 'high' and 'low' set the direction and value in one write
+            value = {HIGH: 'high', LOW: 'low'}.get(initial, 'out')
+            self._write(self._path(pin, 'direction'), value)
+        else:
+            self._write(self._path(pin, 'direction'), 'in')
+
+    def _value_file(self, pin):
+        if pin not in self._value_files:
+            self._value_files[pin] = open(self._path(pin, 'value'), 'r+')
+
+        return self._value_files[pin]
+
+    def output(self, pin, value):
+        fh = self._value_file(pin)
+        fh.seek(0)
+        fh.write('1' if value else '0')
+        fh.flush()
+
+    def input(self, pin):
+        fh = self._value_file(pin)
+        fh.seek(0)
+
+        return HIGH if fh.read(1) == '1' else LOW
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self._write(self._path(pin, 'edge'), _EDGES[edge])
+        stop = threading.Event()
+        watcher = threading.Thread(target=self._watch,
+                                   args=(pin, callback, stop),
+                                   name='pyrigate-sysfs-{0}'.format(pin),
+                                   daemon=True)
+        self._watchers[pin] = (watcher, stop)
+        watcher.start()
+
+    def _watch(self, pin, callback, stop):
+        with open(self._path(pin, 'value')) as fh:
+            poller = select.poll()
+            poller.register(fh, select.POLLPRI | select.POLLERR)
+            fh.read()
+
+            while not stop.is_set():
+                if poller.poll(100):
+                    fh.seek(0)
+                    fh.read()
+
+                    if callback:
+                        callback(pin)
+
+    def remove_event_detect(self, pin):
+        watcher, stop = self._watchers.pop(pin, (None, None))
+
+        if watcher:
+            stop.set()
+            watcher.join()
+            self._write(self._path(pin, 'edge'), 'none')
+
+    def cleanup(self):
+        for pin in list(self._watchers):
+            self.remove_event_detect(pin)
+
+        for fh in self._value_files.values():
+            fh.close()
+
+        self._value_files.clear()
+
+        for pin in self._exported:
+            self._write(os.path.join(self._root, 'unexport'), str(pin))
+
+        self._exported.clear()
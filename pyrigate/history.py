@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+"""Append-only history of waterings and sensor samples for syncing.
+
+Every record gets the next number of a sequence that keeps counting across
+restarts and segment rotation, so a client can ask for the records after
+the last sequence number it has seen. Records are appended to segment
+files named after their first sequence number, and the oldest segments
+are deleted once there are more than max_segments of them. A client whose
+cursor is older than the oldest kept record is told to reset.
+
+Each line of a segment is a JSON list: [seq, milliseconds, kind, subject,
+value].
+
+    watering   A plant was watered with value millilitres
+    missed     A watering of a plant could not be carried out
+    sample     A sensor was sampled with some value
+
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+
+from pyrigate.log import warn
+from pyrigate.user_settings import settings
+
+KINDS = ('watering', 'missed', 'sample')
+
+_SUFFIX = '.log'
+
+
+class HistoryRecord:
+    """A record in the history."""
+
+    __slots__ = ('seq', 'ms', 'kind', 'subject', 'value')
+
+    def __init__(self, seq, ms, kind, subject, value):
+        self.seq = seq
+        self.ms = ms
+        self.kind = kind
+        self.subject = subject
+        self.value = value
+
+    def to_list(self):
+        return [self.seq, self.ms, self.kind, self.subject, self.value]
+
+
+class HistoryLog:
+    """Segmented, append-only log of history records."""
+
+    def __init__(self, directory, segment_records=10000, max_segments=20,
+                 clock=time.time):
+        self._directory = directory
+        self._segment_records = segment_records
+        self._max_segments = max_segments
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment_count = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        # First sequence numbers of all segments, oldest first
+        self._segments = sorted(
+            int(name[:-len(_SUFFIX)]) for name in os.listdir(directory)
+            if name.endswith(_SUFFIX) and name[:-len(_SUFFIX)].isdigit()
+        )
+        self._next_seq = 1
+
+        if self._segments:
+            records = self._read_segment(self._segments[-1])
+            self._segment_count = len(records)
+
+            if records:
+                self._next_seq = records[-1].seq + 1
+            else:
+                self._next_seq = self._segments[-1]
+
+    @property
+    def last_seq(self):
+        """Return the sequence number of the newest record or 0."""
+        with self._lock:
+            return self._next_seq - 1
+
+    @property
+    def first_seq(self):
+        """Return the sequence number of the oldest kept record."""
+        with self._lock:
+            return self._segments[0] if self._segments else self._next_seq
+
+    def _path(self, first_seq):
+        return os.path.join(self._directory,
+                            '{0:020d}{1}'.format(first_seq, _SUFFIX))
+
+    def _read_segment(self, first_seq):
+        records = []
+
+        try:
+            with open(self._path(first_seq)) as fh:
+                for line in fh:
+                    try:
+                        records.append(HistoryRecord(*json.loads(line)))
+                    except (ValueError, TypeError):
+                        # Most likely a line cut short by a power loss
+                        continue
+        except FileNotFoundError:
+            # Deleted by rotation while being read
+            pass
+
+        return records
+
+    def _rotate(self):
+        # Must be called with the lock held
+        if self._file:
+            self._file.close()
+
+        self._segments.append(self._next_seq)
+        self._file = open(self._path(self._next_seq), 'a')
+        self._segment_count = 0
+
+        while len(self._segments) > self._max_segments:
+            try:
+                os.remove(self._path(self._segments.pop(0)))
+            except OSError as ex:
+                warn('Failed to remove old history segment: {0}', ex)
+
+    def append(self, kind, subject, value=None):
+        """Append a record and return its sequence number."""
+        with self._lock:
+            if not self._segments or\
+                    self._segment_count >= self._segment_records:
+                self._rotate()
+            elif self._file is None:
+                self._file = open(self._path(self._segments[-1]), 'a')
+
+            record = HistoryRecord(self._next_seq,
+                                   int(self._clock() * 1000), kind, subject,
+                                   value)
+            self._file.write(json.dumps(record.to_list(),
+                                        separators=(',', ':')) + '\n')
+            self._file.flush()
+            self._next_seq += 1
+            self._segment_count += 1
+
+            return record.seq
+
+    def since(self, cursor, limit=1000):
+        """Return up to limit records with sequence numbers above a cursor.
+
+        Also returns True if the client must reset, because records after
+        the cursor were already deleted or the cursor is from a history that
+        no longer exists. In the latter case, records from the start of the
+        history are returned.
+
+        """
+        with self._lock:
+            segments = list(self._segments)
+            next_seq = self._next_seq
+
+        first_seq = segments[0] if segments else next_seq
+        reset = cursor + 1 < first_seq or cursor >= next_seq
+
+        if cursor >= next_seq:
+            cursor = 0
+        records = []
+
+        # Start from the segment holding the first record after the cursor
+        index = max(0, bisect.bisect_right(segments, cursor + 1) - 1)
+
+        for segment in segments[index:]:
+            for record in self._read_segment(segment):
+                if record.seq > cursor:
+                    records.append(record)
+
+                    if len(records) >= limit:
+                        return records, reset
+
+        return records, reset
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+def encode_records(records, reset=False, more=False, cursor=0):
+    """Encode records compactly for syncing.
+
+    Subjects are listed once and referred to by index, kinds by their index
+    in KINDS, and sequence numbers and timestamps are stored as deltas from
+    the previous record, so the first record holds absolute values. Records
+    are lists of [seq delta, ms delta, kind, subject index, value].
+
+    """
+    subjects, subject_ids, encoded = [], {}, []
+    seq, ms = 0, 0
+
+    for record in records:
+        subject_id = subject_ids.get(record.subject)
+
+        if subject_id is None:
+            subject_id = subject_ids[record.subject] = len(subjects)
+            subjects.append(record.subject)
+
+        encoded.append([record.seq - seq, record.ms - ms,
+                        KINDS.index(record.kind), subject_id, record.value])
+        seq, ms = record.seq, record.ms
+
+    return {
+        'cursor': records[-1].seq if records else cursor,
+        'reset': reset,
+        'more': more,
+        'subjects': subjects,
+        'records': encoded,
+    }
+
+
+def decode_records(values):
+    """Decode records encoded by encode_records."""
+    records = []
+    seq, ms = 0, 0
+
+    for seq_delta, ms_delta, kind, subject_id, value in values['records']:
+        seq += seq_delta
+        ms += ms_delta
+        records.append(HistoryRecord(seq, ms, KINDS[kind],
+                                     values['subjects'][subject_id], value))
+
+    return records
+
+
+_history = None
+
+
+def get_history():
+    """Get the global history log."""
+    global _history
+
+    if _history is None:
+        _history = HistoryLog(**settings['history'])
+
+    return _history
+
+
+def use_history(history):
+    """Append to another history log, returning the previous one."""
+    global _history
+    previous, _history = _history, history
+
+    return previous
+
+
+def record(kind, subject, value=None):
+    """Append a record to the global history log."""
+    try:
+        get_history().append(kind, subject, value)
+    except OSError as ex:
+        warn('Failed to record history: {0}', ex)
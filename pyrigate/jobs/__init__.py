@@ -1,4 +1,6 @@
 from .job import Job
-from .status_report_mail_job import StatusReportMailJob
-from .status_report_stdout_job import StatusReportStdoutJob
+from .notification_digest_job import NotificationDigestJob
+from .status_report_job import StatusReportJob
+from .sensor_sampling_job import SensorSamplingJob
+from .statistics_job import StatisticsJob
 from .watering_job import WateringJob
@@ -6,6 +6,14 @@
 import schedule
 import threading
 
+import pyrigate.metrics as metrics
+import pyrigate.trace as trace
+from pyrigate.schedule_thread import schedule_changed
+from pyrigate.watchdog import get_monitor
+
+JOB_RUNS = metrics.counter('pyrigate_job_runs_total',
+                           'Dispatches of scheduled jobs', ('job',))
+
 
 class Job:
     """A periodic job."""
@@ -14,15 +22,48 @@ class Job:
         self._running = False
         self._runs = 0
         self._event = threading.Event()
+        self._scheduled_jobs = []
 
     def schedule(self):
         """Schedule this job."""
         raise NotImplementedError()
 
+    def _do(self, job, *args):
+        """Run this job's task with args whenever a schedule job is due."""
+        index = len(self._scheduled_jobs)
+        job = job.do(self._dispatch, index, *args).tag(self.tag)
+        self._scheduled_jobs.append(job)
+        schedule_changed()
+
+        return job
+
+    def _dispatch(self, index, *args):
+        trace.record_dispatch(self.name, index)
+        name = self.name
+        JOB_RUNS.labels(name).inc()
+
+        # The schedule job's next run is still the time it was due at
+        due = self._scheduled_jobs[index].next_run
+        monitor = get_monitor()
+        dispatch = monitor.begin(name, due.timestamp() if due else None)
+
+        try:
+            return self.task(*args)
+        finally:
+            monitor.end(dispatch)
+
+    def replay(self, index):
+        """Run the task of a schedule job as if it was due."""
+        return self._scheduled_jobs[index].job_func()
+
     def stop(self):
         """Stop this job."""
-        schedule.cancel_job(self)
+        for job in self._scheduled_jobs:
+            schedule.cancel_job(job)
+
+        self._scheduled_jobs = []
         self._running = False
+        schedule_changed()
 
     @property
     def running(self):
@@ -31,7 +72,12 @@ class Job:
     @property
     def runs(self):
         """How many times this job has run."""
-        self._runs
+        return self._runs
+
+    @property
+    def name(self):
+        """The name of this job among the controller's jobs."""
+        return self.tag
 
     @property
     def tag(self):
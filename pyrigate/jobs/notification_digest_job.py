@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A job to periodically mail digests of suppressed alerts."""
+
+import schedule
+from pyrigate.jobs import Job
+
+
+class NotificationDigestJob(Job):
+    """A pyrigate job that mails digests of rate-limited alerts."""
+
+    JOB_TAG = 'notification-digest-job'
+
+    def __init__(self, notifier, interval):
+        super().__init__()
+        self._notifier = notifier
+        self._interval = interval
+
+    def schedule(self):
+        """Mail digests every interval (in seconds)."""
+        self._do(schedule.every(self._interval).seconds)
+        self._running = True
+
+    @property
+    def name(self):
+        return 'notification-digest'
+
+    @property
+    def tag(self):
+        return NotificationDigestJob.JOB_TAG
+
+    def task(self):
+        if self._notifier.flush_digests():
+            self._runs += 1
+
+    @property
+    def description(self):
+        return f'every {self._interval:g}s'
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A job to sample sensors at their adaptive rates.
+
+Rather than checking the sensors every tick, the job runs again when the
+next sensor is due, so sensors sampled every few minutes do not wake the
+scheduler every second.
+
+"""
+
+import datetime
+import schedule
+from pyrigate.jobs import Job
+from pyrigate.notify import alert
+from pyrigate.schedule_thread import schedule_changed
+from pyrigate.sensors.calibration import calibrate_all
+
+
+class SensorSamplingJob(Job):
+    """A pyrigate job that samples each sensor when its sampler is due."""
+
+    JOB_TAG = 'sensor-sampling-job'
+
+    def __init__(self, controller, tick=1):
+        super().__init__()
+        self._controller = controller
+        self._tick = tick
+
+    def schedule(self):
+        """Check sensors when the next one is due, at most every tick."""
+        self._do(schedule.every(self._tick).seconds)
+        self._running = True
+
+    def _interval(self):
+        return max(self._tick, min(
+            (sensor.sampler.seconds_until_due()
+             for sensor in self._controller.sensors.values()),
+            default=self._tick
+        ))
+
+    def reschedule(self):
+        """Run again when the next sensor is due, e.g. after a boost."""
+        if self._scheduled_jobs:
+            job = self._scheduled_jobs[0]
+            job.interval = self._interval()
+            job.next_run = datetime.datetime.now() +\
+                datetime.timedelta(seconds=job.interval)
+            schedule_changed()
+
+    @property
+    def name(self):
+        return 'sensor-sampling'
+
+    @property
+    def tag(self):
+        return SensorSamplingJob.JOB_TAG
+
+    def task(self):
+        due = [sensor for sensor in self._controller.sensors.values()
+               if sensor.sampler.due()]
+
+        # All due sensors are read before their readings are calibrated in
+        # a single pass
+        values = calibrate_all(
+            {sensor.name: sensor.calibration for sensor in due
+             if sensor.calibration},
+            {sensor.name: sensor.read_uncalibrated() for sensor in due}
+        )
+
+        for sensor in due:
+            value = sensor.record(values[sensor.name])
+
+            if sensor.triggered_by(value):
+                alert('sensor:' + sensor.name,
+                      "Sensor '{0}' triggered".format(sensor.name),
+                      "Sensor '{0}' read {1} (threshold {2})".format(
+                          sensor.name, value, sensor.threshold))
+
+        if due:
+            self._runs += 1
+
+        # The schedule computes the next run from the interval once the
+        # task returns
+        if self._scheduled_jobs:
+            self._scheduled_jobs[0].interval = self._interval()
+
+    @property
+    def description(self):
+        return f'adaptive, checked at most every {self._tick}s'
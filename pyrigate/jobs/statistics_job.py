@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A job to periodically save running statistics."""
+
+import schedule
+from pyrigate.jobs import Job
+
+
+class StatisticsJob(Job):
+    """A pyrigate job that saves statistics to disk when they changed."""
+
+    JOB_TAG = 'statistics-job'
+
+    def __init__(self, statistics, interval):
+        super().__init__()
+        self._statistics = statistics
+        self._interval = interval
+
+    def schedule(self):
+        """Save statistics every interval (in seconds)."""
+        self._do(schedule.every(self._interval).seconds)
+        self._running = True
+
+    @property
+    def name(self):
+        return 'statistics'
+
+    @property
+    def tag(self):
+        return StatisticsJob.JOB_TAG
+
+    def task(self):
+        if self._statistics.save():
+            self._runs += 1
+
+    @property
+    def description(self):
+        return f'saved every {self._interval:g}s'
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A job to publish a status report after each completed period."""
+
+import schedule
+from pyrigate.jobs import Job
+
+
+class StatusReportJob(Job):
+    """A pyrigate job that publishes status reports to all report sinks.
+
+    The job checks for a new report once a day, so each daily, weekly,
+    monthly or yearly report is published on the first day after its period.
+
+    """
+
+    JOB_TAG = 'status-report-job'
+
+    def __init__(self, reporter, frequency, at='08:00'):
+        super().__init__()
+        self._reporter = reporter
+        self._frequency = frequency
+        self._at = at
+
+    def schedule(self):
+        """Check for a new report every day."""
+        self._do(schedule.every().day.at(self._at))
+        self._running = True
+
+    @property
+    def frequency(self):
+        return self._frequency
+
+    @property
+    def name(self):
+        return 'status-report'
+
+    @property
+    def tag(self):
+        return StatusReportJob.JOB_TAG
+
+    def task(self):
+        if self._reporter.publish(self._frequency):
+            self._runs += 1
+
+    @property
+    def description(self):
+        return f'{self._frequency}, checked daily at {self._at}'
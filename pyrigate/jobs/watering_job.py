@@ -3,9 +3,11 @@
 
 """."""
 
+import functools
 import schedule
+import pyrigate.history as history
+import pyrigate.stats as stats
 from pyrigate.jobs import Job
-from pyrigate.units.parse import parse_unit
 
 
 class WateringJob(Job):
@@ -25,7 +27,9 @@ class WateringJob(Job):
         """Schedule a watering job from a plant configuration."""
         self._config = config
         scheme = config.scheme
-        amount = scheme['amount']
+
+        # Amounts are parsed once here so running the job parses nothing
+        volume = config.volume
 
         for when in scheme['when']:
             job = None
@@ -38,7 +42,7 @@ class WateringJob(Job):
             for time in when['at']:
                 job = getattr(job, 'at')(time)
 
-            job.do(self.task, amount).tag(WateringJob.JOB_TAG)
+            self._do(job, volume)
 
         self._running = True
 
@@ -53,16 +57,54 @@ class WateringJob(Job):
         else:
             return getattr(schedule.every(), each)
 
+    @property
+    def name(self):
+        return self._config.name
+
     @property
     def tag(self):
         return WateringJob.JOB_TAG
 
-    def task(self, amount_string):
+    def _record(self, volume, watered):
+        if watered:
+            stats.record('plant_volume', self.name, volume)
+            history.record('watering', self.name, volume)
+        else:
+            stats.record('missed_runs', self.name)
+            history.record('missed', self.name)
+
+    def task(self, volume):
         pump = self._controller.get_pump(self._config.scheme['pump'])
 
-        if pump:
-            self._runs += 1
-            pump.pump_unit(*parse_unit(amount_string))
+        if not pump:
+            self._record(volume, False)
+            return
+
+        self._runs += 1
+        self._controller.check_water_level(pump)
+        zone = self._config.scheme['zone']
+
+        if zone:
+            # Batched with other zones of the pump into a single run, so the
+            # watering is recorded when the cycle ends
+            if not self._controller.sequencer.submit(
+                pump, zone, volume, functools.partial(self._record, volume)
+            ):
+                self._record(volume, False)
+                return
+        else:
+            run = pump.pump(volume)
+
+            if run is None:
+                self._record(volume, False)
+                return
+
+            # Recorded when the run ends since it may still be cancelled
+            run.add_done_callback(
+                lambda run: self._record(volume, not run.cancelled)
+            )
+
+        self._controller.boost_sensor_sampling()
 
     @property
     def description(self):
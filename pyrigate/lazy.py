@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""Import modules when they are first used instead of at import time."""
+
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Return a module that is only loaded when one of its attributes is used.
+
+    Use it for heavy modules that are not needed by every run, e.g.
+
+        colorise = lazy_import('colorise')
+
+    Once loaded, the module behaves like a normally imported one, so there is
+    no overhead after the first use. Names imported with 'from ... import'
+    are resolved at import time, so only plain module references can be lazy.
+
+    """
+    module = sys.modules.get(name)
+
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+
+    if spec is None:
+        raise ImportError("No module named '{0}'".format(name), name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    # Like the import statement, make submodules attributes of their parent
+    parent, _, child = name.rpartition('.')
+
+    if parent:
+        setattr(sys.modules[parent], child, module)
+
+    return module
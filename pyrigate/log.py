@@ -3,16 +3,20 @@
 
 """Logging and output functions."""
 
-import colorise
 import datetime
 import logging
 import os
 from pathlib import Path
 import sys
+import time
 
+import pyrigate.metrics as metrics
 from pyrigate.decorators import configurable
+from pyrigate.lazy import lazy_import
 from pyrigate.user_settings import settings
 
+colorise = lazy_import('colorise')
+
 
 # Use new-style string formatting in logging calls. See the Python docs on the
 # logging cookbook for details:
@@ -70,6 +74,14 @@ def setup_logging():
 # Create a logger object with our adapter to be used in this module
 logger = NewStyleFormatAdapter(logging.getLogger())
 
+# Log records are written synchronously by the caller, so slow writes show
+# up here rather than as a queue
+LOG_WRITE_SECONDS = metrics.histogram(
+    'pyrigate_log_write_seconds',
+    'Time spent writing a log record',
+    buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5)
+)
+
 
 def _internal_log(log_func, exception, msg, *args, **kwargs):
     """Internal, multi-purpose logging function."""
@@ -87,7 +99,9 @@ def _internal_log(log_func, exception, msg, *args, **kwargs):
     )
 
     if settings['logging']:
+        start = time.perf_counter()
         log_func(msg, *args, **kwargs)
+        LOG_WRITE_SECONDS.observe(time.perf_counter() - start)
 
     colorise.fprint(fmsg.format(*args, **kwargs), enabled=settings['colors'])
 
@@ -2,16 +2,19 @@
 
 """Functions for sending emails."""
 
-from email.mime.image import MIMEImage
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.utils import COMMASPACE, formatdate
 import mimetypes
 import os
-import smtplib
 
 from pyrigate.log import error, output
 from pyrigate.user_settings import settings
+from pyrigate.lazy import lazy_import
+
+# Only loaded once a mail is sent
+email_utils = lazy_import('email.utils')
+mime_image = lazy_import('email.mime.image')
+mime_multipart = lazy_import('email.mime.multipart')
+mime_text = lazy_import('email.mime.text')
+smtplib = lazy_import('smtplib')
 
 
 def encode_attachment(attachment, ctype):
@@ -19,9 +22,9 @@ def encode_attachment(attachment, ctype):
     maintype, subtype = ctype.split('/', 1)
 
     if maintype == 'text':
-        mode, cons = '', MIMEText
+        mode, cons = '', mime_text.MIMEText
     elif maintype == 'image':
-        mode, cons = 'rb', MIMEImage
+        mode, cons = 'rb', mime_image.MIMEImage
     else:
         error(ValueError, "Unsupported attachment type '{0}'"
               .format(maintype))
@@ -44,19 +47,10 @@ def get_password():
     return password
 
 
-def send_mail(subject, sender, receivers, message, attachments=None,
-              server=None, port=None):
-    """Send an email, possibly with attachments.
-
-    If server or port are not specified, uses the values from the
-    user_settings.py file.
-
-    The password is set through the PYRIGATE_MAIL_PASSWORD environment
-    variable.
-
-    """
+def build_message(subject, sender, receivers, message, attachments=None):
+    """Build and return a MIME message, possibly with attachments."""
     if attachments:
-        mime = MIMEMultipart()
+        mime = mime_multipart.MIMEMultipart()
 
         for attachment in attachments:
             ctype, encoding = mimetypes.guess_type(attachment)
@@ -67,39 +61,72 @@ def send_mail(subject, sender, receivers, message, attachments=None,
 
             mime.attach(encode_attachment(attachment, ctype))
 
-        mime.attach(MIMEText(message))
+        mime.attach(mime_text.MIMEText(message))
     else:
-        mime = MIMEText(message)
+        mime = mime_text.MIMEText(message)
 
     mime['Subject'] = subject
     mime['From'] = sender
-    mime['To'] = COMMASPACE.join(receivers)
-    mime['Date'] = formatdate(localtime=True)
+    mime['To'] = email_utils.COMMASPACE.join(receivers)
+    mime['Date'] = email_utils.formatdate(localtime=True)
+
+    return mime
+
 
-    smtp = None
+def open_smtp(sender, server=None, port=None, timeout=30.0):
+    """Open and return an SMTP session, authenticated unless on localhost.
+
+    If server or port are not specified, uses the values from the
+    user_settings.py file. Returns None if no password is set.
+
+    """
     server = server or settings['email']['server']
     port = port or settings['email']['port']
 
+    if server == 'localhost':
+        # Send mails without any authentication if we are just sending to
+        # 'localhost'
+        return smtplib.SMTP(server, port, timeout=timeout)
+
+    password = get_password()
+
+    if not password:
+        return None
+
+    if settings['email']['use_ssl']:
+        smtp = smtplib.SMTP_SSL(server, port, timeout=timeout)
+    else:
+        smtp = smtplib.SMTP(server, port, timeout=timeout)
+        smtp.ehlo()
+        smtp.starttls()
+        smtp.ehlo()
+
     try:
-        if server == 'localhost':
-            # Open a connection and send a mail without any authentication if
-            # we are just sending to 'localhost'
-            smtp = smtplib.SMTP(server, port)
-            smtp.sendmail(sender, receivers, message)
-        else:
-            if settings['email']['use_ssl']:
-                smtp = smtplib.SMTP_SSL(server, port)
-            else:
-                smtp = smtplib.SMTP(server, port)
-                smtp.ehlo()
-                smtp.starttls()
-                smtp.ehlo()
-
-            password = get_password()
-
-            if password:
-                smtp.login(sender, password)
-                smtp.sendmail(sender, receivers, message)
-    finally:
-        if smtp:
+        smtp.login(sender, password)
+    except smtplib.SMTPException:
+        smtp.close()
+        raise
+
+    return smtp
+
+
+def send_mail(subject, sender, receivers, message, attachments=None,
+              server=None, port=None):
+    """Send an email, possibly with attachments, and wait until it is sent.
+
+    If server or port are not specified, uses the values from the
+    user_settings.py file. Use the outbox in pyrigate.outbox to send mails
+    without blocking.
+
+    The password is set through the PYRIGATE_MAIL_PASSWORD environment
+    variable.
+
+    """
+    mime = build_message(subject, sender, receivers, message, attachments)
+    smtp = open_smtp(sender, server, port)
+
+    if smtp:
+        try:
+            smtp.sendmail(sender, receivers, mime.as_string())
+        finally:
             smtp.close()
@@ -4,13 +4,15 @@
 """Main runner for pyrigate."""
 
 import docopt
+import sys
+
 import pyrigate
-from pyrigate.main_controller import MainController
 
 
 def parse_commandline():
     options = """Usage:
-    pyrigate [-v...] [-x | --no-load-configs]
+    pyrigate [-v...] [-x | --no-load-configs] [-d | --daemon]
+             [--pidfile=<path>]
 
     Options:
         -h, --help              Display this help message.
@@ -20,6 +22,10 @@ def parse_commandline():
                                 silences all output [default: 1]. Overrides the
                                 verbosity set in user settings.
         -x, --no-load-configs   Do not load any configurations on start-up.
+        -d, --daemon            Run without the interactive shell, e.g. as a
+                                systemd service. Reload settings and
+                                configurations on SIGHUP and stop on SIGTERM.
+        --pidfile=<path>        Write the pid of the daemon to a file.
 
     """
 
@@ -27,8 +33,18 @@ def parse_commandline():
 
 
 def main():
-    MainController(parse_commandline()).run()
+    args = parse_commandline()
+
+    # Imported after parsing so '--help' and '--version' return quickly
+    from pyrigate.main_controller import MainController
+
+    controller = MainController(args)
+
+    if args['--daemon']:
+        return controller.run_daemon(args['--pidfile'])
+
+    controller.run()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
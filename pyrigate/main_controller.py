@@ -3,24 +3,51 @@
 
 """Main controller for running the event loop and scheduling tasks."""
 
+import importlib
 import json
 import os
 from pathlib import Path
 import schedule
-import schema
+import signal
+import sys
 
 import pyrigate
 import pyrigate.command
+import pyrigate.daemon as daemon
 import pyrigate.gpio as gpio
+import pyrigate.metrics as metrics
+import pyrigate.trace as trace
+from pyrigate.outbox import get_outbox, stop_outbox
 from pyrigate.config import ConfigError, PlantConfiguration
 from pyrigate.decorators import configurable
-from pyrigate.jobs import Job, StatusReportStdoutJob, WateringJob
+from pyrigate.flow_meter import FlowMeter, GpioPulseSource
+from pyrigate.history import get_history
+from pyrigate.jobs import Job, NotificationDigestJob, SensorSamplingJob,\
+    StatisticsJob, StatusReportJob, WateringJob
+from pyrigate.lazy import lazy_import
 from pyrigate.log import setup_logging, error, log, output, warn
+from pyrigate.notify import alert, get_notifier
+from pyrigate.profiler import get_profiler
 from pyrigate.pump import Pump
-from pyrigate.schedule_thread import ScheduleThread
-from pyrigate.sensor import Sensor
+from pyrigate.pump_runner import get_pump_runner
+from pyrigate.schedule_thread import ScheduleThread, schedule_lock
+from pyrigate.sensors.calibration import CalibrationTable
+from pyrigate.sensors.moisture import MoistureSensor
+from pyrigate.sensors.onewire import DS18B20_RESOLUTION, DS18B20Sensor,\
+    OneWireBus
+from pyrigate.sensors.sampling import AdaptiveSampler
+from pyrigate.sensors.water_level import WaterLevelSensor
+from pyrigate.tank import TankModel
+from pyrigate.sequencer import ZoneSequencer
+from pyrigate.report import get_reporter
+from pyrigate.stats import get_statistics
+from pyrigate.units import parse_flow_rate, parse_volume, volume_factor
+from pyrigate.valve import Valve
+from pyrigate.watchdog import Watchdog, get_monitor
 from pyrigate.user_settings import settings
 
+schema = lazy_import('schema')
+
 
 class MainController:
     """Main controller for pyrigate."""
@@ -33,15 +60,31 @@ class MainController:
         self._pumps = {}
         self._sensors = {}
         self._schedule_thread = None
+        self._watchdog = None
         self._config_jobs = {}
-
+        self._sampling_job = None
+        self._digest_job = None
+        self._statistics_job = None
+        self._report_job = None
+        self._api_server = None
+        self._metrics_server = None
+        self._onewire_bus = None
+        self._sequencer = ZoneSequencer(**settings['sequencer'])
+        self._apply_args()
+
+    def _apply_args(self):
+        """Let commandline arguments override the user settings."""
         if self._args['-v'] > 0:
             settings['verbosity'] = self._args['-v']
 
+        if self._args.get('--daemon') and not sys.stdout.isatty():
+            # Output ends up in a journal or log file
+            settings['colors'] = False
+
     def load_configs(self, config_path):
         """Load all configuration files found at the given path."""
         if self._args['--no-load-configs']:
-            return
+            return True
 
         log('Loading plant configurations')
         config_ext = PlantConfiguration.extension()
@@ -85,12 +128,120 @@ class MainController:
 
         return True
 
+    def reload_settings(self):
+        """Re-read the user settings, keeping the current ones if invalid.
+
+        Settings are updated in place so that all modules see the new values.
+        Pumps, sensors, the gpio backend and servers keep the settings they
+        were set up with until pyrigate is restarted.
+
+        """
+        import pyrigate.user_settings as user_settings
+
+        try:
+            importlib.reload(user_settings)
+        except SystemExit:
+            # Invalid settings were already reported
+            user_settings.settings = settings
+            return False
+
+        settings.update(user_settings.settings)
+        user_settings.settings = settings
+        self._apply_args()
+
+        return True
+
+    def reload_configs(self):
+        """Reload plant configurations and reschedule their watering jobs.
+
+        Jobs that were stopped stay stopped. If the configurations cannot be
+        loaded, the current ones are kept.
+
+        """
+        with schedule_lock:
+            configs, jobs = self._configs, self._config_jobs
+            stopped = {name for name, job in jobs.items() if not job.running}
+            self._configs = {}
+
+            if not self.load_configs('./configs'):
+                self._configs = configs
+                return False
+
+            for job in jobs.values():
+                job.stop()
+
+            self._config_jobs = {}
+
+            if self._current_config and\
+                    self._current_config.name not in self._configs:
+                self._current_config = None
+
+            if self._schedule_thread:
+                for name, config in self._configs.items():
+                    if name not in stopped:
+                        self._config_jobs[name] = WateringJob(self, config)
+
+            return True
+
+    def reload(self):
+        """Reload the user settings and plant configurations."""
+        log('Reloading settings and plant configurations')
+
+        return self.reload_settings() and self.reload_configs()
+
     def load_pumps(self):
         """Load all pumps from settings."""
         for pump_name in settings['pumps']:
             values = settings['pumps'][pump_name]
+            tank, sensor = None, None
+
+            if values['tank']:
+                tank_values = values['tank']
+                level = tank_values['level']
+                tank = TankModel(
+                    parse_volume(tank_values['capacity']),
+                    level=parse_volume(level) if level else None
+                )
+
+                if tank_values['sensor']:
+                    sensor = self.get_sensor(tank_values['sensor'])
+
+                    if not isinstance(sensor, WaterLevelSensor):
+                        error(ConfigError, "Pump '{0}' refers to unknown "
+                              "water level sensor '{1}'", pump_name,
+                              tank_values['sensor'])
+                        return False
+
+            kwargs = {}
+
+            if values['flow_meter']:
+                meter_values = values['flow_meter']
+                source = GpioPulseSource(meter_values['pin'],
+                                         meter_values['bouncetime'])
+                kwargs = {
+                    'flow_meter': FlowMeter(source,
+                                            meter_values['pulses_per_litre']),
+                    'metered_timeout': meter_values['timeout'],
+                    'recalibration_weight':
+                        meter_values['recalibration_weight'],
+                }
+
+            zones = {}
+
+            for zone_name, zone_values in values['zones'].items():
+                flow_rate = zone_values['flow_rate']
+                zones[zone_name] = Valve(
+                    zone_name,
+                    zone_values['pin'],
+                    parse_flow_rate(flow_rate) if flow_rate else None
+                )
+
             self._pumps[pump_name] = Pump(pump_name, values['pin'],
-                                          values['flow_rate'])
+                                          values['flow_rate'],
+                                          water_level_sensor=sensor,
+                                          tank=tank,
+                                          zones=zones,
+                                          **kwargs)
 
         return True
 
@@ -98,10 +249,45 @@ class MainController:
         """Load all sensors from settings."""
         for sensor_name in settings['sensors']:
             values = settings['sensors'][sensor_name]
-            self._sensors[sensor_name] = Sensor(sensor_name,
-                                                values['pin'],
-                                                values['threshold'],
-                                                values['analog'])
+            sampler = AdaptiveSampler(**settings['sampling'])
+            calibration = None
+
+            if values['calibration']:
+                try:
+                    calibration = CalibrationTable(
+                        values['calibration'],
+                        resolution=DS18B20_RESOLUTION
+                        if values['type'] == 'ds18b20' else 1.0
+                    )
+                except ValueError as ex:
+                    error(ConfigError, "Invalid calibration of sensor '{0}': "
+                          "{1}", sensor_name, ex)
+                    return False
+
+            if values['type'] == 'ds18b20':
+                if not self._onewire_bus:
+                    self._onewire_bus = OneWireBus(**settings['onewire'])
+
+                sensor = DS18B20Sensor(sensor_name,
+                                       values['device'],
+                                       self._onewire_bus,
+                                       threshold=values['threshold'],
+                                       sampler=sampler,
+                                       calibration=calibration)
+            else:
+                if values['type'] == 'water_level':
+                    sensor_class = WaterLevelSensor
+                else:
+                    sensor_class = MoistureSensor
+
+                sensor = sensor_class(sensor_name,
+                                      values['pin'],
+                                      values['threshold'],
+                                      values['analog'],
+                                      sampler=sampler,
+                                      calibration=calibration)
+
+            self._sensors[sensor_name] = sensor
 
         return True
 
@@ -128,6 +314,11 @@ class MainController:
         """Return a pump by name or None."""
         return self.pumps.get(name, None)
 
+    @property
+    def sequencer(self):
+        """Return the sequencer for pumps with valve zones."""
+        return self._sequencer
+
     @property
     def sensors(self):
         """Return a list of all registered sensors."""
@@ -137,36 +328,125 @@ class MainController:
         """Return a sensor by name or None."""
         return self.sensors.get(name, None)
 
+    @property
+    def api_server(self):
+        """Return the API server or None if it was never started."""
+        return self._api_server
+
+    def start_api(self):
+        """Serve the HTTP/JSON API in the background."""
+        if not self._api_server:
+            # The API runs on asyncio which is slow to import on a Pi Zero
+            from pyrigate.api import ApiServer
+
+            values = dict(settings['api'])
+            values.pop('enabled')
+            self._api_server = ApiServer(self, **values)
+
+        try:
+            self._api_server.start()
+        except (OSError, ValueError) as ex:
+            warn('Cannot serve API: {0}', ex)
+            return False
+
+        return True
+
+    def stop_api(self):
+        """Stop serving the HTTP/JSON API."""
+        if self._api_server:
+            self._api_server.stop()
+
+    @property
+    def metrics_server(self):
+        """Return the metrics server or None if it was never started."""
+        return self._metrics_server
+
+    def start_metrics(self):
+        """Serve metrics in the Prometheus text format in the background."""
+        if not self._metrics_server:
+            self._metrics_server = metrics.MetricsServer(
+                settings['metrics']['host'],
+                settings['metrics']['port']
+            )
+
+        try:
+            self._metrics_server.start()
+        except OSError as ex:
+            warn('Cannot serve metrics: {0}', ex)
+            return False
+
+        log('Serving metrics on {0}:{1}', *self._metrics_server.address)
+
+        return True
+
+    def stop_metrics(self):
+        """Stop serving metrics."""
+        if self._metrics_server:
+            self._metrics_server.stop()
+
+    def check_water_level(self, pump):
+        """Raise an alert if a pump's tank is below the warning level."""
+        warn_level = settings['warn_at_water_level']
+
+        if isinstance(warn_level, str):
+            warn_level = parse_volume(warn_level)
+        elif warn_level >= 0:
+            # Bare numbers are in deciliters
+            warn_level *= volume_factor('dl')
+
+        if pump.tank is None or warn_level < 0 or pump.level >= warn_level:
+            return False
+
+        alert('low-water:' + pump.name,
+              "Low water for pump '{0}'".format(pump.name),
+              "The tank of pump '{0}' holds about {1:.0f}ml, below the "
+              "warning level of {2:.0f}ml".format(pump.name, pump.level,
+                                                  warn_level))
+
+        return True
+
+    def boost_sensor_sampling(self):
+        """Raise the sampling rate of all sensors, e.g. after watering."""
+        for sensor in self.sensors.values():
+            sensor.sampler.boost()
+
+        if self._sampling_job:
+            with schedule_lock:
+                self._sampling_job.reschedule()
+
     def is_job_running(self, job_name):
         """Check if a job is running or not."""
         return job_name in self.all_jobs and self.all_jobs[job_name].running
 
     def start_job(self, job_name):
         """."""
-        job = self._config_jobs.get(job_name)
+        with schedule_lock:
+            job = self._config_jobs.get(job_name)
 
-        if job:
-            if job.running:
-                return False
-            else:
-                job.schedule(self.configs[job_name])
-                return True
+            if job:
+                if job.running:
+                    return False
+                else:
+                    job.schedule(self.configs[job_name])
+                    return True
 
-        self._config_jobs[job_name] = WateringJob(self, self.configs[job_name])
-        return True
+            self._config_jobs[job_name] = WateringJob(self,
+                                                      self.configs[job_name])
+            return True
 
     def stop_job(self, job_name):
         """."""
-        job = self._config_jobs.get(job_name)
+        with schedule_lock:
+            job = self._config_jobs.get(job_name)
 
-        if job:
-            if job.running:
-                job.stop()
-                return True
-            else:
-                return False
+            if job:
+                if job.running:
+                    job.stop()
+                    return True
+                else:
+                    return False
 
-        return False
+            return False
 
     @property
     def config_jobs(self):
@@ -176,17 +456,53 @@ class MainController:
     @property
     def all_jobs(self):
         """Return all types of jobs."""
-        return self.config_jobs
+        jobs = dict(self.config_jobs)
+
+        if self._sampling_job:
+            jobs[self._sampling_job.name] = self._sampling_job
+
+        if self._digest_job:
+            jobs[self._digest_job.name] = self._digest_job
+
+        if self._statistics_job:
+            jobs[self._statistics_job.name] = self._statistics_job
 
-    def start(self):
-        """Start the main controller and the event loop."""
+        if self._report_job:
+            jobs[self._report_job.name] = self._report_job
+
+        return jobs
+
+    def start(self, deliver_mail=True):
+        """Start the main controller and the event loop.
+
+        Without deliver_mail, mails left in the spool by an earlier run are
+        not delivered, e.g. when replaying a trace.
+
+        """
         setup_logging()
         log('Starting pyrigate')
-        gpio.init()
+        gpio.init(settings['gpio_backend'], settings['gpio_chip'],
+                  settings['relay_expander'], settings['actuator'])
 
+        if settings['email'] and deliver_mail:
+            # Deliver mails left in the spool by an earlier run
+            get_outbox().start()
+
+        # Sensors are loaded first so pumps can refer to water level sensors
         return self.load_configs('./configs')\
-            and self.load_pumps()\
-            and self.load_sensors()
+            and self.load_sensors()\
+            and self.load_pumps()
+
+    def _start_services(self):
+        if settings['autoschedule']:
+            log('Autoscheduling...')
+            self.schedule_tasks()
+
+        if settings['api']['enabled']:
+            self.start_api()
+
+        if settings['metrics']['enabled']:
+            self.start_metrics()
 
     def run(self):
         """Run the main controller and accept user input."""
@@ -194,10 +510,7 @@ class MainController:
             self.quit()
             return
 
-        if settings['autoschedule']:
-            log('Autoscheduling...')
-            self.schedule_tasks()
-
+        self._start_services()
         log('Running pyrigate')
         output("Type 'help' for information")
 
@@ -216,27 +529,151 @@ class MainController:
         finally:
             self.quit()
 
+    def run_daemon(self, pidfile=None):
+        """Run the main controller without user input.
+
+        Runs until SIGTERM or SIGINT and reloads the settings and plant
+        configurations on SIGHUP. Returns an exit status.
+
+        """
+        # Before any thread is started so that only the main thread, which
+        # sleeps until a signal arrives, receives them
+        daemon.block_signals()
+
+        if pidfile:
+            pidfile = daemon.PidFile(pidfile)
+
+            try:
+                pidfile.create()
+            except daemon.PidFileError as ex:
+                warn('{0}', ex)
+                return 1
+
+        try:
+            if not self.start():
+                return 1
+
+            self._start_services()
+            log('Running pyrigate as a daemon')
+            daemon.notify(READY=1, STATUS='Running', MAINPID=os.getpid())
+
+            while True:
+                signum = daemon.wait_for_signal()
+
+                if signum != signal.SIGHUP:
+                    log('Received {0}, stopping', signum.name)
+                    break
+
+                daemon.notify_reloading()
+                reloaded = self.reload()
+                daemon.notify(READY=1, STATUS='Running' if reloaded else
+                              'Running, reload failed')
+        except Exception as e:
+            error(None, str(e))
+            raise
+        finally:
+            daemon.notify(STOPPING=1)
+            self.quit()
+
+            if pidfile:
+                pidfile.remove()
+
+        return 0
+
     def quit(self):
         """Quit pyrigate."""
+        trace.stop_recording()
+        get_profiler().stop()
+        self.stop_api()
+        self.stop_metrics()
         self.cancel_tasks()
+        self._sequencer.cancel()
+        get_pump_runner().stop()
+
+        for pump in self.pumps.values():
+            if pump.flow_meter:
+                pump.flow_meter.close()
+
+        if self._onewire_bus:
+            self._onewire_bus.close()
+
         gpio.cleanup()
+        get_statistics().save()
+        get_history().close()
+        stop_outbox()
         log('Quitting pyrigate')
 
     @configurable('status_updates')
-    def send_status_report(self):
-        output('TODO: Send status report')
-
-    def schedule_tasks(self):
-        """Schedule status reports, watering plans etc."""
-        # Start the background schedule thread
-        self._schedule_thread = ScheduleThread(1)
-        self._schedule_thread.start()
-
-        for name in self.configs:
-            self._config_jobs[name] = WateringJob(self, self.configs[name])
+    def send_status_report(self, period=None):
+        """Publish the report of the last completed period to all sinks.
+
+        The period defaults to the status frequency.
+
+        """
+        return get_reporter().publish(period or settings['status_frequency'],
+                                      force=True)
+
+    def schedule_tasks(self, background=True):
+        """Schedule status reports, watering plans etc.
+
+        Without a background schedule thread, due jobs are only run by
+        calling schedule.run_pending or by replaying a trace. Scheduling
+        again restarts the watering jobs instead of adding more of them.
+
+        """
+        with schedule_lock:
+            if background:
+                if not self._schedule_thread or\
+                        self._schedule_thread.cancelled:
+                    self._schedule_thread = ScheduleThread(
+                        settings['scheduler']['max_sleep']
+                    )
+                    self._schedule_thread.start()
+
+                if settings['watchdog']['enabled'] and not self._watchdog:
+                    self._watchdog = Watchdog(get_monitor(),
+                                              settings['watchdog']['interval'])
+                    self._watchdog.start()
+
+            for name in self.configs:
+                if name in self._config_jobs:
+                    self._config_jobs[name].stop()
+
+                self._config_jobs[name] = WateringJob(self, self.configs[name])
+
+            if self.sensors and not self._sampling_job:
+                self._sampling_job = SensorSamplingJob(self)
+                self._sampling_job.schedule()
+
+            if settings['email'] and not self._digest_job:
+                self._digest_job = NotificationDigestJob(
+                    get_notifier(),
+                    settings['notifications']['digest_interval']
+                )
+                self._digest_job.schedule()
+
+            if not self._statistics_job:
+                self._statistics_job = StatisticsJob(
+                    get_statistics(),
+                    settings['statistics']['save_interval']
+                )
+                self._statistics_job.schedule()
+
+            if settings['status_updates'] and not self._report_job:
+                self._report_job = StatusReportJob(
+                    get_reporter(),
+                    settings['status_frequency'],
+                    settings['reports']['time']
+                )
+                self._report_job.schedule()
 
     def cancel_tasks(self):
         """Cancel all running plant monitoring tasks."""
-        if self._schedule_thread:
-            log('Cancelling remaining tasks', verbosity=2)
-            self._schedule_thread.cancel()
+        with schedule_lock:
+            if self._watchdog:
+                self._watchdog.cancel()
+                self._watchdog = None
+
+            if self._schedule_thread:
+                log('Cancelling remaining tasks', verbosity=2)
+                self._schedule_thread.cancel()
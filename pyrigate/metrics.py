@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+
+"""Counters, gauges and histograms in the Prometheus text format.
+
+Metrics are registered once at import time of the module they measure,
+e.g.
+
+    PUMP_ON_SECONDS = metrics.counter('pyrigate_pump_on_seconds_total',
+                                      'Seconds pumps were on', ('pump',))
+
+and updated with PUMP_ON_SECONDS.labels('main').inc(2.5). Updates only
+take a per-series lock and touch no strings beyond the label lookup, so
+they are cheap enough to leave on. Gauges of values that already exist
+elsewhere, such as the number of mails in the outbox, are read by a
+function when the metrics are collected instead of being updated.
+
+The registry is exposed in the Prometheus text format by expose() and over
+HTTP by a MetricsServer.
+
+"""
+
+import bisect
+import math
+import socket
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5,
+                   5., 10.)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    elif value == -math.inf:
+        return '-Inf'
+    elif value != value:
+        return 'NaN'
+
+    return repr(float(value))
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n')\
+        .replace('"', r'\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+
+    return '{' + ','.join('{0}="{1}"'.format(name, _escape(value))
+                          for name, value in labels) + '}'
+
+
+class _Value:
+    """A single counter or gauge series."""
+
+    __slots__ = ('_value', '_lock', '_function')
+
+    def __init__(self):
+        self._value = 0.
+        self._lock = threading.Lock()
+        self._function = None
+
+    def inc(self, amount=1.):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1.):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function):
+        """Read the value from a function when collected."""
+        self._function = function
+
+    @property
+    def value(self):
+        if self._function is not None:
+            return self._function()
+
+        return self._value
+
+
+class _HistogramValue:
+    """A single histogram series."""
+
+    __slots__ = ('_buckets', '_counts', '_sum', '_lock')
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._buckets, value)
+
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @property
+    def count(self):
+        return sum(self._counts)
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def cumulative(self):
+        """Return (upper bound, cumulative count) of each bucket."""
+        with self._lock:
+            counts = list(self._counts)
+
+        total, result = 0, []
+
+        for bound, count in zip(self._buckets + (math.inf,), counts):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket holding a quantile."""
+        buckets = self.cumulative()
+        total = buckets[-1][1]
+
+        if not total:
+            return None
+
+        for bound, count in buckets:
+            if count >= q * total:
+                return bound
+
+
+class Metric:
+    """A named metric with zero or more labelled series."""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+        # Series by the label values as given, so repeated lookups skip
+        # converting them to strings
+        self._lookup = {}
+
+        if not self.labelnames:
+            self._default = self._series[()] = self._new_series()
+
+    def _new_series(self):
+        raise NotImplementedError()
+
+    def labels(self, *values):
+        """Return the series of some label values, creating it if needed."""
+        series = self._lookup.get(values)
+
+        if series is None:
+            key = tuple(str(value) for value in values)
+
+            if len(key) != len(self.labelnames):
+                raise ValueError("Metric '{0}' expects labels {1}"
+                                 .format(self.name, self.labelnames))
+
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+                self._lookup[values] = series
+
+        return series
+
+    def remove(self, *values):
+        """Remove the series of some label values."""
+        key = tuple(str(value) for value in values)
+
+        with self._lock:
+            series = self._series.pop(key, None)
+            self._lookup = {given: cached
+                            for given, cached in self._lookup.items()
+                            if cached is not series}
+
+    def series(self):
+        """Return (labels, series) for each series."""
+        with self._lock:
+            items = list(self._series.items())
+
+        return [(tuple(zip(self.labelnames, key)), series)
+                for key, series in items]
+
+    def samples(self):
+        """Return (name, labels, value) for each sample of the metric."""
+        return [(self.name, labels, series.value)
+                for labels, series in self.series()]
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    type = 'counter'
+
+    def _new_series(self):
+        return _Value()
+
+    def inc(self, amount=1.):
+        self._default.inc(amount)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+
+class Gauge(Metric):
+    """A value that can go up and down."""
+
+    type = 'gauge'
+
+    def _new_series(self):
+        return _Value()
+
+    def inc(self, amount=1.):
+        self._default.inc(amount)
+
+    def dec(self, amount=1.):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+
+class Histogram(Metric):
+    """Counts of observed values in buckets, with their sum and count."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_series(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def samples(self):
+        samples = []
+
+        for labels, series in self.series():
+            for bound, count in series.cumulative():
+                samples.append((self.name + '_bucket',
+                                labels + (('le', _format_value(bound)),),
+                                count))
+
+            samples.append((self.name + '_sum', labels, series.sum))
+            samples.append((self.name + '_count', labels, series.count))
+
+        return samples
+
+
+class Registry:
+    """A collection of uniquely named metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        """Register a metric or return the one already registered.
+
+        Raises ValueError if a different type of metric has the name.
+
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+
+        if type(existing) is not type(metric) or\
+                existing.labelnames != metric.labelnames:
+            raise ValueError("Metric '{0}' is already registered as a "
+                             "different metric".format(metric.name))
+
+        return existing
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    @property
+    def metrics(self):
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda m: m.name)
+
+    def expose(self, prefix=''):
+        """Return metrics starting with a prefix in the text format."""
+        lines = []
+
+        for metric in self.metrics:
+            if not metric.name.startswith(prefix):
+                continue
+
+            lines.append('# HELP {0} {1}'.format(
+                metric.name,
+                metric.documentation.replace('\\', r'\\')
+                .replace('\n', r'\n')
+            ))
+            lines.append('# TYPE {0} {1}'.format(metric.name, metric.type))
+
+            for name, labels, value in metric.samples():
+                try:
+                    value = _format_value(value)
+                except (TypeError, ValueError):
+                    continue
+
+                lines.append('{0}{1} {2}'.format(name, _format_labels(labels),
+                                                 value))
+
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=(), registry=REGISTRY):
+    """Register a counter in a registry."""
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=(), registry=REGISTRY):
+    """Register a gauge in a registry."""
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS,
+              registry=REGISTRY):
+    """Register a histogram in a registry."""
+    return registry.register(Histogram(name, documentation, labelnames,
+                                       buckets))
+
+
+def expose(prefix=''):
+    """Return the default registry's metrics in the text format."""
+    return REGISTRY.expose(prefix)
+
+
+class MetricsServer:
+    """Serves a registry at /metrics over HTTP from a background thread."""
+
+    def __init__(self, host='127.0.0.1', port=9464, registry=REGISTRY):
+        self._host = host
+        self._port = port
+        self._registry = registry
+        self._server = None
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def address(self):
+        """Return the bound host and port or None if not serving."""
+        return self._server.server_address[:2] if self._server else None
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    def start(self):
+        """Start serving, raising OSError if the address cannot be bound."""
+        if self._server:
+            return
+
+        # Only needed when serving, and slow to import on a Pi Zero
+        import http.server
+
+        registry = self._registry
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+
+                body = registry.expose().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((self._host,
+                                                        self._port), Handler)
+        self._server.daemon_threads = True
+        self._stopping = False
+        self._thread = threading.Thread(target=self._serve,
+                                        name='pyrigate-metrics', daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        # Unlike serve_forever, which polls for a shutdown request twice a
+        # second, block until a request arrives. stop() connects to wake it
+        while not self._stopping:
+            self._server.handle_request()
+
+    def stop(self):
+        if self._server:
+            self._stopping = True
+            host, port = self.address
+
+            try:
+                socket.create_connection(
+                    ('127.0.0.1' if host == '0.0.0.0' else host, port),
+                    timeout=1.0
+                ).close()
+            except OSError:
+                pass
+
+            self._thread.join(timeout=1.0)
+            self._server.server_close()
+            self._server = None
+            self._thread = None
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+"""Deduplicated, rate-limited alert notifications with periodic digests.
+
+Alerts are identified by a key such as 'low-water:main'. Each alert is
+either mailed at once or folded into a digest:
+
+    - An alert with the same key as one mailed within the deduplication
+      window is merged into the digests of all subscribers
+    - Each subscriber has a token bucket allowing 'rate_limit' immediate
+      alerts per 'rate_period' seconds. Alerts beyond that are merged into
+      the subscriber's digest instead
+
+Digests list each suppressed alert once with a count and are mailed by
+flush_digests, normally from a NotificationDigestJob. Alerts are dropped only
+when there are no subscribers or a digest is full.
+
+"""
+
+import threading
+import time
+
+from pyrigate.log import log, warn
+from pyrigate.outbox import OutboxError, send_mail
+from pyrigate.user_settings import settings
+
+
+def _format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp))
+
+
+class DigestEntry:
+    """An alert suppressed one or more times since the last digest."""
+
+    def __init__(self, subject, message, now):
+        self.subject = subject
+        self.message = message
+        self.count = 1
+        self.first = now
+        self.last = now
+
+    def merge(self, message, now):
+        self.message = message
+        self.count += 1
+        self.last = now
+
+    def extend(self, later):
+        """Add the occurrences of a later entry of the same alert."""
+        self.message = later.message
+        self.count += later.count
+        self.last = later.last
+
+
+class Notifier:
+    """Decides which alerts are mailed at once and which go into digests."""
+
+    def __init__(self, dedup_window=3600.0, rate_limit=4, rate_period=3600.0,
+                 max_digest_entries=100, subscribers=None, send=None,
+                 clock=time.time):
+        """Initialise the notifier.
+
+        subscribers defaults to the subscribers in the email settings and
+        send(subject, receivers, message) to queueing mails in the outbox
+        and raises OutboxError or OSError on failure.
+
+        """
+        self._dedup_window = dedup_window
+        self._rate_limit = rate_limit
+        self._rate_period = rate_period
+        self._max_digest_entries = max_digest_entries
+        self._subscribers = subscribers
+        self._send = send or send_mail
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_sent = {}
+        self._buckets = {}
+        self._digests = {}
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self.digests = 0
+
+    @property
+    def subscribers(self):
+        if self._subscribers is not None:
+            return self._subscribers
+
+        return settings['email']['subscribers'] if settings['email'] else []
+
+    def pending(self):
+        """Return the number of digest entries waiting per subscriber."""
+        with self._lock:
+            return {subscriber: len(entries)
+                    for subscriber, entries in self._digests.items()}
+
+    def _take_token(self, subscriber, now):
+        # Must be called with the lock held
+        tokens, updated = self._buckets.get(subscriber,
+                                            (self._rate_limit, now))
+        tokens = min(self._rate_limit, tokens + (now - updated) *
+                     self._rate_limit / self._rate_period)
+
+        if tokens >= 1:
+            self._buckets[subscriber] = (tokens - 1, now)
+            return True
+
+        self._buckets[subscriber] = (tokens, now)
+
+        return False
+
+    def _add_to_digest(self, subscriber, key, subject, message, now):
+        # Must be called with the lock held
+        entries = self._digests.setdefault(subscriber, {})
+        entry = entries.get(key)
+
+        if entry:
+            entry.merge(message, now)
+        elif len(entries) < self._max_digest_entries:
+            entries[key] = DigestEntry(subject, message, now)
+        else:
+            return False
+
+        return True
+
+    def alert(self, key, subject, message):
+        """Raise an alert, returning 'sent', 'merged' or 'dropped'."""
+        subscribers = list(self.subscribers)
+
+        with self._lock:
+            now = self._clock()
+            last_sent = self._last_sent.get(key)
+            duplicate = last_sent is not None and\
+                now - last_sent < self._dedup_window
+            receivers, digested = [], False
+
+            for subscriber in subscribers:
+                if not duplicate and self._take_token(subscriber, now):
+                    receivers.append(subscriber)
+                elif self._add_to_digest(subscriber, key, subject, message,
+                                         now):
+                    digested = True
+
+            if receivers:
+                self._last_sent[key] = now
+                self.sent += 1
+                outcome = 'sent'
+            elif digested:
+                self.merged += 1
+                outcome = 'merged'
+            else:
+                self.dropped += 1
+                outcome = 'dropped'
+
+        if receivers:
+            self._deliver(subject, receivers, message)
+
+        return outcome
+
+    def flush_digests(self):
+        """Mail each subscriber the alerts suppressed since the last digest.
+
+        Returns the number of digests sent.
+
+        """
+        sent = 0
+
+        with self._lock:
+            digests, self._digests = self._digests, {}
+
+        for subscriber, entries in digests.items():
+            if not entries:
+                continue
+
+            count = sum(entry.count for entry in entries.values())
+            lines = ['{0} alert(s) were not mailed individually:'
+                     .format(count), '']
+
+            for entry in sorted(entries.values(), key=lambda e: e.first):
+                lines.append('{0}x {1} (first {2}, last {3})'.format(
+                    entry.count,
+                    entry.subject,
+                    _format_time(entry.first),
+                    _format_time(entry.last)
+                ))
+                lines.append('    ' + entry.message)
+
+            if self._deliver('Pyrigate alert digest ({0} alerts)'
+                             .format(count), [subscriber], '\n'.join(lines)):
+                self.digests += 1
+                sent += 1
+            else:
+                with self._lock:
+                    self._restore_digest(subscriber, entries)
+
+        return sent
+
+    def _restore_digest(self, subscriber, entries):
+        # Must be called with the lock held. Alerts digested since the
+        # flush are later than the restored ones
+        restored = dict(entries)
+
+        for key, entry in self._digests.get(subscriber, {}).items():
+            if key in restored:
+                restored[key].extend(entry)
+            else:
+                restored[key] = entry
+
+        self._digests[subscriber] = restored
+
+    def _deliver(self, subject, receivers, message):
+        try:
+            self._send(subject, receivers, message)
+            log("Sent alert '{0}' to {1}", subject, ', '.join(receivers),
+                verbosity=2)
+            return True
+        except (OutboxError, OSError) as ex:
+            warn("Failed to send alert '{0}': {1}", subject, ex)
+            return False
+
+
+_notifier = None
+
+
+def get_notifier():
+    """Get the global notifier."""
+    global _notifier
+
+    if _notifier is None:
+        values = dict(settings['notifications'])
+        values.pop('digest_interval')
+        _notifier = Notifier(**values)
+
+    return _notifier
+
+
+def use_notifier(notifier):
+    """Raise alerts through another notifier, returning the previous one."""
+    global _notifier
+    previous, _notifier = _notifier, notifier
+
+    return previous
+
+
+def alert(key, subject, message):
+    """Raise an alert through the global notifier."""
+    return get_notifier().alert(key, subject, message)
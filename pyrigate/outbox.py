@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+
+"""Queued mail delivery from an on-disk spool.
+
+Mails are written to a spool directory as soon as they are sent to the
+outbox, so they survive restarts and never block the caller. A background
+worker delivers due mails in batches over a single SMTP session and retries
+failed deliveries with exponential backoff. Mails that are refused
+permanently, or that fail too many times, are moved to a 'failed'
+subdirectory of the spool.
+
+"""
+
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+import pyrigate.metrics as metrics
+from pyrigate.lazy import lazy_import
+from pyrigate.log import log, warn
+from pyrigate.mail import build_message, open_smtp
+from pyrigate.user_settings import settings
+
+smtplib = lazy_import('smtplib')
+
+_SUFFIX = '.json'
+
+
+class OutboxError(Exception):
+    pass
+
+
+def _describe(reason):
+    # Braces in server responses would be taken as color formats
+    return str(reason).replace('{', '{{').replace('}', '}}')
+
+
+class SpooledMail:
+    """A mail waiting in the spool."""
+
+    def __init__(self, mail_id, sender, receivers, message, attempts=0,
+                 next_attempt=0.):
+        self.id = mail_id
+        self.sender = sender
+        self.receivers = receivers
+        self.message = message
+        self.attempts = attempts
+        self.next_attempt = next_attempt
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as fh:
+            values = json.load(fh)
+
+        return cls(os.path.basename(path)[:-len(_SUFFIX)], **values)
+
+    def save(self, path):
+        """Write the mail to a path atomically."""
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'w') as fh:
+            json.dump({
+                'sender': self.sender,
+                'receivers': self.receivers,
+                'message': self.message,
+                'attempts': self.attempts,
+                'next_attempt': self.next_attempt,
+            }, fh)
+
+        os.replace(tmp_path, path)
+
+
+class MailOutbox:
+    """Spools mails to disk and delivers them from a background thread."""
+
+    def __init__(self, spool_dir='./outbox', batch_size=20, max_attempts=10,
+                 backoff=30.0, max_backoff=3600.0, connect=None,
+                 clock=time.time):
+        """Initialise the outbox.
+
+        A failed delivery is retried after backoff seconds, doubling with
+        every attempt up to max_backoff. connect(sender) opens an SMTP
+        session and defaults to pyrigate.mail.open_smtp.
+
+        """
+        self._spool_dir = spool_dir
+        self._failed_dir = os.path.join(spool_dir, 'failed')
+        self._batch_size = batch_size
+        self._max_attempts = max_attempts
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._connect = connect or open_smtp
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._mails = {}
+        self._ids = itertools.count()
+        self._thread = None
+        self._stopped = False
+        self._busy = False
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self.sessions = 0
+
+        os.makedirs(self._failed_dir, exist_ok=True)
+
+        for name in sorted(os.listdir(spool_dir)):
+            if name.endswith(_SUFFIX):
+                try:
+                    mail = SpooledMail.load(os.path.join(spool_dir, name))
+                    self._mails[mail.id] = mail
+                except (OSError, ValueError, TypeError) as ex:
+                    warn("Ignoring unreadable spooled mail '{0}': {1}", name,
+                         ex)
+
+    @property
+    def pending(self):
+        """Return the number of mails waiting to be delivered."""
+        with self._condition:
+            return len(self._mails)
+
+    @property
+    def next_attempt(self):
+        """Return the time of the next delivery attempt or None."""
+        with self._condition:
+            return min((mail.next_attempt for mail in self._mails.values()),
+                       default=None)
+
+    def _path(self, mail_id):
+        return os.path.join(self._spool_dir, mail_id + _SUFFIX)
+
+    def send(self, subject, sender, receivers, message, attachments=None):
+        """Spool a mail for delivery and return its id."""
+        mime = build_message(subject, sender, receivers, message, attachments)
+        mail_id = '{0:020d}-{1:06d}'.format(time.time_ns(), next(self._ids))
+        mail = SpooledMail(mail_id, sender, list(receivers), mime.as_string())
+        mail.save(self._path(mail_id))
+
+        with self._condition:
+            self._mails[mail_id] = mail
+            self._ensure_thread()
+            self._condition.notify()
+
+        return mail_id
+
+    def start(self):
+        """Start delivering spooled mails."""
+        with self._condition:
+            self._ensure_thread()
+
+    def flush(self, timeout=None):
+        """Wait until no mail is due, returning False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._condition:
+            self._ensure_thread()
+            self._condition.notify()
+
+            while self._busy or self._due(self._clock()):
+                remaining = None
+
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+
+                    if remaining <= 0:
+                        return False
+
+                self._condition.wait(remaining)
+
+        return True
+
+    def stop(self):
+        """Stop the worker, leaving undelivered mails in the spool."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _ensure_thread(self):
+        # Must be called with the condition held
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run,
+                                            name='pyrigate-outbox',
+                                            daemon=True)
+            self._thread.start()
+
+    def _due(self, now):
+        # Must be called with the condition held
+        return sorted(
+            (mail for mail in self._mails.values()
+             if mail.next_attempt <= now),
+            key=lambda mail: mail.id
+        )
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+                while not self._stopped:
+                    now = self._clock()
+                    due = self._due(now)
+
+                    if due:
+                        break
+
+                    next_attempt = min((mail.next_attempt
+                                        for mail in self._mails.values()),
+                                       default=None)
+                    self._condition.wait(
+                        None if next_attempt is None else next_attempt - now
+                    )
+
+                if self._stopped:
+                    return
+
+                self._busy = True
+
+            batch = due[:self._batch_size]
+
+            try:
+                self._deliver(batch)
+            except OSError as ex:
+                # The spool could not be updated, e.g. on a full disk
+                warn('Cannot update the mail spool: {0}', _describe(ex))
+                self._postpone(batch)
+
+    def _postpone(self, mails):
+        """Hold back due mails so they are not retried right away."""
+        now = self._clock()
+
+        with self._condition:
+            for mail in mails:
+                if mail.id in self._mails and mail.next_attempt <= now:
+                    mail.next_attempt = now + self._backoff
+
+    def _deliver(self, batch):
+        """Deliver a batch of mails over a single SMTP session."""
+        smtp = None
+
+        try:
+            for index, mail in enumerate(batch):
+                try:
+                    if smtp is None:
+                        smtp = self._connect(mail.sender)
+
+                        if smtp is None:
+                            raise OutboxError('Cannot connect to mail server')
+
+                        self.sessions += 1
+
+                    smtp.sendmail(mail.sender, mail.receivers, mail.message)
+                    self._remove(mail)
+                    self.sent += 1
+                except (smtplib.SMTPRecipientsRefused,
+                        smtplib.SMTPSenderRefused) as ex:
+                    self._fail(mail, ex)
+                except smtplib.SMTPResponseException as ex:
+                    if 500 <= ex.smtp_code < 600 and\
+                            not isinstance(ex,
+                                           smtplib.SMTPAuthenticationError):
+                        self._fail(mail, ex)
+                    else:
+                        self._retry(batch[index:], ex)
+                        return
+                except (smtplib.SMTPException, OSError, OutboxError) as ex:
+                    # The session is unusable, retry the rest of the batch
+                    self._retry(batch[index:], ex)
+                    return
+        finally:
+            if smtp:
+                try:
+                    smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    smtp.close()
+
+    def _remove(self, mail):
+        with self._condition:
+            self._mails.pop(mail.id, None)
+
+        try:
+            os.remove(self._path(mail.id))
+        except FileNotFoundError:
+            pass
+
+    def _retry(self, mails, reason):
+        now = self._clock()
+
+        for mail in mails:
+            mail.attempts += 1
+
+            if mail.attempts >= self._max_attempts:
+                self._fail(mail, reason)
+                continue
+
+            # Exponential backoff with jitter so retries do not line up
+            delay = min(self._max_backoff,
+                        self._backoff * 2 ** (mail.attempts - 1))
+            mail.next_attempt = now + delay * random.uniform(0.8, 1.0)
+            mail.save(self._path(mail.id))
+            self.retries += 1
+
+        log('Mail delivery failed ({0}), retrying {1} mail(s) later',
+            _describe(reason), len(mails), verbosity=2)
+
+    def _fail(self, mail, reason):
+        with self._condition:
+            self._mails.pop(mail.id, None)
+
+        os.replace(self._path(mail.id),
+                   os.path.join(self._failed_dir, mail.id + _SUFFIX))
+        self.failed += 1
+        warn("Giving up on mail '{0}' to {1}: {2}", mail.id,
+             ', '.join(mail.receivers), _describe(reason))
+
+
+_outbox = None
+
+metrics.gauge('pyrigate_outbox_pending', 'Mails waiting in the outbox')\
+    .set_function(lambda: _outbox.pending if _outbox else 0)
+metrics.gauge('pyrigate_outbox_failed', 'Mails given up on since start')\
+    .set_function(lambda: _outbox.failed if _outbox else 0)
+
+
+def get_outbox():
+    """Get the global mail outbox."""
+    global _outbox
+
+    if _outbox is None:
+        _outbox = MailOutbox(**settings['outbox'])
+
+    return _outbox
+
+
+def stop_outbox():
+    """Stop the global mail outbox if it was used."""
+    if _outbox is not None:
+        _outbox.stop()
+
+
+def send_mail(subject, receivers=None, message='', attachments=None):
+    """Queue a mail from the configured sender to receivers.
+
+    Receivers default to the configured subscribers. Returns the mail's id
+    in the outbox.
+
+    """
+    email_settings = settings['email']
+
+    if not email_settings or not email_settings['sender']:
+        raise OutboxError('Cannot send mail, email.sender is not set')
+
+    if receivers is None:
+        receivers = email_settings['subscribers']
+
+    return get_outbox().send(subject, email_settings['sender'], receivers,
+                             message, attachments)
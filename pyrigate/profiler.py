@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+"""Built-in sampling profiler writing collapsed stacks.
+
+A background thread snapshots the stacks of all other threads with
+sys._current_frames at a fixed rate and counts identical stacks. Nothing is
+traced between samples, so the overhead is bounded by the rate and the
+number of threads rather than by how much code runs.
+
+Stacks are written in the collapsed format read by flamegraph tools such as
+flamegraph.pl, inferno and speedscope: one line per distinct stack with its
+frames from the root down separated by semicolons, followed by the number
+of samples. The root frame is the role of the thread, e.g. 'scheduler' or
+'pump', followed by the thread's name. Log records are written by the
+thread that logs, so logging shows up as pyrigate.log frames under that
+thread.
+
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+
+from pyrigate.user_settings import settings
+
+# Thread name prefixes and the roles they are reported as
+THREAD_ROLES = (
+    ('MainThread', 'main'),
+    ('pyrigate-scheduler', 'scheduler'),
+    ('pyrigate-watchdog', 'scheduler'),
+    ('pyrigate-pump-runner', 'pump'),
+    ('pyrigate-sequencer', 'pump'),
+    ('pyrigate-actuator', 'pump'),
+    ('pyrigate-gpiod', 'sensor'),
+    ('pyrigate-sysfs', 'sensor'),
+    ('pyrigate-w1', 'sensor'),
+    ('pyrigate-outbox', 'mail'),
+    ('pyrigate-api', 'api'),
+    ('pyrigate-metrics', 'api'),
+)
+
+
+def thread_role(name):
+    """Return the role of a thread from its name."""
+    for prefix, role in THREAD_ROLES:
+        if name.startswith(prefix):
+            return role
+
+    return 'other'
+
+
+class SamplingProfiler:
+    """Periodically samples the stacks of all threads."""
+
+    def __init__(self, rate=100.0, max_depth=64):
+        """Initialise the profiler to take rate samples per second."""
+        self._rate = rate
+        self._max_depth = max_depth
+        self._lock = threading.Lock()
+        self._stacks = collections.Counter()
+        self._labels = {}
+        self._thread = None
+        self._event = threading.Event()
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def start(self, rate=None):
+        """Start sampling, discarding the samples of an earlier run."""
+        if self._thread:
+            return False
+
+        if rate:
+            self._rate = rate
+
+        self.reset()
+        self._event.clear()
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run,
+                                        name='pyrigate-profiler',
+                                        daemon=True)
+        self._thread.start()
+
+        return True
+
+    def stop(self):
+        """Stop sampling and keep the samples for dumping."""
+        if not self._thread:
+            return False
+
+        self._event.set()
+        self._thread.join()
+        self._thread = None
+        self.elapsed += time.monotonic() - self.started
+
+        return True
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+            self.elapsed = 0.
+
+    def _label(self, code):
+        # Labels are cached per code object since formatting them is the
+        # most expensive part of a sample
+        label = self._labels.get(code)
+
+        if label is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            label = self._labels[code] = '{0}:{1}'.format(module,
+                                                          code.co_name)
+
+        return label
+
+    def sample(self):
+        """Take a single sample of all threads except the profiler's."""
+        names = {thread.ident: thread.name
+                 for thread in threading.enumerate()}
+        own = threading.get_ident()
+        stacks = []
+
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+
+            frames = []
+
+            while frame is not None and len(frames) < self._max_depth:
+                frames.append(self._label(frame.f_code))
+                frame = frame.f_back
+
+            name = names.get(ident, str(ident))
+            frames.append(name)
+            frames.append(thread_role(name))
+            frames.reverse()
+            stacks.append(';'.join(frames))
+
+        with self._lock:
+            self._stacks.update(stacks)
+            self.samples += 1
+
+    def _run(self):
+        interval = 1. / self._rate
+        next_sample = time.monotonic()
+
+        while True:
+            self.sample()
+            next_sample += interval
+            delay = next_sample - time.monotonic()
+
+            if delay < 0:
+                # Fell behind, e.g. on a busy Pi, so skip missed samples
+                next_sample = time.monotonic()
+                delay = 0
+
+            if self._event.wait(delay):
+                break
+
+    def stacks(self):
+        """Return the counts of the collapsed stacks sampled so far."""
+        with self._lock:
+            return dict(self._stacks)
+
+    def roles(self):
+        """Return the number of samples per thread role."""
+        counts = collections.Counter()
+
+        for stack, count in self.stacks().items():
+            counts[stack.split(';', 1)[0]] += count
+
+        return counts
+
+    def dump(self, path):
+        """Write the collapsed stacks to a file, returning the line count."""
+        stacks = sorted(self.stacks().items())
+
+        with open(path, 'w') as fh:
+            for stack, count in stacks:
+                fh.write('{0} {1}\n'.format(stack, count))
+
+        return len(stacks)
+
+
+_profiler = None
+
+
+def get_profiler():
+    """Get the global profiler."""
+    global _profiler
+
+    if _profiler is None:
+        _profiler = SamplingProfiler(**settings['profiler'])
+
+    return _profiler
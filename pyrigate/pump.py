@@ -2,20 +2,18 @@
 
 """Water pump controller class."""
 
-import re
-import time
 import pyrigate.gpio as gpio
+import pyrigate.metrics as metrics
+import pyrigate.stats as stats
+from pyrigate.log import warn
+from pyrigate.pump_runner import get_pump_runner
+from pyrigate.pump_timing import PumpTiming
+from pyrigate.units import convert_units, flow_rate_factor, parse_flow_rate
 
-
-# Unit conversion mapping to normalise flow rates to ml/s
-_UNIT_CONVERSIONS = {
-    'l':      1000.,
-    'cl':     100.,
-    'dl':     10.,
-    'hour':   1./3600.,
-    'min':    1./60.,
-    'second': 1.
-}
+PUMP_ON_SECONDS = metrics.counter('pyrigate_pump_on_seconds_total',
+                                  'Seconds pumps were on', ('pump',))
+PUMP_VOLUME = metrics.counter('pyrigate_pump_volume_ml_total',
+                              'Millilitres pumped', ('pump',))
 
 
 class Pump:
@@ -23,34 +21,57 @@ class Pump:
 
     @classmethod
     def convert_flowrate(cls, flow_rate, unit):
-        """Convert a flow rate to a given unit."""
-        volume_unit, time_unit = unit.split('/')
+        """Convert a flow rate in some unit such as 'l/min' to ml/s."""
+        return flow_rate * flow_rate_factor(unit)
+
+    def __init__(self, name, pin, flow_rate, water_level_sensor=None,
+                 tank=None, runner=None, flow_meter=None,
+                 metered_timeout=1.5, recalibration_weight=0.2, zones=None):
+        """Initialise a pump.
+
+        With a flow meter, pumped amounts are measured rather than timed. A
+        metered run is stopped after metered_timeout times its expected
+        duration in case the meter never reaches the amount, and every
+        activation moves the flow rate towards the measured flow rate by
+        recalibration_weight.
 
-        try:
-            return flow_rate * _UNIT_CONVERSIONS[volume_unit.lower()] *\
-                _UNIT_CONVERSIONS[time_unit.lower()]
-        except KeyError:
-            raise ValueError("Unknown/unsupported unit: '{0}'".format(unit))
+        zones maps zone names to the valves of the pump's manifold, if any.
 
-    def __init__(self, name, pin, flow_rate, water_level_sensor=None):
+        """
         self.name = name
         self.pin = pin
         self.flow_rate = flow_rate
         self.water_level_sensor = water_level_sensor
-
-        # This pin is going to output something (controlling the pump)
-        gpio.setup(pin, gpio.OUT)
-
-        self.deactivate()
+        self.tank = tank
+        self.flow_meter = flow_meter
+        self.zones = zones or {}
+        self._metered_timeout = metered_timeout
+        self._recalibration_weight = recalibration_weight
+        self._runner = runner or get_pump_runner()
+        self._activated_at_ns = None
+        self._activated_pulses = 0
+        self.timing = PumpTiming()
+
+        if water_level_sensor and tank:
+            # Let the sensor's sampled readings correct the tank model
+            water_level_sensor.tank = tank
+
+        # This pin is going to output something (controlling the pump) and
+        # starts out deactivated
+        gpio.setup(pin, gpio.OUT, initial=gpio.HIGH)
 
     @property
     def level(self):
-        """Return current water level."""
-        if self.water_level_sensor is None:
-            # No sensor attached, cannot read the water level
+        """Return the estimated water level in millilitres.
+
+        The level comes from the tank model and needs no hardware read.
+        Returns -1 if the pump has no tank.
+
+        """
+        if self.tank is None:
             return -1
         else:
-            return self.water_level_sensor.read()
+            return self.tank.level
 
     @property
     def name(self):
@@ -60,6 +81,15 @@ class Pump:
     def name(self, value):
         self._name = value
 
+    @property
+    def runner(self):
+        """Return the pump runner driving this pump's runs."""
+        return self._runner
+
+    @runner.setter
+    def runner(self, runner):
+        self._runner = runner
+
     @property
     def pin(self):
         """Return connecting GPIO pin."""
@@ -81,40 +111,138 @@ class Pump:
         if type(value) in (int, float):
             self._flow_rate = value
         else:
-            m = re.match(r'(\d+(\.\d+)?)\s*([A-Za-z]+/[A-Za-z]+)', value)
+            self._flow_rate = parse_flow_rate(value)
 
-            if m:
-                self._flow_rate = Pump.convert_flowrate(float(m.group(1)),
-                                                        m.group(3))
-            else:
-                raise ValueError("Unrecognised flow rate format: '{0}'"
-                                 .format(value))
+    def activate(self, duration=None):
+        """Activate the pump.
 
-    def activate(self):
-        """Activate the pump."""
-        gpio.output(self.pin, gpio.LOW)
+        If a duration in seconds is given, a gpio backend that enforces
+        deadlines itself deactivates the pump after it even if this process
+        stalls. It must still be deactivated explicitly.
+
+        """
+        if duration is None:
+            gpio.output(self.pin, gpio.LOW)
+        else:
+            gpio.output_for(self.pin, gpio.LOW, duration, gpio.HIGH)
+
+        if self._activated_at_ns is None:
+            self._activated_at_ns = self._runner.clock()
+
+            if self.flow_meter:
+                self._activated_pulses = self.flow_meter.pulses
 
     def deactivate(self):
-        """Deactivate the pump."""
+        """Deactivate the pump.
+
+        Returns the measured on-time in nanoseconds if the pump was active.
+
+        """
         gpio.output(self.pin, gpio.HIGH)
 
+        if self._activated_at_ns is None:
+            return None
+
+        on_time_ns = self._runner.clock() - self._activated_at_ns
+        self._activated_at_ns = None
+
+        if self.flow_meter:
+            volume = self.flow_meter.volume(
+                self.flow_meter.pulses - self._activated_pulses
+            )
+            self._recalibrate(volume, on_time_ns)
+        else:
+            volume = on_time_ns / 1e9 * self.flow_rate
+
+        if self.tank:
+            self.tank.consume(volume)
+
+        stats.record('pump_volume', self.name, volume)
+        stats.record('pump_on_time', self.name, on_time_ns / 1e9)
+        PUMP_ON_SECONDS.labels(self.name).inc(on_time_ns / 1e9)
+        PUMP_VOLUME.labels(self.name).inc(volume)
+
+        return on_time_ns
+
+    def _recalibrate(self, volume, on_time_ns):
+        """Move the flow rate towards a measured flow rate."""
+        if volume <= 0 or on_time_ns <= 0:
+            # Nothing flowed, most likely an empty tank or a blocked tube
+            return
+
+        measured = volume / (on_time_ns / 1e9)
+        weight = self._recalibration_weight
+        self._flow_rate = (1. - weight) * self._flow_rate + weight * measured
+
+    @property
+    def runs(self):
+        """Return the pump's active and queued runs."""
+        return self._runner.runs_for(self)
+
     def pump(self, amount):
-        """Pump some amount of water."""
-        self.pump_timed(float(amount) / self.flow_rate)
+        """Pump some amount of water in millilitres."""
+        if self.flow_meter:
+            return self.pump_metered(float(amount))
+
+        return self.pump_timed(float(amount) / self.flow_rate)
+
+    def pump_metered(self, amount):
+        """Pump until the flow meter has measured some millilitres.
+
+        Returns a handle to the run, or None if the pump is busy or its tank
+        is empty.
+
+        """
+        if self.runs:
+            warn("Not pumping, pump '{0}' is busy with another run",
+                 self.name)
+            return None
+
+        timeout = self._metered_timeout * amount / self.flow_rate
+        run = self.pump_timed(timeout)
+
+        if run:
+            # Count from the activation so no early pulses are missed
+            start = self.flow_meter.arm(amount,
+                                        lambda: self._runner.end(run),
+                                        start=self._activated_pulses)
+
+            def _done(run):
+                self.flow_meter.disarm()
+                measured = self.flow_meter.volume(
+                    self.flow_meter.pulses - start
+                )
+
+                if not run.cancelled and measured < amount:
+                    warn("Pump '{0}' timed out after measuring {1:.1f} of "
+                         "{2:.1f} mL", self.name, measured, amount)
+
+            run.add_done_callback(_done)
+
+        return run
 
     def pump_unit(self, amount, unit):
         """Pump some amount of in some unit."""
-        self.pump(convert_units(amount, unit, 'ml'))
+        return self.pump(convert_units(amount, unit, 'ml'))
 
     def pump_timed(self, duration):
-        """Pump water for some seconds."""
-        if self.level <= 0:
-            return
+        """Pump water for some seconds without blocking.
+
+        Returns a handle to the run which can be waited on or cancelled, or
+        None if the pump's tank is empty.
+
+        """
+        if self.tank and self.tank.empty:
+            warn("Not pumping, the tank of pump '{0}' is empty", self.name)
+            return None
+
+        return self._runner.start(self, duration)
 
-        self.activate()
-        time.sleep(duration)
-        self.deactivate()
+    def cancel(self):
+        """Cancel all runs of the pump, turning it off."""
+        return self._runner.cancel_pump(self)
 
     def __repr__(self):
-        return "{0}(pin={1}, flow_rate={2} mL/s)"\
-            .format(self.__class__.__name__, self.pin, self.flow_rate)
+        return "{0}(pin={1}, flow_rate={2} mL/s, tank={3})"\
+            .format(self.__class__.__name__, self.pin, self.flow_rate,
+                    self.tank)
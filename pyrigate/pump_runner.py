@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+
+"""Non-blocking, cancellable pump runs driven by a single deadline timer.
+
+Deadlines are kept in integer nanoseconds from time.monotonic_ns. The timer
+thread sleeps until shortly before a deadline and then spins for the final
+few milliseconds so that pumps are turned off as close to their deadline as
+possible. The measured on-time of each activation is fed back to the pump's
+timing statistics which shorten later runs by the typical overshoot.
+
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+import pyrigate.gpio as gpio
+from pyrigate.log import log
+
+
+class PumpRun:
+    """Handle to a pump run that ends at a monotonic deadline."""
+
+    def __init__(self, runner, run_id, pump, duration, start_ns):
+        self._runner = runner
+        self._id = run_id
+        self._pump = pump
+        self._duration = duration
+        self._start_ns = start_ns
+        self._deadline_ns = start_ns + int(duration * 1e9)
+        self._cancelled = False
+        self._on_time_ns = None
+        self._callbacks = []
+        self._done = threading.Event()
+
+    @property
+    def id(self):
+        """Return the run's id."""
+        return self._id
+
+    @property
+    def pump(self):
+        """Return the pump being run."""
+        return self._pump
+
+    @property
+    def duration(self):
+        """Return the requested duration in seconds."""
+        return self._duration
+
+    @property
+    def deadline_ns(self):
+        """Return the monotonic time in nanoseconds at which the run ends."""
+        return self._deadline_ns
+
+    @property
+    def remaining(self):
+        """Return the number of seconds left of the run."""
+        if self.done:
+            return 0.
+
+        return max(0., (self._deadline_ns - self._runner.clock()) / 1e9)
+
+    @property
+    def done(self):
+        """Return True if the run has finished or was cancelled."""
+        return self._done.is_set()
+
+    @property
+    def cancelled(self):
+        """Return True if the run was cancelled."""
+        return self._cancelled
+
+    @property
+    def on_time_ns(self):
+        """Return the measured on-time if the run turned its pump off."""
+        return self._on_time_ns
+
+    def add_done_callback(self, callback):
+        """Call callback with the run when it is done.
+
+        The callback is called right away if the run is already done.
+
+        """
+        with self._runner._condition:
+            if not self.done:
+                self._callbacks.append(callback)
+                return
+
+        callback(self)
+
+    def cancel(self):
+        """Cancel the run, stopping the pump right away."""
+        return self._runner.cancel(self)
+
+    def wait(self, timeout=None):
+        """Block until the run is done, returning False on timeout."""
+        return self._done.wait(timeout)
+
+    def _finish(self, cancelled, on_time_ns):
+        self._cancelled = cancelled
+        self._on_time_ns = on_time_ns
+
+        for callback in self._callbacks:
+            callback(self)
+
+        self._done.set()
+
+    def __repr__(self):
+        return "{0}(id={1}, pump='{2}', remaining={3:.2f}s)"\
+            .format(self.__class__.__name__, self.id, self.pump.name,
+                    self.remaining)
+
+
+class PumpRunner:
+    """Drives any number of concurrent pump runs from one timer thread.
+
+    Each run activates its pump immediately and a background thread
+    deactivates it at the run's deadline. Runs requested for a pump that is
+    already running are queued behind the current run so the pump stays on
+    for their combined duration. The timer thread deactivates every running
+    pump if it exits for any reason.
+
+    """
+
+    def __init__(self, clock=time.monotonic_ns, spin_window=0.005,
+                 threaded=True):
+        """Initialise the runner.
+
+        The timer thread busy-waits for the last spin_window seconds before
+        a deadline instead of relying on the sleep granularity of the OS.
+        Without a thread, e.g. when replaying a trace on a virtual clock, the
+        caller ends due runs with run_due.
+
+        """
+        self.clock = clock
+        self._threaded = threaded
+        self._spin_window_ns = int(spin_window * 1e9)
+        self._condition = threading.Condition()
+        self._heap = []
+        self._queues = {}
+        self._chain_starts = {}
+        self._runs = {}
+        self._ids = itertools.count(1)
+        self._thread = None
+        self._stopped = False
+
+    @property
+    def runs(self):
+        """Return all active runs by id."""
+        with self._condition:
+            return dict(self._runs)
+
+    def runs_for(self, pump):
+        """Return the active and queued runs of a pump."""
+        with self._condition:
+            return list(self._queues.get(pump.name, []))
+
+    def get_run(self, run_id):
+        """Return an active run by id or None."""
+        return self._runs.get(run_id, None)
+
+    def start(self, pump, duration):
+        """Run a pump for some seconds and return a handle to the run."""
+        with self._condition:
+            queue = self._queues.setdefault(pump.name, [])
+
+            now = self.clock()
+
+            if queue:
+                start_ns = queue[-1].deadline_ns
+            else:
+                start_ns = now
+                self._chain_starts[pump.name] = start_ns
+
+            run = PumpRun(self, next(self._ids), pump, duration, start_ns)
+            queue.append(run)
+            self._runs[run.id] = run
+
+            # Stop early by the pump's typical overshoot
+            wakeup_ns = run.deadline_ns - pump.timing.compensation_ns
+
+            # (Re)arm the deadline of backends that enforce it themselves
+            pump.activate(duration=max(0, wakeup_ns - now) / 1e9)
+
+            # An activation held back by a batch must reach the pin before
+            # the timer thread can deactivate the pump, or the deactivation
+            # is dropped as redundant and the late activation never undone
+            gpio.flush()
+            heapq.heappush(self._heap, (wakeup_ns, run.id, run))
+
+            if self._threaded:
+                self._ensure_thread()
+                self._condition.notify()
+
+        return run
+
+    def cancel(self, run):
+        """Cancel a run along with any runs queued after it on its pump."""
+        with self._condition:
+            if run.done:
+                return False
+
+            queue = self._queues[run.pump.name]
+
+            for queued_run in queue[queue.index(run):]:
+                self._finish(queued_run, cancelled=True)
+
+            self._condition.notify()
+
+        return True
+
+    def end(self, run):
+        """End a run before its deadline without cancelling it.
+
+        Used when a run reached its goal early, e.g. a metered volume. Runs
+        queued after it on the same pump are unaffected.
+
+        """
+        with self._condition:
+            if run.done:
+                return False
+
+            self._finish(run, timed=False)
+            self._condition.notify()
+
+        return True
+
+    def cancel_pump(self, pump):
+        """Cancel all runs of a pump."""
+        runs = self.runs_for(pump)
+
+        return bool(runs) and self.cancel(runs[0])
+
+    def stop(self):
+        """Cancel all runs and stop the timer thread."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def run_due(self):
+        """End all runs that are due and return the next wakeup or None."""
+        with self._condition:
+            now = self.clock()
+
+            # Pumps due at the same time are switched off at once
+            with gpio.batch():
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, run = heapq.heappop(self._heap)
+
+                    if not run.done:
+                        self._finish(run)
+
+            return self._heap[0][0] if self._heap else None
+
+    def _spin_until(self, deadline_ns):
+        clock = self.clock
+
+        while clock() < deadline_ns:
+            pass
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run,
+                                            name='pyrigate-pump-runner',
+                                            daemon=True)
+            self._thread.start()
+
+    def _finish(self, run, cancelled=False, timed=True):
+        # Must be called with the condition held
+        queue = self._queues[run.pump.name]
+        queue.remove(run)
+        del self._runs[run.id]
+        on_time_ns = None
+
+        if not queue:
+            del self._queues[run.pump.name]
+            chain_start_ns = self._chain_starts.pop(run.pump.name)
+            on_time_ns = run.pump.deactivate()
+
+            # Only runs stopped by their deadline say anything about timing
+            if timed and not cancelled and on_time_ns is not None:
+                run.pump.timing.record(run.deadline_ns - chain_start_ns,
+                                       on_time_ns)
+        elif not timed:
+            # The next queued run starts now rather than at this deadline
+            shift_ns = run.deadline_ns - self.clock()
+
+            for queued_run in queue:
+                queued_run._start_ns -= shift_ns
+                queued_run._deadline_ns -= shift_ns
+                heapq.heappush(
+                    self._heap,
+                    (queued_run.deadline_ns -
+                     queued_run.pump.timing.compensation_ns,
+                     queued_run.id, queued_run)
+                )
+
+        run._finish(cancelled, on_time_ns)
+
+    def _run(self):
+        with self._condition:
+            try:
+                while not self._stopped:
+                    wakeup_ns = self.run_due()
+
+                    if wakeup_ns is None:
+                        self._condition.wait()
+                        continue
+
+                    timeout_ns = wakeup_ns - self.clock()
+
+                    if timeout_ns > self._spin_window_ns:
+                        self._condition.wait(
+                            (timeout_ns - self._spin_window_ns) / 1e9
+                        )
+                    else:
+                        self._spin_until(wakeup_ns)
+            finally:
+                for run in list(self._runs.values()):
+                    if not run.done:
+                        self._finish(run, cancelled=True)
+
+                self._heap = []
+
+                if not self._stopped:
+                    log('Pump runner stopped unexpectedly, all pumps were '
+                        'deactivated')
+
+
+_runner = PumpRunner()
+
+
+def get_pump_runner():
+    """Get the global pump runner."""
+    return _runner
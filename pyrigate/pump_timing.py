@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""Measured on-time statistics and overshoot compensation for pumps."""
+
+import bisect
+import threading
+
+# Upper edges of the jitter histogram's bins in milliseconds
+JITTER_BINS_MS = (-10, -5, -2, -1, 0, 1, 2, 5, 10, 20, 50)
+
+
+class PumpTiming:
+    """Records how far each pump activation overshot its planned on-time.
+
+    The overshoot is tracked as an exponentially weighted moving average
+    which is subtracted from later activations to compensate for relay and
+    scheduling latency. All times are in nanoseconds.
+
+    """
+
+    def __init__(self, alpha=0.2, max_compensation_ns=50000000):
+        self._alpha = alpha
+        self._max_compensation_ns = max_compensation_ns
+        self._compensation_ns = 0
+        self._bins = [0] * (len(JITTER_BINS_MS) + 1)
+        self._count = 0
+        self._total_ns = 0
+        self._max_ns = None
+        self._min_ns = None
+        self._last_on_time_ns = None
+        self._lock = threading.Lock()
+
+    @property
+    def compensation_ns(self):
+        """Return the number of nanoseconds to cut from a planned on-time."""
+        return self._compensation_ns
+
+    @property
+    def count(self):
+        """Return the number of recorded activations."""
+        return self._count
+
+    @property
+    def last_on_time_ns(self):
+        """Return the measured on-time of the last activation."""
+        return self._last_on_time_ns
+
+    @property
+    def mean_overshoot_ns(self):
+        """Return the mean overshoot of all recorded activations."""
+        return self._total_ns / self._count if self._count else 0.
+
+    @property
+    def max_overshoot_ns(self):
+        return self._max_ns
+
+    @property
+    def min_overshoot_ns(self):
+        return self._min_ns
+
+    def record(self, planned_ns, actual_ns):
+        """Record an activation's planned and measured on-time."""
+        overshoot = actual_ns - planned_ns
+        limit = self._max_compensation_ns
+
+        with self._lock:
+            self._last_on_time_ns = actual_ns
+            self._count += 1
+            self._total_ns += overshoot
+            self._max_ns = overshoot if self._max_ns is None\
+                else max(self._max_ns, overshoot)
+            self._min_ns = overshoot if self._min_ns is None\
+                else min(self._min_ns, overshoot)
+            self._bins[
+                bisect.bisect_left(JITTER_BINS_MS, overshoot / 1e6)
+            ] += 1
+
+            # The planned on-time was already compensated so the new
+            # compensation is the old one plus the remaining overshoot
+            target = self._compensation_ns + overshoot
+            compensation = self._compensation_ns +\
+                self._alpha * (target - self._compensation_ns)
+            self._compensation_ns = int(min(max(compensation, -limit), limit))
+
+    def histogram(self):
+        """Return (label, count) pairs of the overshoot histogram in ms."""
+        labels = ['<= {0}ms'.format(JITTER_BINS_MS[0])]
+        labels += [
+            '({0}, {1}]ms'.format(lo, hi)
+            for lo, hi in zip(JITTER_BINS_MS, JITTER_BINS_MS[1:])
+        ]
+        labels.append('> {0}ms'.format(JITTER_BINS_MS[-1]))
+
+        return list(zip(labels, self._bins))
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+"""Deterministic, accelerated replay of recorded traces.
+
+A trace recorded on a field unit is fed back into a MainController with the
+same settings and plant configurations. Time is virtual: it jumps from one
+recorded event to the next, so a week of recording replays in seconds and
+every replay of a trace gives the same result. Recorded job dispatches run
+the same jobs, sensors return the recorded raw readings in order, recorded
+edges fire the same edge callbacks, and the gpio writes of the replay are
+compared against the recorded ones. Statistics, history records and alerts
+of the replay are kept apart from the real ones and stamped with the
+virtual time, and alerts are collected instead of mailed.
+
+Zone cycles of the sequencer run on their own threads in real time and are
+not replayed deterministically. Run with 'python -m pyrigate.replay'.
+
+Usage:
+    replay <trace> [--speed=<factor>] [-x]
+
+Options:
+    --speed=<factor>       Replay at a multiple of the recorded speed instead
+                           of as fast as possible.
+    -x, --no-load-configs  Do not load any configurations.
+
+"""
+
+import collections
+import tempfile
+import time
+
+import pyrigate.gpio as gpio
+import pyrigate.trace as trace
+from pyrigate.gpio.simulator import SimulatorBackend
+from pyrigate.history import HistoryLog, use_history
+from pyrigate.notify import Notifier, use_notifier
+from pyrigate.pump_runner import PumpRunner
+from pyrigate.stats import Statistics, use_statistics
+
+MAX_DIVERGENCES = 20
+
+
+class VirtualClock:
+    """Monotonic nanosecond clock that only moves when advanced.
+
+    It starts at the current monotonic time so that timestamps taken before
+    the replay remain comparable.
+
+    """
+
+    def __init__(self, start_ns=None):
+        self.now_ns = time.monotonic_ns() if start_ns is None else start_ns
+
+    def __call__(self):
+        return self.now_ns
+
+    def seconds(self):
+        """Return the time in seconds, for clocks such as time.monotonic."""
+        return self.now_ns / 1e9
+
+    def wall_clock(self):
+        """Return a clock of seconds since the epoch, for clocks such as
+        time.time, that starts at the current time and follows this clock.
+        """
+        origin_ns, origin = self.now_ns, time.time()
+
+        return lambda: origin + (self.now_ns - origin_ns) / 1e9
+
+    def advance_to(self, ns):
+        """Move the clock forward to a time, never backwards."""
+        self.now_ns = max(self.now_ns, ns)
+
+
+class ReplayResult:
+    """Outcome of replaying a trace."""
+
+    def __init__(self, events, duration_ns, wall_ns, expected, actual,
+                 skipped, missing_reads, statistics=None, alerts=()):
+        self.events = events
+        self.duration_ns = duration_ns
+        self.wall_ns = wall_ns
+        self.expected = expected
+        self.actual = actual
+        self.skipped = skipped
+        self.missing_reads = missing_reads
+        self.statistics = statistics
+        self.alerts = list(alerts)
+        self.divergences = []
+        self.max_drift_ns = 0
+
+        for index, (want, got) in enumerate(zip(expected, actual)):
+            if want[1:] != got[1:]:
+                self.divergences.append((index, want, got))
+            else:
+                self.max_drift_ns = max(self.max_drift_ns,
+                                        abs(got[0] - want[0]))
+
+        for index in range(min(len(expected), len(actual)),
+                           max(len(expected), len(actual))):
+            want = expected[index] if index < len(expected) else None
+            got = actual[index] if index < len(actual) else None
+            self.divergences.append((index, want, got))
+
+    @property
+    def passed(self):
+        """Return True if the replay wrote the same pins as the trace."""
+        return not self.divergences
+
+    @property
+    def speedup(self):
+        """Return how many times faster than recorded the replay ran."""
+        return self.duration_ns / max(1, self.wall_ns)
+
+
+class TraceReplayer:
+    """Replays trace events into a started main controller."""
+
+    def __init__(self, events, speed=None):
+        """Initialise with trace events.
+
+        With a speed, the replay is paced at that multiple of the recorded
+        speed instead of running as fast as possible.
+
+        """
+        self._events = list(events)
+        self._speed = speed
+
+    @classmethod
+    def open(cls, path, speed=None):
+        return cls(trace.TraceReader.open(path), speed=speed)
+
+    @property
+    def events(self):
+        return self._events
+
+    def replay(self, controller):
+        """Replay the trace and return a ReplayResult.
+
+        The controller's gpio backend, pump runners, sensor reads and
+        sampler clocks, as well as the global statistics, history log and
+        notifier, are replaced for the duration of the replay.
+
+        """
+        clock = VirtualClock()
+        origin_ns = clock()
+        simulator = SimulatorBackend(clock=clock, max_records=None)
+        runner = PumpRunner(clock=clock, threaded=False)
+        wall_clock = clock.wall_clock()
+        statistics = Statistics(clock=wall_clock)
+        history_dir = tempfile.TemporaryDirectory(prefix='pyrigate-replay-')
+        alerts = []
+        reads = collections.defaultdict(collections.deque)
+        missing_reads = collections.Counter()
+        skipped = 0
+
+        for event in self._events:
+            if event.kind == trace.SENSOR_READ:
+                reads[event.key].append(event.value)
+
+        def read_from_trace(name):
+            def read_raw():
+                if not reads[name]:
+                    missing_reads[name] += 1
+                    return None
+
+                return reads[name].popleft()
+
+            return read_raw
+
+        previous_backend = gpio.backend()
+        runners = {name: pump.runner
+                   for name, pump in controller.pumps.items()}
+        clocks = {name: sensor.sampler.clock
+                  for name, sensor in controller.sensors.items()}
+        scheduled = not controller.all_jobs
+
+        gpio.use_backend(simulator)
+        previous_statistics = use_statistics(statistics)
+        previous_history = use_history(HistoryLog(history_dir.name,
+                                                  clock=wall_clock))
+        previous_notifier = use_notifier(Notifier(
+            send=lambda subject, receivers, message: alerts.append(
+                (subject, receivers, message)
+            ),
+            clock=wall_clock
+        ))
+
+        for pump in controller.pumps.values():
+            pump.runner = runner
+
+        for name, sensor in controller.sensors.items():
+            sensor.read_raw = read_from_trace(name)
+            sensor.sampler.clock = clock.seconds
+
+        if scheduled:
+            controller.schedule_tasks(background=False)
+
+        jobs = controller.all_jobs
+        expected = []
+        wall_start_ns = time.perf_counter_ns()
+
+        try:
+            for event in self._events:
+                self._advance(clock, runner, origin_ns + event.ns)
+
+                if self._speed:
+                    delay_ns = wall_start_ns + event.ns / self._speed -\
+                        time.perf_counter_ns()
+
+                    if delay_ns > 0:
+                        time.sleep(delay_ns / 1e9)
+
+                if event.kind == trace.DISPATCH:
+                    job = jobs.get(event.key)
+
+                    if job is None:
+                        skipped += 1
+                    else:
+                        try:
+                            job.replay(event.value)
+                        except IndexError:
+                            skipped += 1
+                elif event.kind == trace.GPIO_EDGE:
+                    simulator.fire(event.key, event.value)
+                elif event.kind == trace.GPIO_WRITE:
+                    expected.append((event.ns, event.key, event.value))
+
+            # Let runs that outlast the trace end
+            self._advance(clock, runner, None)
+        finally:
+            wall_ns = time.perf_counter_ns() - wall_start_ns
+
+            if scheduled:
+                for job in controller.all_jobs.values():
+                    job.stop()
+
+            for name, pump in controller.pumps.items():
+                runner.cancel_pump(pump)
+                pump.runner = runners[name]
+
+            for name, sensor in controller.sensors.items():
+                del sensor.read_raw
+                sensor.sampler.clock = clocks[name]
+
+            gpio.use_backend(previous_backend)
+            use_statistics(previous_statistics)
+            use_history(previous_history).close()
+            use_notifier(previous_notifier)
+            history_dir.cleanup()
+
+        actual = [
+            (ns - origin_ns, pin, value)
+            for ns, values in simulator.records
+            for pin, value in values.items()
+        ]
+        duration_ns = self._events[-1].ns if self._events else 0
+
+        return ReplayResult(len(self._events), duration_ns, wall_ns, expected,
+                            actual, skipped, dict(missing_reads), statistics,
+                            alerts)
+
+    def _advance(self, clock, runner, target_ns):
+        """Advance the clock to a time, ending runs that are due on the way.
+        """
+        while True:
+            wakeup_ns = runner.run_due()
+
+            if wakeup_ns is None or\
+                    (target_ns is not None and wakeup_ns > target_ns):
+                break
+
+            clock.advance_to(wakeup_ns)
+
+        if target_ns is not None:
+            clock.advance_to(target_ns)
+
+
+def main():
+    import docopt
+    from pyrigate.log import output
+    from pyrigate.main_controller import MainController
+    from pyrigate.utils.printing import print_list
+
+    args = docopt.docopt(__doc__)
+    speed = float(args['--speed']) if args['--speed'] else None
+    replayer = TraceReplayer.open(args['<trace>'], speed=speed)
+    controller = MainController({
+        '-v': 0,
+        '--no-load-configs': args['--no-load-configs'],
+    })
+
+    # A replay must not deliver real mails
+    if not controller.start(deliver_mail=False):
+        return 1
+
+    try:
+        result = replayer.replay(controller)
+    finally:
+        controller.quit()
+
+    print_list([
+        ('Events', result.events),
+        ('Recorded duration', '{0:.3f}s'.format(result.duration_ns / 1e9)),
+        ('Replay time', '{0:.3f}s'.format(result.wall_ns / 1e9)),
+        ('Speedup', '{0:.1f}x'.format(result.speedup)),
+        ('Writes (expected/actual)', '{0}/{1}'.format(len(result.expected),
+                                                      len(result.actual))),
+        ('Max drift', '{0:.3f}ms'.format(result.max_drift_ns / 1e6)),
+        ('Skipped dispatches', result.skipped),
+        ('Missing sensor reads', sum(result.missing_reads.values())),
+        ('Alerts', len(result.alerts)),
+    ])
+
+    for index, want, got in result.divergences[:MAX_DIVERGENCES]:
+        output('Write {0}: expected {1}, got {2}', index, want, got)
+
+    return 0 if result.passed else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+
+"""Status reports rendered once and published to several sinks.
+
+A report covers the statistics of one completed period and is rendered from
+a template that is compiled once. Each line of a template is output once,
+except for lines starting with a section marker:
+
+    @plants <line>     Output once per plant, pump or sensor, sorted by name
+    @no_plants <line>  Output only if there are no plants, pumps or sensors
+
+Lines use str.format fields. Every line can use {period}, {key} and
+{generated}, and the lines of a section also the fields of its items:
+
+    plants   {name}, {volume}, {runs}, {missed_runs}
+    pumps    {name}, {volume}, {activations}, {on_time}
+    sensors  {name}, {samples}, {min}, {max}, {mean}
+
+A rendered report is written to every configured sink: stdout, mail through
+the outbox, a rotating text file and a JSON document for other applications.
+
+"""
+
+import json
+import os
+import string
+import sys
+import threading
+import time
+
+from pyrigate.log import log, warn
+from pyrigate.outbox import OutboxError, send_mail
+from pyrigate.stats import get_statistics
+from pyrigate.user_settings import settings
+
+DEFAULT_TEMPLATE = """\
+Pyrigate {period} status report for {key}
+
+Plants:
+@plants     {name}: {volume:.0f}ml in {runs} run(s), {missed_runs} missed
+@no_plants     No waterings
+Pumps:
+@pumps     {name}: {volume:.0f}ml in {activations} activation(s), on for \
+{on_time:.1f}s
+@no_pumps     No activations
+Sensors:
+@sensors     {name}: min {min:g}, max {max:g}, mean {mean:g} over {samples} \
+sample(s)
+@no_sensors     No samples
+"""
+
+SECTIONS = ('plants', 'pumps', 'sensors')
+
+_FIELDS = {
+    None: {'period', 'key', 'generated'},
+    'plants': {'name', 'volume', 'runs', 'missed_runs'},
+    'pumps': {'name', 'volume', 'activations', 'on_time'},
+    'sensors': {'name', 'samples', 'min', 'max', 'mean'},
+}
+
+
+class ReportError(Exception):
+    pass
+
+
+class ReportTemplate:
+    """A report template compiled into literals and fields."""
+
+    def __init__(self, text=DEFAULT_TEMPLATE):
+        self._lines = [self._compile_line(number, line)
+                       for number, line in enumerate(text.splitlines(), 1)]
+
+    @classmethod
+    def open(cls, path):
+        with open(path) as fh:
+            return cls(fh.read())
+
+    def _compile_line(self, number, line):
+        mode, section = 'once', None
+
+        if line.startswith('@'):
+            marker, _, line = line[1:].partition(' ')
+
+            if marker in SECTIONS:
+                mode, section = 'each', marker
+            elif marker.startswith('no_') and marker[3:] in SECTIONS:
+                mode, section = 'empty', marker[3:]
+            else:
+                raise ReportError("Unknown section '@{0}' on line {1}"
+                                  .format(marker, number))
+
+        fields = _FIELDS[None] | _FIELDS[section] if mode == 'each'\
+            else _FIELDS[None]
+        pieces = []
+
+        try:
+            parsed = list(string.Formatter().parse(line))
+        except ValueError as ex:
+            raise ReportError('Invalid template line {0}: {1}'
+                              .format(number, ex))
+
+        for literal, field, spec, conversion in parsed:
+            if field is not None and field not in fields:
+                raise ReportError("Unknown field '{0}' on line {1}"
+                                  .format(field, number))
+
+            if conversion not in (None, 's', 'r', 'a'):
+                raise ReportError("Invalid conversion '!{0}' on line {1}"
+                                  .format(conversion, number))
+
+            pieces.append((literal, field, spec or '', conversion))
+
+        return mode, section, pieces
+
+    @staticmethod
+    def _render_line(pieces, values):
+        parts = []
+
+        for literal, field, spec, conversion in pieces:
+            parts.append(literal)
+
+            if field is not None:
+                value = values[field]
+
+                if conversion == 's':
+                    value = str(value)
+                elif conversion == 'r':
+                    value = repr(value)
+                elif conversion == 'a':
+                    value = ascii(value)
+
+                parts.append(format(value, spec))
+
+        return ''.join(parts)
+
+    def render(self, summary, generated):
+        """Render a statistics summary to text."""
+        values = {
+            'period': summary['period'],
+            'key': summary['key'],
+            'generated': time.strftime('%Y-%m-%d %H:%M',
+                                       time.localtime(generated)),
+        }
+        lines = []
+
+        for mode, section, pieces in self._lines:
+            if mode == 'once':
+                lines.append(self._render_line(pieces, values))
+            elif mode == 'empty':
+                if not summary[section]:
+                    lines.append(self._render_line(pieces, values))
+            else:
+                for name, item in sorted(summary[section].items()):
+                    lines.append(self._render_line(
+                        pieces, dict(values, name=name, **item)
+                    ))
+
+        return '\n'.join(lines) + '\n'
+
+
+class Report:
+    """A rendered status report."""
+
+    def __init__(self, summary, text, generated):
+        self.period = summary['period']
+        self.key = summary['key']
+        self.summary = summary
+        self.text = text
+        self.generated = generated
+
+    @property
+    def subject(self):
+        return 'Pyrigate {0} status report for {1}'.format(self.period,
+                                                           self.key)
+
+    def to_dict(self):
+        return dict(self.summary, generated=self.generated, text=self.text)
+
+
+class StdoutSink:
+    """Writes reports to stdout."""
+
+    name = 'stdout'
+
+    def write(self, report):
+        sys.stdout.write(report.text)
+        sys.stdout.flush()
+
+
+class MailSink:
+    """Mails reports to subscribers through the outbox."""
+
+    name = 'email'
+
+    def __init__(self, receivers=None):
+        """Receivers default to the configured subscribers."""
+        self._receivers = receivers
+
+    def write(self, report):
+        send_mail(report.subject, self._receivers, report.text)
+
+
+class FileSink:
+    """Appends reports to a text file, rotating it when it grows too big.
+
+    When appending a report would make the file larger than max_bytes, the
+    file is renamed to 'path.1', an existing 'path.1' to 'path.2' and so on,
+    keeping up to backups old files.
+
+    """
+
+    name = 'file'
+
+    def __init__(self, path, max_bytes=1048576, backups=4):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._backups = backups
+
+    def _rotate(self):
+        for index in range(self._backups - 1, 0, -1):
+            source = '{0}.{1}'.format(self._path, index)
+
+            if os.path.exists(source):
+                os.replace(source, '{0}.{1}'.format(self._path, index + 1))
+
+        if self._backups > 0:
+            os.replace(self._path, self._path + '.1')
+        else:
+            os.remove(self._path)
+
+    def write(self, report):
+        directory = os.path.dirname(self._path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        data = report.text + '\n'
+
+        if os.path.exists(self._path) and\
+                os.path.getsize(self._path) + len(data) > self._max_bytes:
+            self._rotate()
+
+        with open(self._path, 'a') as fh:
+            fh.write(data)
+
+
+class JsonSink:
+    """Writes the latest report as a JSON document."""
+
+    name = 'json'
+
+    def __init__(self, path):
+        self._path = path
+
+    def write(self, report):
+        directory = os.path.dirname(self._path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = self._path + '.tmp'
+
+        with open(tmp_path, 'w') as fh:
+            json.dump(report.to_dict(), fh, indent=2)
+
+        os.replace(tmp_path, self._path)
+
+
+class Reporter:
+    """Renders reports of completed periods and publishes them to sinks."""
+
+    def __init__(self, statistics, sinks, template=None, clock=time.time):
+        self._statistics = statistics
+        self._sinks = list(sinks)
+        self._template = template or ReportTemplate()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._reports = {}
+        self.renders = 0
+
+    @property
+    def sinks(self):
+        return self._sinks
+
+    def _render(self, statistics):
+        self.renders += 1
+        generated = self._clock()
+
+        summary = statistics.summary()
+        return Report(summary, self._template.render(summary, generated),
+                      generated)
+
+    def report(self, period):
+        """Return the report of the last completed period.
+
+        A completed period no longer changes, so it is rendered only once.
+
+        """
+        statistics = self._statistics.previous(period)
+
+        with self._lock:
+            report = self._reports.get(period)
+
+            if report is None or report.key != statistics.key:
+                report = self._reports[period] = self._render(statistics)
+
+            return report
+
+    def report_current(self, period):
+        """Return a report of the period in progress."""
+        return self._render(self._statistics.current(period))
+
+    def publish(self, period, force=False):
+        """Publish the report of the last completed period to all sinks.
+
+        Each period is published once unless forced. Returns the report or
+        None if it was already published.
+
+        """
+        statistics = self._statistics.previous(period)
+
+        if statistics.reported and not force:
+            return None
+
+        report = self.report(period)
+
+        for sink in self._sinks:
+            try:
+                sink.write(report)
+            except (OutboxError, OSError) as ex:
+                warn("Failed to write status report to {0}: {1}", sink.name,
+                     ex)
+
+        self._statistics.mark_reported(period, report.key)
+        log("Published {0} status report for {1}", period, report.key,
+            verbosity=2)
+
+        return report
+
+
+def create_sinks(values):
+    """Create the sinks named in report settings."""
+    sinks = []
+
+    for name in values['sinks']:
+        if name == 'stdout':
+            sinks.append(StdoutSink())
+        elif name == 'email':
+            if not settings['email']:
+                warn('Not mailing status reports, email is not configured')
+                continue
+
+            sinks.append(MailSink())
+        elif name == 'file':
+            sinks.append(FileSink(values['file_path'],
+                                  values['file_max_bytes'],
+                                  values['file_backups']))
+        elif name == 'json':
+            sinks.append(JsonSink(values['json_path']))
+
+    return sinks
+
+
+_reporter = None
+
+
+def get_reporter():
+    """Get the global reporter."""
+    global _reporter
+
+    if _reporter is None:
+        values = settings['reports']
+        template = None
+
+        if values['template']:
+            try:
+                template = ReportTemplate.open(values['template'])
+            except (OSError, ReportError) as ex:
+                warn("Using the default report template, cannot use '{0}': "
+                     "{1}", values['template'], ex)
+
+        _reporter = Reporter(get_statistics(), create_sinks(values), template)
+
+    return _reporter
@@ -1,43 +1,115 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-"""Class for running scheduled jobs in the background."""
+"""Class for running scheduled jobs in the background.
+
+Instead of polling the schedule, the thread sleeps until the next job is
+due, so an idle controller does not wake up at all. Whenever jobs are added
+to or removed from the schedule, schedule_changed() wakes the threads that
+sleep on it so they can recompute how long to sleep. Threads other than the scheduler
+change the schedule while holding schedule_lock.
+
+"""
 
 import schedule
 import threading
 
+import pyrigate.metrics as metrics
+
+metrics.gauge('pyrigate_scheduled_jobs', 'Jobs in the schedule')\
+    .set_function(lambda: len(schedule.get_jobs()))
+
+_lock = threading.Lock()
+_waiters = set()
+
+# Held while due jobs run and while other threads, e.g. the API or the
+# command loop, add or remove jobs, so the schedule never changes under
+# run_pending
+schedule_lock = threading.RLock()
+
+
+def add_waiter(event):
+    """Set an event whenever the schedule changes."""
+    with _lock:
+        _waiters.add(event)
+
+
+def remove_waiter(event):
+    with _lock:
+        _waiters.discard(event)
+
+
+def schedule_changed():
+    """Wake the threads sleeping until the next job is due."""
+    with _lock:
+        for event in _waiters:
+            event.set()
+
+
+def sleep_time(max_sleep=None):
+    """Return the seconds until the next job is due or None if there is none.
+
+    The time is capped at max_sleep seconds unless it is None.
+
+    """
+    seconds = schedule.idle_seconds()
+
+    if seconds is not None:
+        seconds = max(0., seconds)
+
+    if max_sleep is not None:
+        seconds = max_sleep if seconds is None else min(seconds, max_sleep)
+
+    return seconds
+
 
 # Adapted from run_continuously at
 # https://github.com/mrhwick/schedule/blob/master/schedule/__init__.py
 class ScheduleThread(threading.Thread):
     """Thread class for continuously running scheduled tasks."""
 
-    def __init__(self, update_interval, *jobs):
-        """Initialise with an update interval and a list of jobs.
+    def __init__(self, max_sleep=None, *jobs):
+        """Initialise with a maximum sleep time and a list of jobs.
 
-        The update interval determines how often we check for scheduled jobs to
-        run.
+        The thread sleeps until the next job is due but at most max_sleep
+        seconds, unless it is None.
 
         """
-        super().__init__()
+        super().__init__(name='pyrigate-scheduler')
 
-        self._update_interval = update_interval
+        self._max_sleep = max_sleep
         self._jobs = jobs
-        self._event = threading.Event()
+        self._wakeup = threading.Event()
+        self._cancelled = False
 
     def run(self):
         """Run all scheduled jobs in the background."""
-        while True:
-            schedule.run_pending()
+        add_waiter(self._wakeup)
+
+        try:
+            while not self._cancelled:
+                self._wakeup.clear()
 
-            if self._event.wait(timeout=self._update_interval):
-                break
+                self.tick()
+
+                self._wakeup.wait(timeout=sleep_time(self._max_sleep))
+        finally:
+            remove_waiter(self._wakeup)
+
+    def tick(self):
+        """Run all jobs that are due."""
+        # Jobs are not batched together, since a job that blocks would hold
+        # back the pin changes of the others. Jobs switching several pins
+        # batch them themselves
+        with schedule_lock:
+            schedule.run_pending()
 
     def cancel(self):
         """Cancel all scheduled jobs."""
-        self._event.set()
+        self._cancelled = True
+        self._wakeup.set()
 
     @property
     def cancelled(self):
         """If all jobs have been cancelled or not."""
-        return self._event.is_set()
+        return self._cancelled
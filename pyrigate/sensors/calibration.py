@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""Sensor calibration curves compiled to dense lookup tables."""
+
+import array
+import math
+
+# Refuse to compile tables larger than a 16-bit ADC's range
+MAX_TABLE_SIZE = 1 << 16
+
+
+class CalibrationTable:
+    """Piecewise-linear calibration curve compiled to a lookup table.
+
+    The curve is given as a list of (raw, value) points, e.g. ADC counts to
+    moisture percent. On construction it is evaluated once for every step of
+    'resolution' raw units between the first and last point so that
+    converting a reading is a single table lookup. Raw values outside the
+    curve are clamped to its end points.
+
+    """
+
+    def __init__(self, points, resolution=1.0):
+        points = sorted((float(raw), float(value)) for raw, value in points)
+
+        if len(points) < 2:
+            raise ValueError('A calibration curve needs at least two points')
+
+        if any(a[0] == b[0] for a, b in zip(points, points[1:])):
+            raise ValueError('Calibration points must have distinct raw '
+                             'values')
+
+        if resolution <= 0:
+            raise ValueError('Calibration resolution must be positive')
+
+        self._resolution = float(resolution)
+        self._offset = math.floor(points[0][0] / resolution)
+        size = math.ceil(points[-1][0] / resolution) - self._offset + 1
+
+        if size > MAX_TABLE_SIZE:
+            raise ValueError('Calibration curve spans {0} raw values, at most '
+                             '{1} are supported'.format(size, MAX_TABLE_SIZE))
+
+        self._points = points
+        self._table = array.array('d', self._interpolate(points, size))
+        self._last = size - 1
+
+    def _interpolate(self, points, size):
+        segment = 0
+
+        for idx in range(size):
+            raw = (self._offset + idx) * self._resolution
+
+            while segment < len(points) - 2 and raw > points[segment + 1][0]:
+                segment += 1
+
+            (x0, y0), (x1, y1) = points[segment], points[segment + 1]
+            raw = min(max(raw, points[0][0]), points[-1][0])
+
+            yield y0 + (y1 - y0) * (raw - x0) / (x1 - x0)
+
+    @property
+    def points(self):
+        """Return the calibration points sorted by raw value."""
+        return list(self._points)
+
+    def __len__(self):
+        return len(self._table)
+
+    def __call__(self, raw):
+        """Convert a single raw value."""
+        idx = int(round(raw / self._resolution)) - self._offset
+
+        if idx < 0:
+            idx = 0
+        elif idx > self._last:
+            idx = self._last
+
+        return self._table[idx]
+
+
+def calibrate_all(tables, readings):
+    """Convert raw readings of several sensors at once.
+
+    Both arguments map sensor names to calibration tables and raw readings
+    respectively. Readings without a table or with a None value are returned
+    unchanged.
+
+    """
+    return {
+        name: raw if raw is None or name not in tables else tables[name](raw)
+        for name, raw in readings.items()
+    }
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+"""Moisture sensor controller class."""
+
+from pyrigate.sensors.sensor import Sensor
+
+
+class MoistureSensor(Sensor):
+    """Moisture sensor controller class."""
+
+    def triggered_by(self, value):
+        """Return True if the soil is drier than the threshold."""
+        return value is not None and value < self.threshold
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""Parallel 1-Wire bus driver for DS18B20 temperature probes.
+
+Uses the Linux w1 sysfs interface. All probes on a bus master are told to
+convert simultaneously by writing 'trigger' to the master's therm_bulk_read
+file, after which each probe's cached result is read in parallel. A full bus
+read therefore costs a single conversion time (~750 ms) instead of one per
+probe. See https://www.kernel.org/doc/html/latest/w1/slaves/w1_therm.html for
+details.
+
+"""
+
+import concurrent.futures
+import glob
+import os
+import re
+import threading
+import time
+
+from pyrigate.log import log
+from pyrigate.sensors.sensor import Sensor
+
+# Family code of DS18B20 probes
+DS18B20_FAMILY = '28'
+
+# Temperature step of a DS18B20 at its default 12-bit resolution
+DS18B20_RESOLUTION = 0.0625
+
+_W1_SLAVE_CRC_REGEX = re.compile(r'crc=[0-9a-f]{2} YES$', re.MULTILINE)
+_W1_SLAVE_TEMP_REGEX = re.compile(r't=(-?\d+)$', re.MULTILINE)
+
+
+class OneWireError(Exception):
+    pass
+
+
+class OneWireBus:
+    """A set of DS18B20 probes read with simultaneous conversion."""
+
+    def __init__(self, devices_dir='/sys/bus/w1/devices',
+                 conversion_time=0.75, max_age=1.0, clock=time.monotonic,
+                 sleep=time.sleep):
+        """Initialise the bus.
+
+        Results of a bus read are reused by probes asking for a value within
+        max_age seconds so that sampling N sensors costs one conversion.
+
+        """
+        self._devices_dir = devices_dir
+        self._conversion_time = conversion_time
+        self._max_age = max_age
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._executor = None
+        self._values = {}
+        self._read_at = None
+
+    @property
+    def devices_dir(self):
+        return self._devices_dir
+
+    def probes(self):
+        """Return the ids of all DS18B20 probes on the bus."""
+        pattern = os.path.join(self._devices_dir, DS18B20_FAMILY + '-*')
+
+        return sorted(os.path.basename(path) for path in glob.glob(pattern))
+
+    def _masters(self):
+        pattern = os.path.join(self._devices_dir, 'w1_bus_master*')
+
+        return sorted(glob.glob(pattern))
+
+    def trigger_conversion(self):
+        """Start a conversion on all probes of all bus masters at once.
+
+        Waits until the conversion has completed and returns True, or returns
+        False if no bus master supports bulk conversion.
+
+        """
+        bulk_files = [
+            os.path.join(master, 'therm_bulk_read')
+            for master in self._masters()
+            if os.path.isfile(os.path.join(master, 'therm_bulk_read'))
+        ]
+
+        if not bulk_files:
+            return False
+
+        for bulk_file in bulk_files:
+            with open(bulk_file, 'w') as fh:
+                fh.write('trigger\n')
+
+        deadline = self._clock() + self._conversion_time
+
+        # Reading therm_bulk_read gives -1 while a conversion is in progress
+        while any(self._bulk_status(f) == -1 for f in bulk_files):
+            if self._clock() >= deadline:
+                break
+
+            self._sleep(0.01)
+
+        return True
+
+    def _bulk_status(self, bulk_file):
+        with open(bulk_file) as fh:
+            try:
+                return int(fh.read().strip())
+            except ValueError:
+                return 0
+
+    def read_probe(self, probe):
+        """Read the temperature of a single probe in degrees celsius."""
+        probe_dir = os.path.join(self._devices_dir, probe)
+        temperature_file = os.path.join(probe_dir, 'temperature')
+
+        if os.path.isfile(temperature_file):
+            with open(temperature_file) as fh:
+                return int(fh.read().strip()) / 1000.
+
+        with open(os.path.join(probe_dir, 'w1_slave')) as fh:
+            data = fh.read()
+
+        if not _W1_SLAVE_CRC_REGEX.search(data):
+            raise OneWireError("CRC check failed for probe '{0}'"
+                               .format(probe))
+
+        m = _W1_SLAVE_TEMP_REGEX.search(data)
+
+        if not m:
+            raise OneWireError("No temperature found for probe '{0}'"
+                               .format(probe))
+
+        return int(m.group(1)) / 1000.
+
+    def _safe_read_probe(self, probe):
+        try:
+            return self.read_probe(probe)
+        except (OSError, ValueError, OneWireError) as ex:
+            log("Failed to read 1-Wire probe '{0}': {1}", probe, ex,
+                verbosity=2)
+            return None
+
+    def read_all(self):
+        """Convert and read all probes, returning a mapping of id to value.
+
+        Unreadable probes are given as None.
+
+        """
+        with self._lock:
+            probes = self.probes()
+
+            if not probes:
+                self._values = {}
+            else:
+                self.trigger_conversion()
+
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        thread_name_prefix='pyrigate-w1'
+                    )
+
+                values = self._executor.map(self._safe_read_probe, probes)
+                self._values = dict(zip(probes, values))
+
+            self._read_at = self._clock()
+
+            return dict(self._values)
+
+    def read(self, probe):
+        """Return a probe's value, reading the bus if results are stale."""
+        if self._read_at is None or\
+                self._clock() - self._read_at > self._max_age:
+            self.read_all()
+
+        return self._values.get(probe)
+
+    def close(self):
+        """Shut down the reader threads."""
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+
+
+class DS18B20Sensor(Sensor):
+    """DS18B20 temperature probe on a shared 1-Wire bus."""
+
+    def __init__(self, name, device, bus, threshold=None, sampler=None,
+                 calibration=None):
+        super().__init__(name, None, threshold, False, sampler=sampler,
+                         calibration=calibration)
+        self._device = device
+        self._bus = bus
+
+    @property
+    def device(self):
+        """Return the 1-Wire id of the probe."""
+        return self._device
+
+    def triggered_by(self, value):
+        """Return True if the temperature is above the threshold."""
+        return self.threshold is not None and value is not None\
+            and value > self.threshold
+
+    def read_raw(self):
+        """Read the temperature in degrees celsius."""
+        return self._bus.read(self._device)
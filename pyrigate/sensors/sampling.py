@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""Adaptive sampling rates for sensors."""
+
+import collections
+import statistics
+import time
+
+
+class AdaptiveSampler:
+    """Adapts a sensor's sampling rate to how fast its readings change.
+
+    The effective rate is a floor rate plus a boost that decays exponentially
+    with a configurable half-life. The boost is raised to the maximum rate
+    after watering and in proportion to the variance of recent readings.
+    Rates are given in samples per minute.
+
+    """
+
+    def __init__(self, floor_rate=0.2, max_rate=6.0, half_life=900.0,
+                 variance_threshold=0.01, window=10, clock=time.monotonic):
+        if floor_rate <= 0 or max_rate < floor_rate:
+            raise ValueError('Sampling rates must satisfy '
+                             '0 < floor_rate <= max_rate')
+
+        self._floor_rate = floor_rate
+        self._max_rate = max_rate
+        self._half_life = half_life
+        self._variance_threshold = variance_threshold
+        self._readings = collections.deque(maxlen=max(2, window))
+        self.clock = clock
+        self._boost = 0.
+        self._boosted_at = clock()
+        self._last_sample = None
+
+    @property
+    def floor_rate(self):
+        """Return the rate the sampler decays towards."""
+        return self._floor_rate
+
+    @property
+    def max_rate(self):
+        """Return the highest rate the sampler can be boosted to."""
+        return self._max_rate
+
+    @property
+    def rate(self):
+        """Return the effective sampling rate in samples per minute."""
+        return self._floor_rate + self._current_boost(self.clock())
+
+    @property
+    def interval(self):
+        """Return the current number of seconds between samples."""
+        return 60. / self.rate
+
+    @property
+    def variance(self):
+        """Return the variance of the recent readings."""
+        if len(self._readings) < 2:
+            return 0.
+
+        return statistics.pvariance(self._readings)
+
+    def _current_boost(self, now):
+        elapsed = now - self._boosted_at
+
+        return self._boost * 0.5 ** (elapsed / self._half_life)
+
+    def boost(self, fraction=1.):
+        """Raise the rate by a fraction of the range above the floor rate.
+
+        Never lowers a boost that is currently larger.
+
+        """
+        now = self.clock()
+        target = min(1., fraction) * (self._max_rate - self._floor_rate)
+
+        if target > self._current_boost(now):
+            self._boost = target
+            self._boosted_at = now
+
+    def due(self):
+        """Return True if the sensor should be sampled now."""
+        if self._last_sample is None:
+            return True
+
+        return self.clock() - self._last_sample >= self.interval
+
+    def seconds_until_due(self):
+        """Return the seconds until the sensor is due at the current rate.
+
+        Since a boost only decays, the sensor is never due earlier than this
+        unless it is boosted again.
+
+        """
+        if self._last_sample is None:
+            return 0.
+
+        return max(0., self._last_sample + self.interval - self.clock())
+
+    def update(self, value):
+        """Record a new reading and adapt the rate to its variance."""
+        self._last_sample = self.clock()
+
+        if value is None:
+            return
+
+        self._readings.append(float(value))
+        variance = self.variance
+
+        if variance > self._variance_threshold:
+            self.boost(variance / (2 * self._variance_threshold))
@@ -4,18 +4,39 @@
 
 from abc import ABCMeta, abstractmethod
 import pyrigate.gpio as gpio
+import pyrigate.history as history
+import pyrigate.metrics as metrics
+import pyrigate.stats as stats
+import pyrigate.trace as trace
+from pyrigate.sensors.sampling import AdaptiveSampler
+
+SENSOR_VALUE = metrics.gauge('pyrigate_sensor_value',
+                             'Last sampled value of a sensor', ('sensor',))
+SENSOR_SAMPLES = metrics.counter('pyrigate_sensor_samples_total',
+                                 'Sensor samples', ('sensor',))
 
 
 class Sensor(object, metaclass=ABCMeta):
     """Base class for all sensors."""
 
-    def __init__(self, pin, threshold, analog):
+    def __init__(self, name, pin, threshold, analog, sampler=None,
+                 calibration=None):
         """Initialise the sensor with an input pin and a trigger threshold."""
+        self._name = name
         self._pin = pin
         self._threshold = threshold
         self._analog = analog
+        self._sampler = sampler or AdaptiveSampler()
+        self._calibration = calibration
+        self._last_value = None
+
+        if pin is not None:
+            gpio.setup(pin, gpio.IN)
 
-        gpio.setup(pin, gpio.INPUT)
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
 
     @property
     def pin(self):
@@ -28,9 +49,13 @@ class Sensor(object, metaclass=ABCMeta):
         return self._threshold
 
     @property
-    @abstractmethod
     def triggered(self):
         """Return True if the sensor was triggered."""
+        return self.triggered_by(self.read())
+
+    @abstractmethod
+    def triggered_by(self, value):
+        """Return True if a reading triggers the sensor."""
         pass
 
     @property
@@ -38,6 +63,58 @@ class Sensor(object, metaclass=ABCMeta):
         """Return True if the sensor is analog, False if it is digital."""
         return self._analog
 
-    def read(self):
-        """Read a analog/digital value from the sensor."""
+    @property
+    def sampler(self):
+        """Return the adaptive sampler controlling this sensor's rate."""
+        return self._sampler
+
+    @property
+    def calibration(self):
+        """Return the sensor's calibration table or None."""
+        return self._calibration
+
+    @property
+    def last_value(self):
+        """Return the most recently sampled value."""
+        return self._last_value
+
+    def read_raw(self):
+        """Read an uncalibrated analog/digital value from the sensor."""
         return gpio.input(self.pin)
+
+    def read_uncalibrated(self):
+        """Read a raw value from the sensor and record it in the trace."""
+        value = self.read_raw()
+        trace.record_sensor_read(self.name, value)
+
+        return value
+
+    def read(self):
+        """Read a analog/digital value from the sensor and calibrate it."""
+        value = self.read_uncalibrated()
+
+        if value is None or self._calibration is None:
+            return value
+
+        return self._calibration(value)
+
+    def sample(self):
+        """Read the sensor and feed the value to its adaptive sampler."""
+        return self.record(self.read())
+
+    def record(self, value):
+        """Record a calibrated value read from the sensor as a sample."""
+        self._last_value = value
+        self._sampler.update(value)
+        SENSOR_SAMPLES.labels(self.name).inc()
+
+        if value is not None:
+            SENSOR_VALUE.labels(self.name).set(value)
+            stats.record('sensor', self.name, value)
+            history.record('sample', self.name, value)
+
+        return value
+
+    def __repr__(self):
+        return "{0}(pin={1}, rate={2:.2f}/min)"\
+            .format(self.__class__.__name__, self.pin, self.sampler.rate)
@@ -2,14 +2,31 @@
 
 """Water-level sensor controller class."""
 
-from .sensors.sensor import Sensor
+from pyrigate.sensors.sensor import Sensor
 
 
 class WaterLevelSensor(Sensor):
-    """Water-level sensor controller class."""
+    """Water-level sensor controller class.
 
-    def __init__(self, pin, threshold, analog):
-        super().__init__(pin, threshold, analog)
+    Readings are expected in millilitres, use a calibration curve to convert
+    raw values. Sampled readings are fused with the attached tank model.
 
-    def read(self):
-        return 0
+    """
+
+    def __init__(self, name, pin, threshold, analog, sampler=None,
+                 calibration=None):
+        super().__init__(name, pin, threshold, analog, sampler=sampler,
+                         calibration=calibration)
+        self.tank = None
+
+    def triggered_by(self, value):
+        """Return True if the water level is below the threshold."""
+        return value is not None and value < self.threshold
+
+    def record(self, value):
+        value = super().record(value)
+
+        if value is not None and self.tank:
+            self.tank.observe(value)
+
+        return value
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""Sequencing of watering zones that share a single pump."""
+
+import collections
+import threading
+
+import pyrigate.gpio as gpio
+from pyrigate.log import log, warn
+
+
+class ZoneSequencer:
+    """Waters the zones of a pump's valve manifold in one continuous run.
+
+    Watering requests for zones are collected for a short batch window. The
+    requests of each pump are then merged by zone and watered in a single
+    cycle: the pump runs once for the total duration while the zones' valves
+    are opened in turn. Zones are ordered by flow rate so that the pressure
+    changes as little as possible between consecutive zones, and the next
+    valve is opened shortly before the previous one is closed so the pump
+    never pushes against a closed manifold.
+
+    """
+
+    def __init__(self, batch_window=2.0, valve_overlap=0.5):
+        self._batch_window = batch_window
+        self._valve_overlap = valve_overlap
+        self._lock = threading.Lock()
+        self._pending = collections.defaultdict(list)
+        self._pumps = {}
+        self._workers = {}
+        self._timer = None
+        self._cancelled = threading.Event()
+
+    def submit(self, pump, zone, volume, callback=None):
+        """Request watering a pump's zone with some millilitres.
+
+        Returns False if the pump has no such zone. Otherwise,
+        callback(watered) is called once the cycle has ended, with False if
+        the cycle failed or was cancelled.
+
+        """
+        if zone not in pump.zones:
+            warn("Pump '{0}' has no zone '{1}'", pump.name, zone)
+            return False
+
+        with self._lock:
+            self._pending[pump.name].append((zone, volume, callback))
+            self._pumps[pump.name] = pump
+
+            if self._timer is None:
+                self._timer = threading.Timer(self._batch_window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        return True
+
+    def flush(self):
+        """Start a cycle for every pump with pending requests."""
+        with self._lock:
+            self._timer = None
+
+            for name in self._pending:
+                worker = self._workers.get(name)
+
+                if worker is None or not worker.is_alive():
+                    worker = threading.Thread(
+                        target=self._run_cycles,
+                        args=(self._pumps[name],),
+                        name='pyrigate-sequencer-{0}'.format(name),
+                        daemon=True
+                    )
+                    self._workers[name] = worker
+                    worker.start()
+
+    def plan(self, pump, requests):
+        """Return the ordered (valve, duration) steps of a cycle."""
+        volumes = collections.OrderedDict()
+
+        for zone, volume, _ in requests:
+            volumes[zone] = volumes.get(zone, 0.) + volume
+
+        steps = []
+
+        for zone, volume in volumes.items():
+            valve = pump.zones[zone]
+            flow_rate = valve.flow_rate or pump.flow_rate
+            steps.append((valve, volume / flow_rate, flow_rate))
+
+        steps.sort(key=lambda step: step[2])
+
+        return [(valve, duration) for valve, duration, _ in steps]
+
+    def _run_cycles(self, pump):
+        while not self._cancelled.is_set():
+            with self._lock:
+                requests = self._pending.pop(pump.name, [])
+
+            if not requests:
+                return
+
+            self._notify(requests, self.run_cycle(pump,
+                                                  self.plan(pump, requests)))
+
+    def _notify(self, requests, watered):
+        for _, _, callback in requests:
+            if callback:
+                callback(watered)
+
+    def run_cycle(self, pump, steps):
+        """Water the zones of a planned cycle, blocking until done.
+
+        Returns True if the pump ran for the whole cycle.
+
+        """
+        total = sum(duration for _, duration in steps)
+        log("Watering {0} zone(s) of pump '{1}' in {2:.1f}s", len(steps),
+            pump.name, total, verbosity=2)
+
+        with gpio.batch():
+            steps[0][0].open()
+            run = pump.pump_timed(total)
+
+        if not run:
+            steps[0][0].close()
+            return False
+
+        try:
+            elapsed = 0.
+
+            for (valve, duration), (next_valve, _) in zip(steps, steps[1:]):
+                elapsed += duration
+
+                if self._wait_until(run, elapsed - self._valve_overlap):
+                    break
+
+                next_valve.open()
+
+                if self._wait_until(run, elapsed):
+                    break
+
+                valve.close()
+
+            run.wait()
+
+            return not run.cancelled and not self._cancelled.is_set()
+        finally:
+            # Close valves only after the pump has stopped
+            run.cancel()
+
+            with gpio.batch():
+                for valve, _ in steps:
+                    valve.close()
+
+    def _wait_until(self, run, offset):
+        """Wait until some seconds into a run, True if it ended early."""
+        timeout = offset - (run.duration - run.remaining)
+
+        if timeout > 0:
+            self._cancelled.wait(timeout)
+
+        return run.done or self._cancelled.is_set()
+
+    def cancel(self):
+        """Cancel all pending and running cycles."""
+        self._cancelled.set()
+
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+            requests = [request for requests in self._pending.values()
+                        for request in requests]
+            self._pending.clear()
+
+        self._notify(requests, False)
@@ -47,10 +47,7 @@ class Settings:
     @property
     def future(self):
         """Parameters that will be available in the future."""
-        return {
-            'warn_at_water_level',
-            'status_frequency'
-        }
+        return {}
 
     @property
     def handlers(self):
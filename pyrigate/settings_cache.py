@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""Validation of user settings with the result cached between runs.
+
+Validating the settings requires the schema library and the schemas in
+pyrigate.validation, which take a noticeable part of the start-up time of a
+Pi Zero. The validated settings are therefore written to a cache file next
+to the bytecode cache, keyed by the settings and the modules that define
+the schemas. As long as neither changes, start-up reads the cache instead
+of importing and running the validation.
+
+"""
+
+import json
+import os
+import sys
+
+import pyrigate
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(pyrigate.__file__))
+
+# Modules whose changes can change the result of validation
+_SCHEMA_MODULES = (
+    os.path.join(_PACKAGE_DIR, 'validation.py'),
+    os.path.join(_PACKAGE_DIR, 'units', 'quantity.py'),
+)
+
+CACHE_PATH = os.path.join(
+    _PACKAGE_DIR,
+    '__pycache__',
+    'settings.{0}.json'.format(sys.implementation.cache_tag)
+)
+
+
+def _cache_key(values):
+    # Like the bytecode cache, the schema modules are compared by their
+    # modification time and size, and the settings by their representation
+    key = [pyrigate.__version__, repr(values)]
+
+    for path in _SCHEMA_MODULES:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # No source to compare against, e.g. in a zip, so never reuse
+            return None
+
+        key.append([path, stat.st_mtime_ns, stat.st_size])
+
+    return key
+
+
+def _read_cache(key, path):
+    try:
+        with open(path) as fh:
+            cached = json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(cached, dict) or cached.get('key') != key:
+        return None
+
+    return cached.get('settings')
+
+
+def _write_cache(key, path, settings):
+    try:
+        text = json.dumps({'key': key, 'settings': settings})
+    except (TypeError, ValueError):
+        return
+
+    # Settings that do not survive a round trip, e.g. with tuples, would be
+    # read back differently
+    if json.loads(text)['settings'] != settings:
+        return
+
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(tmp_path, 'w') as fh:
+            fh.write(text)
+
+        os.replace(tmp_path, path)
+    except OSError:
+        # The package may be installed read-only, which only costs speed
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def validate_settings(values, path=CACHE_PATH):
+    """Validate user settings, reusing the cached result if unchanged.
+
+    Raises schema.SchemaError if the settings are invalid. Invalid settings
+    are never cached.
+
+    """
+    key = _cache_key(values)
+
+    if key is not None:
+        settings = _read_cache(key, path)
+
+        if settings is not None:
+            return settings
+
+    from pyrigate.validation import settings_schema
+
+    settings = settings_schema.validate(values)
+
+    if key is not None and not sys.dont_write_bytecode:
+        _write_cache(key, path, settings)
+
+    return settings
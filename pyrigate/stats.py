@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+
+"""Running daily, weekly, monthly and yearly statistics.
+
+Statistics are aggregated as events happen, so building a report only reads
+the aggregates of the reported period instead of scanning logs. Each period
+keeps the aggregates of the period in progress and of the one before it,
+which is what a status report sent at the start of a period covers.
+
+Metrics are aggregated per subject, e.g. per plant or per pump:
+
+    plant_volume   Millilitres requested per watering of a plant
+    missed_runs    Waterings of a plant that could not be carried out
+    pump_volume    Millilitres pumped per activation of a pump
+    pump_on_time   Seconds a pump was on per activation
+    sensor         Sampled readings of a sensor
+
+Statistics are kept in memory and saved to a JSON file by save, e.g. from a
+StatisticsJob, so recording never touches the disk.
+
+"""
+
+import datetime
+import json
+import os
+import threading
+import time
+
+from pyrigate.log import warn
+from pyrigate.user_settings import settings
+
+PERIODS = ('daily', 'weekly', 'monthly', 'yearly')
+
+METRICS = ('plant_volume', 'missed_runs', 'pump_volume', 'pump_on_time',
+           'sensor')
+
+
+def period_key(period, when):
+    """Return the key of the period containing a datetime, e.g. '2024-W07'.
+    """
+    if period == 'daily':
+        return when.strftime('%Y-%m-%d')
+    elif period == 'weekly':
+        year, week, _ = when.isocalendar()
+        return '{0}-W{1:02d}'.format(year, week)
+    elif period == 'monthly':
+        return when.strftime('%Y-%m')
+    elif period == 'yearly':
+        return when.strftime('%Y')
+
+    raise ValueError("Unknown period '{0}'".format(period))
+
+
+def previous_period_key(period, when):
+    """Return the key of the period before the one containing a datetime."""
+    if period == 'daily':
+        when -= datetime.timedelta(days=1)
+    elif period == 'weekly':
+        when -= datetime.timedelta(weeks=1)
+    elif period == 'monthly':
+        when = when.replace(day=1) - datetime.timedelta(days=1)
+    elif period == 'yearly':
+        when = when.replace(month=1, day=1) - datetime.timedelta(days=1)
+
+    return period_key(period, when)
+
+
+class Aggregate:
+    """Count, total, minimum and maximum of a series of values."""
+
+    __slots__ = ('count', 'total', 'min', 'max')
+
+    def __init__(self, count=0, total=0., min=None, max=None):
+        self.count = count
+        self.total = total
+        self.min = min
+        self.max = max
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def to_list(self):
+        return [self.count, self.total, self.min, self.max]
+
+
+class PeriodStatistics:
+    """Aggregates of every metric and subject during one period."""
+
+    def __init__(self, period, key, metrics=None, reported=False):
+        self.period = period
+        self.key = key
+        self.reported = reported
+        self._metrics = {
+            metric: {subject: Aggregate(*values)
+                     for subject, values in subjects.items()}
+            for metric, subjects in (metrics or {}).items()
+        }
+
+    def add(self, metric, subject, value):
+        subjects = self._metrics.setdefault(metric, {})
+        aggregate = subjects.get(subject)
+
+        if aggregate is None:
+            aggregate = subjects[subject] = Aggregate()
+
+        aggregate.add(value)
+
+    def subjects(self, metric):
+        """Return the aggregates of a metric by subject."""
+        return self._metrics.get(metric, {})
+
+    def get(self, metric, subject):
+        """Return the aggregate of a metric for a subject or an empty one."""
+        return self.subjects(metric).get(subject, Aggregate())
+
+    def summary(self):
+        """Return the statistics as a report-friendly dictionary."""
+        plants = {}
+
+        for subject in set(self.subjects('plant_volume')) |\
+                set(self.subjects('missed_runs')):
+            volume = self.get('plant_volume', subject)
+            plants[subject] = {
+                'volume': volume.total,
+                'runs': volume.count,
+                'missed_runs': self.get('missed_runs', subject).count,
+            }
+
+        pumps = {}
+
+        for subject in set(self.subjects('pump_volume')) |\
+                set(self.subjects('pump_on_time')):
+            on_time = self.get('pump_on_time', subject)
+            pumps[subject] = {
+                'volume': self.get('pump_volume', subject).total,
+                'activations': on_time.count,
+                'on_time': on_time.total,
+            }
+
+        sensors = {
+            subject: {
+                'samples': aggregate.count,
+                'min': aggregate.min,
+                'max': aggregate.max,
+                'mean': aggregate.mean,
+            }
+            for subject, aggregate in self.subjects('sensor').items()
+        }
+
+        return {
+            'period': self.period,
+            'key': self.key,
+            'plants': plants,
+            'pumps': pumps,
+            'sensors': sensors,
+        }
+
+    def to_dict(self):
+        return {
+            'period': self.period,
+            'key': self.key,
+            'reported': self.reported,
+            'metrics': {
+                metric: {subject: aggregate.to_list()
+                         for subject, aggregate in subjects.items()}
+                for metric, subjects in self._metrics.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(values['period'], values['key'], values['metrics'],
+                   values.get('reported', False))
+
+
+class Statistics:
+    """Running statistics of every period, persisted to a JSON file."""
+
+    def __init__(self, path=None, clock=time.time):
+        self._path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._current = {}
+        self._previous = {}
+        self._dirty = False
+
+        if path and os.path.exists(path):
+            self.load()
+
+    @property
+    def dirty(self):
+        """Return True if there are changes that have not been saved."""
+        return self._dirty
+
+    def _roll(self, period, now):
+        # Must be called with the lock held
+        key = period_key(period, now)
+        current = self._current.get(period)
+
+        if current is None or current.key != key:
+            previous_key = previous_period_key(period, now)
+
+            previous = self._previous.get(period)
+
+            if current is not None and current.key == previous_key:
+                self._previous[period] = current
+            elif previous is None or previous.key != previous_key:
+                # Nothing was recorded during the previous period
+                self._previous[period] = PeriodStatistics(period,
+                                                          previous_key)
+
+            current = self._current[period] = PeriodStatistics(period, key)
+            self._dirty = True
+
+        return current
+
+    def record(self, metric, subject, value=1.):
+        """Add a value to a metric of a subject in every period."""
+        with self._lock:
+            now = datetime.datetime.fromtimestamp(self._clock())
+
+            for period in PERIODS:
+                self._roll(period, now).add(metric, subject, value)
+
+            self._dirty = True
+
+    def current(self, period):
+        """Return the statistics of the period in progress."""
+        with self._lock:
+            now = datetime.datetime.fromtimestamp(self._clock())
+
+            return self._roll(period, now)
+
+    def previous(self, period):
+        """Return the statistics of the last completed period."""
+        with self._lock:
+            now = datetime.datetime.fromtimestamp(self._clock())
+            self._roll(period, now)
+
+            return self._previous[period]
+
+    def mark_reported(self, period, key):
+        """Mark the last completed period as reported if it has a key."""
+        with self._lock:
+            previous = self._previous.get(period)
+
+            if previous is not None and previous.key == key:
+                previous.reported = True
+                self._dirty = True
+
+    def load(self):
+        """Load statistics saved by an earlier run."""
+        try:
+            with open(self._path) as fh:
+                values = json.load(fh)
+
+            with self._lock:
+                for name, target in (('current', self._current),
+                                     ('previous', self._previous)):
+                    for period, stats in values.get(name, {}).items():
+                        target[period] = PeriodStatistics.from_dict(stats)
+        except (OSError, ValueError, KeyError, TypeError) as ex:
+            warn("Ignoring unreadable statistics in '{0}': {1}", self._path,
+                 ex)
+
+    def save(self):
+        """Save the statistics if they changed, returning True if saved.
+
+        Failing to write the file is only warned about, since statistics
+        are saved from jobs and on shutdown. They are saved again later.
+
+        """
+        if not self._path:
+            return False
+
+        with self._lock:
+            if not self._dirty:
+                return False
+
+            values = {
+                'current': {period: stats.to_dict()
+                            for period, stats in self._current.items()},
+                'previous': {period: stats.to_dict()
+                             for period, stats in self._previous.items()},
+            }
+            self._dirty = False
+
+        tmp_path = self._path + '.tmp'
+
+        try:
+            with open(tmp_path, 'w') as fh:
+                json.dump(values, fh)
+
+            os.replace(tmp_path, self._path)
+        except OSError as ex:
+            warn('Failed to save statistics: {0}', ex)
+
+            with self._lock:
+                self._dirty = True
+
+            return False
+
+        return True
+
+
+_statistics = None
+
+
+def get_statistics():
+    """Get the global statistics."""
+    global _statistics
+
+    if _statistics is None:
+        _statistics = Statistics(settings['statistics']['path'])
+
+    return _statistics
+
+
+def use_statistics(statistics):
+    """Record into other statistics, returning the previous ones."""
+    global _statistics
+    previous, _statistics = _statistics, statistics
+
+    return previous
+
+
+def record(metric, subject, value=1.):
+    """Record a value in the global statistics."""
+    get_statistics().record(metric, subject, value)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""Virtual water tank model."""
+
+import threading
+
+
+class TankModel:
+    """Tracks a water tank's level by integrating the volume pumped from it.
+
+    If a water level sensor is attached, its readings are fused with the
+    model using a scalar Kalman filter. Pumping grows the uncertainty of the
+    estimate in proportion to the pumped volume, and so do changes the model
+    cannot see, such as manual refills, before each sensor reading. Each
+    reading then shrinks it again. All volumes are in millilitres.
+
+    """
+
+    def __init__(self, capacity, level=None, flow_error=0.1,
+                 sensor_error=None, level_error=None, process_error=None):
+        """Initialise a tank, full unless an initial level is given.
+
+        flow_error is the relative uncertainty of the pumped volume and
+        sensor_error the standard deviation of a level sensor reading which
+        defaults to 5% of the capacity.
+
+        level_error is the standard deviation of the initial level. Since
+        the initial level is usually only assumed, it defaults to that of a
+        level anywhere between empty and full. process_error is the standard
+        deviation of unseen changes between sensor readings and defaults to
+        2% of the capacity.
+
+        """
+        if capacity <= 0:
+            raise ValueError('Tank capacity must be positive')
+
+        self._capacity = float(capacity)
+        self._level = self._clamp(capacity if level is None else level)
+        self._flow_error = flow_error
+        self._sensor_variance = (0.05 * capacity if sensor_error is None
+                                 else sensor_error) ** 2
+        self._variance = (capacity / 12 ** 0.5 if level_error is None
+                          else level_error) ** 2
+        self._process_variance = (0.02 * capacity if process_error is None
+                                  else process_error) ** 2
+        self._lock = threading.Lock()
+
+    def _clamp(self, level):
+        return min(max(float(level), 0.), self._capacity)
+
+    @property
+    def capacity(self):
+        """Return the capacity of the tank."""
+        return self._capacity
+
+    @property
+    def level(self):
+        """Return the estimated volume left in the tank."""
+        return self._level
+
+    @property
+    def fraction(self):
+        """Return the estimated fill level between 0 and 1."""
+        return self._level / self._capacity
+
+    @property
+    def uncertainty(self):
+        """Return the standard deviation of the level estimate."""
+        return self._variance ** 0.5
+
+    @property
+    def empty(self):
+        """Return True if the tank is estimated to be empty."""
+        return self._level <= 0.
+
+    def consume(self, volume):
+        """Account for some volume pumped out of the tank."""
+        with self._lock:
+            self._level = self._clamp(self._level - volume)
+            self._variance += (self._flow_error * volume) ** 2
+
+    def refill(self, level=None):
+        """Mark the tank as refilled, to full capacity by default."""
+        with self._lock:
+            self._level = self._clamp(self._capacity if level is None
+                                      else level)
+            self._variance = 0.
+
+    def observe(self, measurement):
+        """Fuse a water level sensor reading with the estimate."""
+        with self._lock:
+            self._variance += self._process_variance
+            gain = self._variance / (self._variance + self._sensor_variance)
+            self._level = self._clamp(
+                self._level + gain * (measurement - self._level)
+            )
+            self._variance *= 1. - gain
+
+    def __repr__(self):
+        return "{0}(level={1:.0f}/{2:.0f} mL)"\
+            .format(self.__class__.__name__, self._level, self._capacity)
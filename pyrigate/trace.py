@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+
+"""Compact binary traces of gpio writes, sensor reads and job dispatches.
+
+A trace starts with a magic header followed by variable-length records. Each
+record is a kind byte followed by the nanoseconds since the previous record
+and a small payload, with integers stored as unsigned varints. Sensor and job
+names are interned: a name record assigns the next id to a name the first
+time it is used.
+
+    gpio write    pin, value
+    gpio edge     pin, value    (edges seen by an edge callback)
+    sensor read   name id, raw value as a double (NaN for no value)
+    dispatch      name id, index of the job's schedule job
+
+Recording is started with start_recording, which routes gpio operations
+through a RecordingBackend. Traces are replayed by pyrigate.replay.
+
+"""
+
+import collections
+import math
+import struct
+import threading
+import time
+
+import pyrigate.gpio as gpio
+from pyrigate.gpio.backend import GpioBackend
+
+MAGIC = b'PYRGTRC1'
+
+NAME = 0
+GPIO_WRITE = 1
+GPIO_EDGE = 2
+SENSOR_READ = 3
+DISPATCH = 4
+
+KINDS = {
+    GPIO_WRITE: 'gpio-write',
+    GPIO_EDGE: 'gpio-edge',
+    SENSOR_READ: 'sensor-read',
+    DISPATCH: 'dispatch',
+}
+
+_DOUBLE = struct.Struct('<d')
+
+TraceEvent = collections.namedtuple('TraceEvent', 'ns kind key value')
+
+
+class TraceError(Exception):
+    pass
+
+
+def _varint(value):
+    data = bytearray()
+
+    while value > 0x7f:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+
+    data.append(value)
+
+    return data
+
+
+class TraceWriter:
+    """Writes trace records to a binary file object."""
+
+    def __init__(self, fileobj, clock=time.monotonic_ns):
+        self._file = fileobj
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._names = {}
+        self._start_ns = clock()
+        self._last_ns = self._start_ns
+        self.events = 0
+        self._file.write(MAGIC)
+
+    def _name_id(self, name):
+        # Must be called with the lock held
+        name_id = self._names.get(name)
+
+        if name_id is None:
+            name_id = self._names[name] = len(self._names)
+            encoded = name.encode('utf-8')
+            self._file.write(bytes([NAME]) + _varint(name_id) +
+                             _varint(len(encoded)) + encoded)
+
+        return name_id
+
+    def _write(self, kind, payload):
+        # Must be called with the lock held
+        now = self._clock()
+        delta, self._last_ns = max(0, now - self._last_ns), now
+        self._file.write(bytes([kind]) + _varint(delta) + payload)
+        self.events += 1
+
+    def gpio_write(self, pin, value):
+        with self._lock:
+            self._write(GPIO_WRITE, _varint(pin) + bytes([value]))
+
+    def gpio_writes(self, values):
+        with self._lock:
+            for pin, value in values.items():
+                self._write(GPIO_WRITE, _varint(pin) + bytes([value]))
+
+    def gpio_edge(self, pin, value):
+        with self._lock:
+            self._write(GPIO_EDGE, _varint(pin) + bytes([value]))
+
+    def sensor_read(self, name, value):
+        with self._lock:
+            name_id = self._name_id(name)
+            value = math.nan if value is None else float(value)
+            self._write(SENSOR_READ, _varint(name_id) + _DOUBLE.pack(value))
+
+    def dispatch(self, name, index):
+        with self._lock:
+            name_id = self._name_id(name)
+            self._write(DISPATCH, _varint(name_id) + _varint(index))
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class TraceReader:
+    """Reads the events of a binary trace."""
+
+    def __init__(self, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise TraceError('Not a pyrigate trace')
+
+        self._data = memoryview(data)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as fh:
+            return cls(fh.read())
+
+    def __iter__(self):
+        data = self._data
+        pos = len(MAGIC)
+        names = {}
+        ns = 0
+
+        def varint():
+            nonlocal pos
+            value, shift = 0, 0
+
+            while True:
+                byte = data[pos]
+                pos += 1
+                value |= (byte & 0x7f) << shift
+                shift += 7
+
+                if byte < 0x80:
+                    return value
+
+        try:
+            while pos < len(data):
+                kind = data[pos]
+                pos += 1
+
+                if kind == NAME:
+                    name_id, length = varint(), varint()
+                    names[name_id] = bytes(data[pos:pos + length])\
+                        .decode('utf-8')
+                    pos += length
+                    continue
+
+                ns += varint()
+
+                if kind in (GPIO_WRITE, GPIO_EDGE):
+                    pin = varint()
+                    yield TraceEvent(ns, kind, pin, data[pos])
+                    pos += 1
+                elif kind == SENSOR_READ:
+                    name = names[varint()]
+                    value, = _DOUBLE.unpack_from(data, pos)
+                    pos += _DOUBLE.size
+                    yield TraceEvent(ns, kind, name,
+                                     None if math.isnan(value) else value)
+                elif kind == DISPATCH:
+                    name = names[varint()]
+                    yield TraceEvent(ns, kind, name, varint())
+                else:
+                    raise TraceError('Unknown record kind {0} at offset {1}'
+                                     .format(kind, pos - 1))
+        except (IndexError, KeyError, struct.error):
+            raise TraceError('Truncated or corrupt trace at offset {0}'
+                             .format(pos))
+
+
+class RecordingBackend(GpioBackend):
+    """Gpio backend that records writes and edges before passing them on."""
+
+    def __init__(self, backend, writer):
+        self._backend = backend
+        self._writer = writer
+        self.name = backend.name
+        self.mocked = backend.mocked
+        self.supports_batch = backend.supports_batch
+        self.enforces_deadlines = backend.enforces_deadlines
+
+    @property
+    def backend(self):
+        """Return the backend being recorded."""
+        return self._backend
+
+    def init(self):
+        self._backend.init()
+
+    def setup(self, pin, direction, pull_up_down=gpio.PUD_OFF, initial=None):
+        self._backend.setup(pin, direction, pull_up_down=pull_up_down,
+                            initial=initial)
+
+    def output(self, pin, value):
+        self._writer.gpio_write(pin, value)
+        self._backend.output(pin, value)
+
+    def output_many(self, values):
+        self._writer.gpio_writes(values)
+        self._backend.output_many(values)
+
+    def output_for(self, pin, value, duration, final):
+        self._writer.gpio_write(pin, value)
+        self._backend.output_for(pin, value, duration, final)
+
+    def input(self, pin):
+        return self._backend.input(pin)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        def recorded_callback(pin):
+            self._writer.gpio_edge(pin, self._backend.input(pin))
+
+            if callback:
+                callback(pin)
+
+        self._backend.add_event_detect(pin, edge, callback=recorded_callback,
+                                       bouncetime=bouncetime)
+
+    def remove_event_detect(self, pin):
+        self._backend.remove_event_detect(pin)
+
+    def cleanup(self):
+        self._backend.cleanup()
+
+
+_writer = None
+
+
+def recording():
+    """Return True if a trace is being recorded."""
+    return _writer is not None
+
+
+def writer():
+    """Return the writer of the current trace or None."""
+    return _writer
+
+
+def start_recording(path_or_file):
+    """Record all gpio writes, sensor reads and job dispatches to a trace.
+
+    Edge callbacks registered before recording started are not recorded.
+
+    """
+    global _writer
+
+    if _writer:
+        raise TraceError('Already recording a trace')
+
+    if hasattr(path_or_file, 'write'):
+        fileobj = path_or_file
+    else:
+        fileobj = open(path_or_file, 'wb')
+
+    _writer = TraceWriter(fileobj)
+    gpio.use_backend(RecordingBackend(gpio.backend(), _writer))
+
+    return _writer
+
+
+def stop_recording():
+    """Stop recording and return the number of recorded events."""
+    global _writer
+
+    if not _writer:
+        return 0
+
+    backend = gpio.backend()
+
+    if isinstance(backend, RecordingBackend):
+        gpio.use_backend(backend.backend)
+
+    writer, _writer = _writer, None
+    writer.close()
+
+    return writer.events
+
+
+def record_sensor_read(name, value):
+    """Record a raw sensor reading if a trace is being recorded."""
+    if _writer:
+        _writer.sensor_read(name, value)
+
+
+def record_dispatch(name, index):
+    """Record that a job was dispatched if a trace is being recorded."""
+    if _writer:
+        _writer.dispatch(name, index)
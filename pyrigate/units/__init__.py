@@ -0,0 +1,10 @@
+from .quantity import (  # noqa: F401
+    convert_units,
+    duration_factor,
+    flow_rate_factor,
+    parse_duration,
+    parse_flow_rate,
+    parse_unit,
+    parse_volume,
+    volume_factor,
+)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""Parsing and conversion of volumes, flow rates and durations.
+
+All grammars are compiled once at import time and parsing is memoized, so
+repeated parsing of the same strings from settings and plant configurations
+costs a dictionary lookup. Parsed quantities are normalised to millilitres,
+millilitres per second and seconds respectively.
+
+"""
+
+import functools
+import re
+
+# Number of millilitres in each volume unit
+VOLUME_UNITS = {
+    'ml': 1.,
+    'cl': 10.,
+    'dl': 100.,
+    'l':  1000.
+}
+
+# Number of seconds in each duration unit
+DURATION_UNITS = {
+    'ms':      0.001,
+    's':       1.,
+    'sec':     1.,
+    'second':  1.,
+    'seconds': 1.,
+    'min':     60.,
+    'minute':  60.,
+    'minutes': 60.,
+    'h':       3600.,
+    'hour':    3600.,
+    'hours':   3600.
+}
+
+
+def _alternatives(units):
+    # Longest first so that e.g. 'ms' is not matched as 'm'
+    return '|'.join(sorted(units, key=len, reverse=True))
+
+
+_NUMBER = r'(\d+(?:\.\d+)?)'
+_VOLUME_UNIT = '({0})'.format(_alternatives(VOLUME_UNITS))
+_DURATION_UNIT = '({0})'.format(_alternatives(DURATION_UNITS))
+
+# Uncompiled patterns, e.g. for use in validation schemas
+VOLUME_PATTERN = r'^\s*{0}\s*{1}\s*$'.format(_NUMBER, _VOLUME_UNIT)
+FLOW_RATE_PATTERN = r'^\s*{0}\s*{1}\s*/\s*{2}\s*$'.format(_NUMBER,
+                                                          _VOLUME_UNIT,
+                                                          _DURATION_UNIT)
+DURATION_PATTERN = r'^\s*{0}\s*{1}\s*$'.format(_NUMBER, _DURATION_UNIT)
+
+_VOLUME_REGEX = re.compile(VOLUME_PATTERN, re.IGNORECASE)
+_FLOW_RATE_REGEX = re.compile(FLOW_RATE_PATTERN, re.IGNORECASE)
+_DURATION_REGEX = re.compile(DURATION_PATTERN, re.IGNORECASE)
+
+
+def _unit_factor(units, unit, kind):
+    try:
+        return units[unit.lower()]
+    except KeyError:
+        raise ValueError("Unknown {0} unit: '{1}'".format(kind, unit))
+
+
+def volume_factor(unit):
+    """Return the number of millilitres in a volume unit."""
+    return _unit_factor(VOLUME_UNITS, unit, 'volume')
+
+
+def duration_factor(unit):
+    """Return the number of seconds in a duration unit."""
+    return _unit_factor(DURATION_UNITS, unit, 'duration')
+
+
+def flow_rate_factor(unit):
+    """Return the factor converting a flow rate unit such as 'l/min' to ml/s.
+    """
+    try:
+        volume_unit, time_unit = unit.split('/')
+    except ValueError:
+        raise ValueError("Unknown flow rate unit: '{0}'".format(unit))
+
+    return volume_factor(volume_unit.strip()) /\
+        duration_factor(time_unit.strip())
+
+
+def convert_units(amount, from_unit, to_unit):
+    """Convert a volume from one unit to another."""
+    return amount * volume_factor(from_unit) / volume_factor(to_unit)
+
+
+@functools.lru_cache(maxsize=256)
+def parse_unit(unit_string):
+    """Split a volume string such as '0.1dl' into an amount and a unit.
+
+    Returns (None, None) if the string is not a valid volume.
+
+    """
+    m = _VOLUME_REGEX.match(unit_string)
+
+    if m:
+        return float(m.group(1)), m.group(2).lower()
+    else:
+        return None, None
+
+
+@functools.lru_cache(maxsize=256)
+def parse_volume(string):
+    """Parse a volume such as '0.1dl' or '1.5 L' into millilitres."""
+    m = _VOLUME_REGEX.match(string)
+
+    if not m:
+        raise ValueError("Not a valid amount: '{0}'".format(string))
+
+    return float(m.group(1)) * VOLUME_UNITS[m.group(2).lower()]
+
+
+@functools.lru_cache(maxsize=256)
+def parse_flow_rate(string):
+    """Parse a flow rate such as '1.2L/min' into millilitres per second."""
+    m = _FLOW_RATE_REGEX.match(string)
+
+    if not m:
+        raise ValueError("Unrecognised flow rate format: '{0}'"
+                         .format(string))
+
+    return float(m.group(1)) * VOLUME_UNITS[m.group(2).lower()] /\
+        DURATION_UNITS[m.group(3).lower()]
+
+
+@functools.lru_cache(maxsize=256)
+def parse_duration(string):
+    """Parse a duration such as '30s' or '2 min' into seconds."""
+    m = _DURATION_REGEX.match(string)
+
+    if not m:
+        raise ValueError("Not a valid duration: '{0}'".format(string))
+
+    return float(m.group(1)) * DURATION_UNITS[m.group(2).lower()]
@@ -3,10 +3,12 @@
 
 """pyrigate user settings."""
 
-import schema
 import sys
 
-from pyrigate.validation import settings_schema
+from pyrigate.settings_cache import validate_settings
+from pyrigate.lazy import lazy_import
+
+schema = lazy_import('schema')
 
 
 values = {
@@ -75,7 +77,7 @@ values = {
 # !!! USERS SHOULD NOT MODIFY ANYTHING BELOW THIS LINE !!!
 ##########################################################
 try:
-    settings = settings_schema.validate(values)
+    settings = validate_settings(values)
 except schema.SchemaError as ex:
     errors = [e for e in ex.autos + ex.errors if e]
     print('Failed to load settings: {0}'.format(' '.join(errors)))
@@ -2,10 +2,11 @@
 
 """."""
 
-import colorise
-
+from pyrigate.lazy import lazy_import
 from pyrigate.user_settings import settings
 
+colorise = lazy_import('colorise')
+
 
 def print_dict(
     dictionary,
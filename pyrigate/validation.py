@@ -6,6 +6,8 @@
 import re
 from schema import Schema, Optional, Use, And, Or, Regex
 
+from pyrigate.units.quantity import FLOW_RATE_PATTERN, VOLUME_PATTERN
+
 
 valid_status_frequencies = [
         'daily',
@@ -17,12 +19,28 @@ valid_status_frequencies = [
 valid_frequency = Use(str, lambda f: f in valid_status_frequencies)
 
 # Recognises volume amount such as '1dl' or '0.1 cl'
-valid_amount = Regex(r'^\d+(\.\d+)?\s*(ml|dl|cl|l)$', flags=re.IGNORECASE,
+valid_amount = Regex(VOLUME_PATTERN, flags=re.IGNORECASE,
                      error='Not a valid amount')
 
+# A piecewise-linear calibration curve of at least two [raw, value] points
+# with distinct raw values
+valid_calibration = Or(None, And(
+    And(
+        [And([Or(int, float)], lambda p: len(p) == 2)],
+        lambda c: len(c) >= 2,
+        error='Calibration must be a list of at least two [raw, value] points'
+    ),
+    And(
+        lambda c: len({p[0] for p in c}) == len(c),
+        error='Calibration points must have distinct raw values'
+    )
+))
+
 valid_time_format = Regex(r'^\d\d(:\d\d)?', error='Invalid time format')
 
-# valid_flow_rate = Regex()
+# Recognises flow rates such as '1.2L/min' or '20 ml/s'
+valid_flow_rate = Regex(FLOW_RATE_PATTERN, flags=re.IGNORECASE,
+                        error='Not a valid flow rate')
 
 # Schema for validating user settings
 settings_schema = Schema({
@@ -33,10 +51,35 @@ settings_schema = Schema({
     Optional('log_format',          default=''): str,
     Optional('log_dir',             default='./logs'): str,
     Optional('colors',              default=True): bool,
-    Optional('warn_at_water_level', default=-1.0): float,
+    Optional('warn_at_water_level', default=-1.0):
+        Or(float, And(str, valid_amount)),
     Optional('status_updates',      default=True): bool,
     Optional('status_frequency',    default='weekly'): valid_frequency,
     Optional('autoschedule',        default=False): bool,
+    Optional('gpio_backend',        default='auto'):
+        Or('auto', 'rpi', 'gpiod', 'sysfs', 'simulator'),
+    Optional('gpio_chip',           default='/dev/gpiochip0'): str,
+    Optional('relay_expander',      default=None): Or(None, {
+        'type': 'shift_register',
+        'chain_length': And(int, lambda n: n > 0),
+        Optional('base_pin', default=100): And(int, lambda p: p >= 0),
+        Optional('bus', default=0): int,
+        Optional('device', default=0): int
+    }, {
+        'type': 'mcp23017',
+        'addresses': And([int], lambda a: len(a) > 0),
+        Optional('base_pin', default=100): And(int, lambda p: p >= 0),
+        Optional('bus', default=1): int
+    }),
+    Optional('actuator', default={
+        'enabled': False,
+        'priority': 50,
+        'capacity': 256
+    }): {
+        Optional('enabled', default=False): bool,
+        Optional('priority', default=50): And(int, lambda p: 1 <= p <= 99),
+        Optional('capacity', default=256): And(int, lambda c: c > 0),
+    },
     Optional('email', default={}): {
         'sender': str,
         'subscribers': list,
@@ -44,20 +87,202 @@ settings_schema = Schema({
         'port': And(int, lambda p: p >= 0),
         Optional('use_ssl', default=True): bool,
     },
+    Optional('outbox', default={
+        'spool_dir': './outbox',
+        'batch_size': 20,
+        'max_attempts': 10,
+        'backoff': 30.0,
+        'max_backoff': 3600.0
+    }): {
+        Optional('spool_dir', default='./outbox'): str,
+        Optional('batch_size', default=20): And(int, lambda n: n > 0),
+        Optional('max_attempts', default=10): And(int, lambda n: n > 0),
+        Optional('backoff', default=30.0): And(Use(float), lambda s: s > 0),
+        Optional('max_backoff', default=3600.0):
+            And(Use(float), lambda s: s > 0),
+    },
+    Optional('notifications', default={
+        'dedup_window': 3600.0,
+        'rate_limit': 4,
+        'rate_period': 3600.0,
+        'digest_interval': 21600.0,
+        'max_digest_entries': 100
+    }): {
+        Optional('dedup_window', default=3600.0): Use(float),
+        Optional('rate_limit', default=4): And(int, lambda n: n > 0),
+        Optional('rate_period', default=3600.0):
+            And(Use(float), lambda s: s > 0),
+        Optional('digest_interval', default=21600.0):
+            And(Use(float), lambda s: s > 0),
+        Optional('max_digest_entries', default=100): And(int, lambda n: n > 0),
+    },
+    Optional('statistics', default={
+        'path': './statistics.json',
+        'save_interval': 300.0
+    }): {
+        Optional('path', default='./statistics.json'): Or(None, str),
+        Optional('save_interval', default=300.0):
+            And(Use(float), lambda s: s > 0),
+    },
+    Optional('reports', default={
+        'sinks': ['stdout', 'email'],
+        'time': '08:00',
+        'template': None,
+        'file_path': './reports/status.txt',
+        'file_max_bytes': 1048576,
+        'file_backups': 4,
+        'json_path': './reports/status.json'
+    }): {
+        Optional('sinks', default=['stdout', 'email']):
+            [Or('stdout', 'email', 'file', 'json')],
+        Optional('time', default='08:00'):
+            Regex(r'^([01]\d|2[0-3]):[0-5]\d$', error='Not a valid time'),
+        Optional('template', default=None): Or(None, str),
+        Optional('file_path', default='./reports/status.txt'): str,
+        Optional('file_max_bytes', default=1048576):
+            And(int, lambda n: n > 0),
+        Optional('file_backups', default=4): And(int, lambda n: n >= 0),
+        Optional('json_path', default='./reports/status.json'): str,
+    },
+    Optional('history', default={
+        'directory': './history',
+        'segment_records': 10000,
+        'max_segments': 20
+    }): {
+        Optional('directory', default='./history'): str,
+        Optional('segment_records', default=10000):
+            And(int, lambda n: n > 0),
+        Optional('max_segments', default=20): And(int, lambda n: n > 0),
+    },
+    Optional('scheduler', default={'max_sleep': None}): {
+        Optional('max_sleep', default=None):
+            Or(None, And(Use(float), lambda s: s > 0)),
+    },
+    Optional('watchdog', default={
+        'enabled': True,
+        'interval': None,
+        'lateness_budget': 5.0,
+        'max_runtime': 30.0,
+        'jobs': {}
+    }): {
+        Optional('enabled', default=True): bool,
+        Optional('interval', default=None):
+            Or(None, And(Use(float), lambda s: s > 0)),
+        Optional('lateness_budget', default=5.0):
+            And(Use(float), lambda s: s >= 0),
+        Optional('max_runtime', default=30.0):
+            And(Use(float), lambda s: s > 0),
+        Optional('jobs', default={}): {
+            str: {
+                Optional('lateness_budget'):
+                    And(Use(float), lambda s: s >= 0),
+                Optional('max_runtime'): And(Use(float), lambda s: s > 0),
+            }
+        },
+    },
+    Optional('profiler', default={
+        'rate': 100.0,
+        'max_depth': 64
+    }): {
+        Optional('rate', default=100.0): And(Use(float), lambda r: r > 0),
+        Optional('max_depth', default=64): And(int, lambda n: n > 0),
+    },
+    Optional('metrics', default={
+        'enabled': False,
+        'host': '127.0.0.1',
+        'port': 9464
+    }): {
+        Optional('enabled', default=False): bool,
+        Optional('host', default='127.0.0.1'): str,
+        Optional('port', default=9464): And(int, lambda p: 0 <= p < 65536),
+    },
+    Optional('api', default={
+        'enabled': False,
+        'host': '127.0.0.1',
+        'port': 8080,
+        'token': None,
+        'keep_alive': 15.0
+    }): {
+        Optional('enabled', default=False): bool,
+        Optional('host', default='127.0.0.1'): str,
+        Optional('port', default=8080): And(int, lambda p: 0 <= p < 65536),
+        Optional('token', default=None): Or(None, str),
+        Optional('keep_alive', default=15.0):
+            And(Use(float), lambda s: s > 0),
+    },
     Optional('pumps', default={}): {
         str: {
             'pin': And(int, lambda p: p >= 0),
-            'flow_rate': str
+            'flow_rate': And(str, valid_flow_rate),
+            Optional('tank', default=None): Or(None, {
+                'capacity': And(str, valid_amount),
+                Optional('level', default=None): Or(None,
+                                                    And(str, valid_amount)),
+                Optional('sensor', default=None): Or(None, str)
+            }),
+            Optional('zones', default={}): {
+                str: {
+                    'pin': And(int, lambda p: p >= 0),
+                    Optional('flow_rate', default=None):
+                        Or(None, And(str, valid_flow_rate))
+                }
+            },
+            Optional('flow_meter', default=None): Or(None, {
+                'pin': And(int, lambda p: p >= 0),
+                'pulses_per_litre': And(Use(float), lambda p: p > 0),
+                Optional('bouncetime', default=None): Or(None, int),
+                Optional('timeout', default=1.5):
+                    And(Use(float), lambda t: t >= 1),
+                Optional('recalibration_weight', default=0.2):
+                    And(Use(float), lambda w: 0 <= w <= 1)
+            })
         }
     },
     Optional('sensors', default={}): {
-        str: {
+        str: Or({
+            Optional('type', default='moisture'): Or('moisture',
+                                                     'water_level'),
             'pin': And(int, lambda p: p >= 0),
-            'threshold': str,
+            'threshold': Use(float),
             'trigger': str,
-            'analog': bool
-            }
-        }
+            'analog': bool,
+            Optional('calibration', default=None): valid_calibration
+            }, {
+            'type': 'ds18b20',
+            'device': And(str, lambda d: d.startswith('28-')),
+            Optional('threshold', default=None): Or(None, Use(float)),
+            Optional('calibration', default=None): valid_calibration
+            })
+        },
+    Optional('onewire', default={
+        'devices_dir': '/sys/bus/w1/devices',
+        'conversion_time': 0.75
+    }): {
+        Optional('devices_dir', default='/sys/bus/w1/devices'): str,
+        Optional('conversion_time', default=0.75): Use(float)
+    },
+    Optional('sequencer', default={
+        'batch_window': 2.0,
+        'valve_overlap': 0.5
+    }): {
+        Optional('batch_window', default=2.0):
+            And(Use(float), lambda w: w >= 0),
+        Optional('valve_overlap', default=0.5):
+            And(Use(float), lambda o: o >= 0)
+    },
+    Optional('sampling', default={
+        'floor_rate': 0.2,
+        'max_rate': 6.0,
+        'half_life': 900.0,
+        'variance_threshold': 0.01,
+        'window': 10
+    }): {
+        Optional('floor_rate', default=0.2): And(Use(float), lambda r: r > 0),
+        Optional('max_rate', default=6.0): And(Use(float), lambda r: r > 0),
+        Optional('half_life', default=900.0): And(Use(float), lambda h: h > 0),
+        Optional('variance_threshold', default=0.01): Use(float),
+        Optional('window', default=10): And(int, lambda w: w >= 2)
+    }
     })
 
 # Schema for validating json plant configurations
@@ -114,6 +339,7 @@ plant_configuration_schema = Schema({
     Optional('url', default='N/A'): str,
     'scheme': {
         'pump': str,
+        Optional('zone', default=None): Or(None, str),
         'amount': And(str, valid_amount),
         'when': [Or(when_on, when_each)]
     }
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""Solenoid valve controller class."""
+
+import pyrigate.gpio as gpio
+
+
+class Valve:
+    """Solenoid valve of a zone in a pump's manifold.
+
+    Like pumps, valves are driven through an active-low relay.
+
+    """
+
+    def __init__(self, name, pin, flow_rate=None):
+        """Initialise a closed valve.
+
+        flow_rate is the flow rate in ml/s through the valve's zone when it
+        differs from the pump's, e.g. because of narrower tubing.
+
+        """
+        self._name = name
+        self._pin = pin
+        self._flow_rate = flow_rate
+        self._open = False
+
+        gpio.setup(pin, gpio.OUT, initial=gpio.HIGH)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def pin(self):
+        """Return connecting GPIO pin."""
+        return self._pin
+
+    @property
+    def flow_rate(self):
+        """Return the zone's flow rate in ml/s or None."""
+        return self._flow_rate
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def open(self):
+        """Open the valve."""
+        gpio.output(self.pin, gpio.LOW)
+        self._open = True
+
+    def close(self):
+        """Close the valve."""
+        gpio.output(self.pin, gpio.HIGH)
+        self._open = False
+
+    def __repr__(self):
+        return "{0}(name='{1}', pin={2})"\
+            .format(self.__class__.__name__, self.name, self.pin)
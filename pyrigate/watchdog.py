@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+"""Scheduler lag instrumentation and a watchdog for late or slow jobs.
+
+Every job dispatch records when it was planned, when it actually started
+and how long it ran. Lateness (start - planned) and duration go into
+per-job histograms. The monitor also keeps the most recent dispatches of
+each thread, so it can tell which job was holding the thread while
+another job waited.
+
+A job is flagged when it starts later than its lateness budget or runs
+longer than its runtime budget. A Watchdog thread also checks between
+dispatches, so a job that never returns is flagged while it still runs,
+along with any jobs that are overdue because of it. The watchdog only wakes
+up when a budget can next be exceeded, so it costs nothing while no job is
+due.
+
+"""
+
+import collections
+import threading
+import time
+
+import schedule
+
+import pyrigate.metrics as metrics
+from pyrigate.log import log, warn
+from pyrigate.schedule_thread import add_waiter, remove_waiter
+from pyrigate.user_settings import settings
+
+SCHEDULER_LAG = metrics.histogram(
+    'pyrigate_scheduler_lag_seconds',
+    'Delay between when a job was due and when it was dispatched',
+    ('job',),
+    buckets=(.01, .1, .5, 1., 2., 5., 10., 30., 60.)
+)
+JOB_DURATION = metrics.histogram(
+    'pyrigate_job_duration_seconds',
+    'Time spent running a dispatched job',
+    ('job',),
+    buckets=(.001, .01, .05, .1, .5, 1., 5., 10., 30., 60.)
+)
+VIOLATIONS = metrics.counter(
+    'pyrigate_watchdog_violations_total',
+    'Jobs that started late or ran too long',
+    ('job', 'kind')
+)
+
+MAX_VIOLATIONS = 50
+
+# Budgets are exceeded strictly, so check a little after they run out
+CHECK_DELAY = 0.01
+
+
+class Dispatch:
+    """A single dispatch of a job."""
+
+    __slots__ = ('job', 'planned', 'start', 'end', 'thread', 'flagged')
+
+    def __init__(self, job, planned, start, thread):
+        self.job = job
+        self.planned = planned
+        self.start = start
+        self.end = None
+        self.thread = thread
+        self.flagged = False
+
+    @property
+    def lateness(self):
+        return 0. if self.planned is None else self.start - self.planned
+
+    def duration(self, now=None):
+        return (self.end if self.end is not None else now) - self.start
+
+
+class Violation:
+    """A job that started too late or ran for too long."""
+
+    def __init__(self, job, kind, seconds, budget, holders, when):
+        self.job = job
+        self.kind = kind
+        self.seconds = seconds
+        self.budget = budget
+        self.holders = holders
+        self.when = when
+
+    def describe(self):
+        if self.kind == 'late':
+            text = "Job '{0}' started {1:.1f}s late (budget {2:g}s)"
+        elif self.kind == 'overdue':
+            text = "Job '{0}' is {1:.1f}s overdue (budget {2:g}s)"
+        else:
+            text = "Job '{0}' ran for {1:.1f}s (budget {2:g}s)"
+
+        text = text.format(self.job, self.seconds, self.budget)
+
+        if self.holders:
+            text += ', the thread was busy with {0}'.format(', '.join(
+                "'{0}' ({1:.1f}s)".format(job, seconds)
+                for job, seconds in self.holders
+            ))
+
+        return text
+
+
+class DispatchMonitor:
+    """Records dispatches and flags jobs that exceed their budgets."""
+
+    def __init__(self, lateness_budget=5.0, max_runtime=30.0, jobs=None,
+                 history=32, clock=time.time):
+        """Initialise the monitor.
+
+        jobs maps job names to dictionaries with 'lateness_budget' and
+        'max_runtime' overriding the defaults for those jobs.
+
+        """
+        self._lateness_budget = lateness_budget
+        self._max_runtime = max_runtime
+        self._jobs = jobs or {}
+        self._history = history
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._active = {}
+        self._recent = collections.defaultdict(
+            lambda: collections.deque(maxlen=history)
+        )
+        self._last = {}
+        self._reported_overdue = {}
+        self.violations = collections.deque(maxlen=MAX_VIOLATIONS)
+
+    def budgets(self, job):
+        """Return the lateness and runtime budgets of a job."""
+        values = self._jobs.get(job) or {}
+
+        return (values.get('lateness_budget', self._lateness_budget),
+                values.get('max_runtime', self._max_runtime))
+
+    def begin(self, job, planned=None):
+        """Record that a job planned at some time started now."""
+        thread = threading.get_ident()
+
+        with self._lock:
+            dispatch = Dispatch(job, planned, self._clock(), thread)
+            self._active.setdefault(thread, []).append(dispatch)
+
+        lateness = dispatch.lateness
+
+        if planned is not None:
+            SCHEDULER_LAG.labels(job).observe(max(0., lateness))
+
+            if lateness > self.budgets(job)[0] and\
+                    self._reported_overdue.get(job) != planned:
+                self._violate(job, 'late', lateness,
+                              self.budgets(job)[0],
+                              self.holders(thread, planned, dispatch.start,
+                                           exclude=dispatch))
+
+        return dispatch
+
+    def end(self, dispatch):
+        """Record that a dispatch finished and return its duration."""
+        with self._lock:
+            dispatch.end = self._clock()
+            active = self._active.get(dispatch.thread, [])
+
+            if dispatch in active:
+                active.remove(dispatch)
+
+            self._recent[dispatch.thread].append(dispatch)
+            self._last[dispatch.job] = dispatch
+
+        duration = dispatch.duration()
+        JOB_DURATION.labels(dispatch.job).observe(duration)
+        max_runtime = self.budgets(dispatch.job)[1]
+
+        if duration > max_runtime and not dispatch.flagged:
+            dispatch.flagged = True
+            self._violate(dispatch.job, 'runtime', duration, max_runtime, [])
+
+        return duration
+
+    def holders(self, thread, since, until, exclude=None):
+        """Return the jobs that ran on a thread between two times.
+
+        Returns (job, seconds) for each dispatch overlapping the interval,
+        with the seconds the dispatch has run so far or in total.
+
+        """
+        with self._lock:
+            dispatches = list(self._recent[thread]) +\
+                list(self._active.get(thread, []))
+
+        return [
+            (dispatch.job, dispatch.duration(until))
+            for dispatch in dispatches
+            if dispatch is not exclude and dispatch.start < until and
+            (dispatch.end is None or dispatch.end > since)
+        ]
+
+    def active(self):
+        """Return the dispatches currently running."""
+        with self._lock:
+            return [dispatch for dispatches in self._active.values()
+                    for dispatch in dispatches]
+
+    def last(self, job):
+        """Return the last finished dispatch of a job or None."""
+        with self._lock:
+            return self._last.get(job)
+
+    def check(self, pending=()):
+        """Flag running jobs past their runtime and overdue pending jobs.
+
+        pending is a sequence of (job, planned) of jobs waiting to run.
+        Returns the new violations.
+
+        """
+        now = self._clock()
+        violations = []
+        active = self.active()
+        running = {(dispatch.job, dispatch.planned) for dispatch in active}
+
+        for dispatch in active:
+            max_runtime = self.budgets(dispatch.job)[1]
+            duration = dispatch.duration(now)
+
+            if duration > max_runtime and not dispatch.flagged:
+                dispatch.flagged = True
+                violations.append(self._violate(
+                    dispatch.job, 'runtime', duration, max_runtime, []
+                ))
+
+        for job, planned in pending:
+            lateness_budget = self.budgets(job)[0]
+
+            # A job keeps its planned time while it runs
+            if planned is None or now - planned <= lateness_budget or\
+                    (job, planned) in running or\
+                    self._reported_overdue.get(job) == planned:
+                continue
+
+            self._reported_overdue[job] = planned
+            holders = [(dispatch.job, dispatch.duration(now))
+                       for dispatch in active]
+            violations.append(self._violate(job, 'overdue', now - planned,
+                                            lateness_budget, holders))
+
+        return violations
+
+    def next_check(self, pending=()):
+        """Return the time at which the next budget runs out or None.
+
+        pending is a sequence of (job, planned) of jobs waiting to run. Only
+        budgets that have not been flagged yet are considered.
+
+        """
+        active = self.active()
+        running = {(dispatch.job, dispatch.planned) for dispatch in active}
+        deadlines = [dispatch.start + self.budgets(dispatch.job)[1]
+                     for dispatch in active if not dispatch.flagged]
+
+        for job, planned in pending:
+            if planned is not None and (job, planned) not in running and\
+                    self._reported_overdue.get(job) != planned:
+                deadlines.append(planned + self.budgets(job)[0])
+
+        return min(deadlines, default=None)
+
+    def _violate(self, job, kind, seconds, budget, holders):
+        violation = Violation(job, kind, seconds, budget, holders,
+                              self._clock())
+        self.violations.append(violation)
+        VIOLATIONS.labels(job, kind).inc()
+        warn(violation.describe().replace('{', '{{').replace('}', '}}'))
+
+        return violation
+
+
+def pending_jobs():
+    """Return (name, planned) of the jobs in the schedule."""
+    pending = []
+
+    for job in schedule.get_jobs():
+        # Jobs are scheduled through Job._do which binds Job._dispatch
+        owner = getattr(getattr(job.job_func, 'func', None), '__self__', None)
+
+        if owner is not None and job.next_run is not None:
+            pending.append((owner.name, job.next_run.timestamp()))
+
+    return pending
+
+
+class Watchdog(threading.Thread):
+    """Checks the monitor for slow, stuck or overdue jobs.
+
+    The thread sleeps until the next budget runs out, or until the schedule
+    changes, but at most interval seconds unless it is None.
+
+    """
+
+    def __init__(self, monitor, interval=None, clock=time.time):
+        super().__init__(name='pyrigate-watchdog', daemon=True)
+        self._monitor = monitor
+        self._interval = interval
+        self._clock = clock
+        self._wakeup = threading.Event()
+        self._cancelled = False
+
+    def _timeout(self):
+        deadline = self._monitor.next_check(pending_jobs())
+        timeout = self._interval
+
+        if deadline is not None:
+            remaining = max(0., deadline - self._clock()) + CHECK_DELAY
+            timeout = remaining if timeout is None else min(timeout,
+                                                            remaining)
+
+        return timeout
+
+    def run(self):
+        log('Starting watchdog', verbosity=2)
+        add_waiter(self._wakeup)
+
+        try:
+            while not self._cancelled:
+                self._wakeup.clear()
+
+                if not self._wakeup.wait(self._timeout()) and\
+                        not self._cancelled:
+                    self._monitor.check(pending_jobs())
+        finally:
+            remove_waiter(self._wakeup)
+
+    def cancel(self):
+        self._cancelled = True
+        self._wakeup.set()
+
+
+_monitor = None
+
+
+def get_monitor():
+    """Get the global dispatch monitor."""
+    global _monitor
+
+    if _monitor is None:
+        values = dict(settings['watchdog'])
+        values.pop('enabled')
+        values.pop('interval')
+        _monitor = DispatchMonitor(**values)
+
+    return _monitor
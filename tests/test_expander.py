@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the relay expander backends against a recording bus."""
+
+from pyrigate.gpio.backend import HIGH, LOW
+from pyrigate.gpio.expander import MockBus, Mcp23017Backend,\
+    ShiftRegisterBackend
+from pyrigate.gpio.simulator import SimulatorBackend
+
+
+def mcp23017(addresses=(0x20, 0x21)):
+    bus = MockBus()
+
+    return bus, Mcp23017Backend(bus, addresses, SimulatorBackend())
+
+
+def test_mcp23017_init_writes_latches_before_directions():
+    bus, backend = mcp23017()
+    backend.init()
+
+    # Latches high (relays off) for every expander before any port becomes
+    # an output
+    assert bus.frames == [
+        [(0x20, b'\x14\xff\xff'), (0x21, b'\x14\xff\xff')],
+        [(0x20, b'\x00\x00\x00'), (0x21, b'\x00\x00\x00')],
+    ]
+
+
+def test_mcp23017_output_many_is_one_transfer():
+    bus, backend = mcp23017()
+    backend.init()
+    del bus.frames[:]
+
+    backend.output_many({100: LOW, 109: LOW, 116: LOW})
+
+    assert bus.frames == [
+        [(0x20, b'\x14\xfe\xfd'), (0x21, b'\x14\xfe\xff')],
+    ]
+    assert backend.input(100) == 0
+    assert backend.input(101) == HIGH
+
+
+def test_mcp23017_unchanged_output_sends_nothing():
+    bus, backend = mcp23017()
+    backend.init()
+    del bus.frames[:]
+
+    backend.output_many({100: HIGH, 131: HIGH})
+
+    assert bus.frames == []
+
+
+def test_mcp23017_native_pins_bypass_the_bus():
+    native = SimulatorBackend()
+    bus = MockBus()
+    backend = Mcp23017Backend(bus, [0x20], native)
+    backend.init()
+    del bus.frames[:]
+
+    backend.output_many({17: LOW, 27: HIGH})
+
+    assert bus.frames == []
+    assert native.values == {17: LOW, 27: HIGH}
+
+
+def test_mcp23017_cleanup_turns_all_relays_off():
+    bus, backend = mcp23017()
+    backend.init()
+    backend.output_many({100: LOW, 120: LOW})
+    del bus.frames[:]
+
+    backend.cleanup()
+
+    assert bus.frames == [
+        [(0x20, b'\x14\xff\xff'), (0x21, b'\x14\xff\xff')],
+    ]
+
+
+def test_shift_register_frame_is_reversed():
+    bus = MockBus()
+    backend = ShiftRegisterBackend(bus, 2, SimulatorBackend())
+    backend.init()
+
+    backend.output(100, LOW)
+
+    assert bus.frames == [
+        [(None, b'\xff\xff')],
+        [(None, b'\xff\xfe')],
+    ]
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of metered pumping with a mock flow meter."""
+
+import pytest
+
+import pyrigate.gpio as gpio
+import pyrigate.stats as stats
+from pyrigate.flow_meter import FlowMeter, MockPulseSource
+from pyrigate.gpio.simulator import SimulatorBackend
+from pyrigate.pump import Pump
+from pyrigate.pump_runner import PumpRunner
+
+PIN = 4
+
+
+class FakeClock:
+    """Monotonic nanosecond clock that only moves when told to."""
+
+    def __init__(self):
+        self.now_ns = 0
+
+    def __call__(self):
+        return self.now_ns
+
+    def advance(self, seconds):
+        self.now_ns += int(seconds * 1e9)
+
+
+@pytest.fixture
+def simulator():
+    previous = gpio.backend()
+    simulator = SimulatorBackend()
+    gpio.use_backend(simulator)
+    previous_statistics = stats.use_statistics(stats.Statistics())
+
+    yield simulator
+
+    stats.use_statistics(previous_statistics)
+    gpio.use_backend(previous)
+
+
+@pytest.fixture
+def runner():
+    runner = PumpRunner()
+    yield runner
+    runner.stop()
+
+
+@pytest.fixture
+def source():
+    return MockPulseSource()
+
+
+@pytest.fixture
+def meter(source):
+    # One pulse per millilitre
+    meter = FlowMeter(source, 1000)
+    yield meter
+    meter.close()
+
+
+def test_metered_run_stops_at_target_volume(simulator, runner, source, meter):
+    pump = Pump('main', PIN, 10., runner=runner, flow_meter=meter)
+    run = pump.pump(50)
+
+    assert simulator.values[PIN] == gpio.LOW
+
+    source.emit(49)
+    assert not run.done
+
+    source.emit()
+    assert run.wait(2.0)
+    assert not run.cancelled
+    assert simulator.values[PIN] == gpio.HIGH
+    # Stopped by the meter long before the 7.5s timeout
+    assert run.on_time_ns < 2e9
+
+
+def test_metered_run_times_out_without_enough_flow(simulator, runner, source,
+                                                   meter):
+    pump = Pump('main', PIN, 1000., runner=runner, flow_meter=meter,
+                metered_timeout=1.5)
+    run = pump.pump(50)
+    source.emit(10)
+
+    assert run.wait(2.0)
+    assert not run.cancelled
+    assert simulator.values[PIN] == gpio.HIGH
+    assert run.on_time_ns >= 0.075e9
+
+    # A late pulse does not end a later run
+    source.emit(40)
+    assert not pump.runs
+
+
+def test_deactivation_recalibrates_flow_rate(simulator, source, meter):
+    clock = FakeClock()
+    runner = PumpRunner(clock=clock)
+    pump = Pump('main', PIN, 10., runner=runner, flow_meter=meter,
+                recalibration_weight=0.2)
+
+    pump.activate()
+    clock.advance(1.0)
+    source.emit(20)
+    assert pump.deactivate() == 1e9
+
+    assert pump.flow_rate == pytest.approx(0.8 * 10. + 0.2 * 20.)
+
+
+def test_no_flow_keeps_flow_rate(simulator, source, meter):
+    clock = FakeClock()
+    runner = PumpRunner(clock=clock)
+    pump = Pump('main', PIN, 10., runner=runner, flow_meter=meter)
+
+    pump.activate()
+    clock.advance(1.0)
+    pump.deactivate()
+
+    assert pump.flow_rate == 10.
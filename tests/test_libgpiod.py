@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the libgpiod backend against fake libgpiod v2 bindings."""
+
+import enum
+import sys
+import types
+
+import pytest
+
+from pyrigate.gpio.backend import HIGH, IN, LOW, OUT, PUD_UP, RISING
+
+
+class FakeRequest:
+    def __init__(self, config):
+        self.config = dict(config)
+        self.values = {pin: settings.kwargs.get('output_value')
+                       for pin, settings in config.items()}
+        self.released = False
+        self.set_calls = 0
+
+    def reconfigure_lines(self, config):
+        assert not self.released
+        self.config.update(config)
+
+    def set_value(self, pin, value):
+        self.set_values({pin: value})
+
+    def set_values(self, values):
+        assert not self.released
+        self.set_calls += 1
+        self.values.update(values)
+
+    def get_value(self, pin):
+        return self.values[pin]
+
+    def wait_edge_events(self, timeout):
+        return False
+
+    def release(self):
+        self.released = True
+
+
+@pytest.fixture
+def gpiod(monkeypatch):
+    line = types.ModuleType('gpiod.line')
+    line.Bias = enum.Enum('Bias', 'PULL_UP PULL_DOWN')
+    line.Direction = enum.Enum('Direction', 'INPUT OUTPUT')
+    line.Edge = enum.Enum('Edge', 'RISING FALLING BOTH')
+    line.Value = enum.Enum('Value', 'INACTIVE ACTIVE')
+
+    module = types.ModuleType('gpiod')
+    module.line = line
+    module.requests = []
+
+    class LineSettings:
+        def __init__(self, **kwargs):
+            self.kwargs = kwargs
+
+    def request_lines(chip, consumer, config):
+        request = FakeRequest(config)
+        module.requests.append(request)
+
+        return request
+
+    module.LineSettings = LineSettings
+    module.request_lines = request_lines
+    monkeypatch.setitem(sys.modules, 'gpiod', module)
+    monkeypatch.setitem(sys.modules, 'gpiod.line', line)
+
+    return module
+
+
+@pytest.fixture
+def backend(gpiod):
+    from pyrigate.gpio.libgpiod import LibgpiodBackend
+
+    backend = LibgpiodBackend()
+    yield backend
+    backend.cleanup()
+
+
+def test_setup_never_releases_driven_lines(gpiod, backend):
+    backend.setup(4, OUT, initial=HIGH)
+    backend.output(4, LOW)
+    backend.setup(17, OUT, initial=HIGH)
+    backend.setup(27, IN, pull_up_down=PUD_UP)
+
+    assert len(gpiod.requests) == 3
+    assert not any(request.released for request in gpiod.requests)
+    assert gpiod.requests[0].get_value(4) == gpiod.line.Value.INACTIVE
+
+
+def test_setup_again_reconfigures_in_place(gpiod, backend):
+    backend.setup(4, OUT, initial=HIGH)
+    backend.output(4, LOW)
+    backend.setup(4, OUT)
+
+    request, = gpiod.requests
+    assert not request.released
+    assert request.config[4].kwargs['output_value'] ==\
+        gpiod.line.Value.INACTIVE
+
+
+def test_output_many_sets_each_request_once(gpiod, backend):
+    backend.setup(4, OUT, initial=HIGH)
+    backend.setup(17, OUT, initial=HIGH)
+
+    backend.output_many({4: LOW, 17: LOW})
+
+    assert [request.set_calls for request in gpiod.requests] == [1, 1]
+    assert backend.input(4) == LOW
+    assert backend.input(17) == LOW
+
+
+def test_event_detection_reconfigures_in_place(gpiod, backend):
+    backend.setup(4, OUT, initial=HIGH)
+    backend.setup(27, IN, pull_up_down=PUD_UP)
+
+    backend.add_event_detect(27, RISING, bouncetime=10)
+    request = gpiod.requests[1]
+    assert request.config[27].kwargs['edge_detection'] ==\
+        gpiod.line.Edge.RISING
+
+    backend.remove_event_detect(27)
+    assert 'edge_detection' not in request.config[27].kwargs
+    assert request.config[27].kwargs['bias'] == gpiod.line.Bias.PULL_UP
+
+    assert len(gpiod.requests) == 2
+    assert not any(request.released for request in gpiod.requests)
+
+
+def test_cleanup_releases_all_lines(gpiod, backend):
+    backend.setup(4, OUT, initial=HIGH)
+    backend.add_event_detect(4, RISING)
+    backend.cleanup()
+
+    assert all(request.released for request in gpiod.requests)
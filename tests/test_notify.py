@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of alert digests."""
+
+from pyrigate.notify import Notifier
+from pyrigate.outbox import OutboxError
+
+SUBSCRIBER = 'gardener@localhost'
+
+
+class Mailer:
+    """Records sent mails and fails while broken."""
+
+    def __init__(self):
+        self.broken = False
+        self.mails = []
+
+    def __call__(self, subject, receivers, message):
+        if self.broken:
+            raise OutboxError('Cannot send mail')
+
+        self.mails.append((subject, receivers, message))
+
+
+def test_failed_digest_is_kept_for_the_next_flush():
+    mailer = Mailer()
+    notifier = Notifier(rate_limit=1, subscribers=[SUBSCRIBER], send=mailer,
+                        clock=lambda: 0.)
+
+    assert notifier.alert('low-water:main', 'Low water', 'Refill') == 'sent'
+    assert notifier.alert('low-water:main', 'Low water', 'Refill') ==\
+        'merged'
+
+    mailer.broken = True
+    assert notifier.flush_digests() == 0
+    assert notifier.pending() == {SUBSCRIBER: 1}
+
+    # Alerts digested after the failed flush are merged with the kept ones
+    notifier.alert('low-water:main', 'Low water', 'Refill now')
+    notifier.alert('dry:fern', 'Dry soil', 'Water the fern')
+
+    mailer.broken = False
+    assert notifier.flush_digests() == 1
+    assert notifier.pending() == {}
+
+    subject, receivers, message = mailer.mails[-1]
+    assert subject == 'Pyrigate alert digest (3 alerts)'
+    assert receivers == [SUBSCRIBER]
+    assert '2x Low water' in message
+    assert 'Refill now' in message
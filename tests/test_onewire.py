@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the 1-Wire bus driver against a fake w1 sysfs tree."""
+
+import pytest
+
+from pyrigate.sensors.onewire import OneWireBus, OneWireError
+
+W1_SLAVE = '72 01 4b 46 7f ff 0e 10 57 : crc=57 {0}\n'\
+    '72 01 4b 46 7f ff 0e 10 57 t={1}\n'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def devices(tmp_path):
+    master = tmp_path / 'w1_bus_master1'
+    master.mkdir()
+    (master / 'therm_bulk_read').write_text('1\n')
+
+    return tmp_path
+
+
+def add_probe(devices, probe, crc='YES', millidegrees=23125):
+    probe_dir = devices / probe
+    probe_dir.mkdir()
+    (probe_dir / 'w1_slave').write_text(W1_SLAVE.format(crc, millidegrees))
+
+    return probe_dir
+
+
+def create_bus(devices, **kwargs):
+    clock = FakeClock()
+    bus = OneWireBus(str(devices), clock=clock, sleep=clock.sleep, **kwargs)
+
+    return bus, clock
+
+
+def test_probes_are_listed_by_family(devices):
+    add_probe(devices, '28-000000000002')
+    add_probe(devices, '28-000000000001')
+    (devices / '10-000000000003').mkdir()
+    bus, _ = create_bus(devices)
+
+    assert bus.probes() == ['28-000000000001', '28-000000000002']
+
+
+def test_bulk_read_is_triggered(devices):
+    add_probe(devices, '28-000000000001')
+    bus, _ = create_bus(devices)
+
+    assert bus.trigger_conversion()
+    assert (devices / 'w1_bus_master1' / 'therm_bulk_read').read_text() ==\
+        'trigger\n'
+
+
+def test_no_bulk_read_support(tmp_path):
+    (tmp_path / 'w1_bus_master1').mkdir()
+    add_probe(tmp_path, '28-000000000001')
+    bus, _ = create_bus(tmp_path)
+
+    assert not bus.trigger_conversion()
+    assert bus.read_all() == {'28-000000000001': 23.125}
+
+
+def test_good_reading(devices):
+    add_probe(devices, '28-000000000001')
+    add_probe(devices, '28-000000000002', millidegrees=-1500)
+    bus, _ = create_bus(devices)
+
+    try:
+        assert bus.read_all() == {'28-000000000001': 23.125,
+                                  '28-000000000002': -1.5}
+    finally:
+        bus.close()
+
+
+def test_temperature_file_is_preferred(devices):
+    probe_dir = add_probe(devices, '28-000000000001', crc='NO')
+    (probe_dir / 'temperature').write_text('19500\n')
+    bus, _ = create_bus(devices)
+
+    assert bus.read_probe('28-000000000001') == 19.5
+
+
+def test_crc_failure_returns_none(devices):
+    add_probe(devices, '28-000000000001', crc='NO')
+    add_probe(devices, '28-000000000002')
+    bus, _ = create_bus(devices)
+
+    with pytest.raises(OneWireError):
+        bus.read_probe('28-000000000001')
+
+    try:
+        assert bus.read('28-000000000001') is None
+        assert bus.read('28-000000000002') == 23.125
+    finally:
+        bus.close()
+
+
+def test_missing_probe(devices):
+    add_probe(devices, '28-000000000001')
+    bus, _ = create_bus(devices)
+
+    try:
+        assert bus.read('28-000000000009') is None
+    finally:
+        bus.close()
+
+
+def test_probe_removed_between_listing_and_reading(devices):
+    probe_dir = add_probe(devices, '28-000000000001')
+    (probe_dir / 'w1_slave').unlink()
+    bus, _ = create_bus(devices)
+
+    try:
+        assert bus.read_all() == {'28-000000000001': None}
+    finally:
+        bus.close()
+
+
+def test_results_are_reused_within_max_age(devices):
+    probe_dir = add_probe(devices, '28-000000000001')
+    bus, clock = create_bus(devices, max_age=1.0)
+
+    try:
+        assert bus.read('28-000000000001') == 23.125
+
+        (probe_dir / 'w1_slave').write_text(W1_SLAVE.format('YES', 25000))
+        clock.now += 0.5
+        assert bus.read('28-000000000001') == 23.125
+
+        clock.now += 1.0
+        assert bus.read('28-000000000001') == 25.0
+    finally:
+        bus.close()
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the mail outbox against a local SMTP server."""
+
+import os
+import socketserver
+import threading
+
+import pytest
+
+from pyrigate.mail import open_smtp
+from pyrigate.outbox import MailOutbox, SpooledMail
+
+SENDER = 'pyrigate@localhost'
+RECEIVERS = ['gardener@localhost']
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        server = self.server
+
+        if server.refuse:
+            self.reply('421 Service not available')
+            return
+
+        server.sessions += 1
+        self.reply('220 localhost')
+
+        for line in self.rfile:
+            command = line.decode('ascii').strip().upper()
+
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+
+                for data in self.rfile:
+                    if data == b'.\r\n':
+                        break
+
+                server.messages.append(server.sessions)
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('500 Unknown command')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.refuse = False
+        self.sessions = 0
+        # The session each message was delivered in
+        self.messages = []
+
+
+class FakeClock:
+    """Wall clock that only moves when told to."""
+
+    def __init__(self, now=0.):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def server():
+    server = SMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def make_outbox(tmp_path, server, clock):
+    outboxes = []
+
+    def make(**kwargs):
+        port = server.server_address[1]
+        kwargs.setdefault('connect', lambda sender: open_smtp(
+            sender, server='localhost', port=port, timeout=5.0))
+        outbox = MailOutbox(str(tmp_path / 'outbox'), clock=clock, **kwargs)
+        outboxes.append(outbox)
+
+        return outbox
+
+    yield make
+
+    for outbox in outboxes:
+        outbox.stop()
+
+
+def spooled(outbox_dir):
+    return sorted(name for name in os.listdir(outbox_dir)
+                  if name.endswith('.json'))
+
+
+def test_mails_are_spooled_until_delivered(tmp_path, make_outbox, clock):
+    # Nothing is due before time zero
+    clock.now = -1.
+    outbox = make_outbox()
+    ids = [outbox.send('Subject', SENDER, RECEIVERS, 'Body {0}'.format(i))
+           for i in range(3)]
+
+    assert outbox.pending == 3
+    assert spooled(str(tmp_path / 'outbox')) ==\
+        [mail_id + '.json' for mail_id in ids]
+
+    outbox.stop()
+    restarted = make_outbox()
+
+    assert restarted.pending == 3
+
+
+def test_due_mails_are_delivered_in_one_session(tmp_path, server,
+                                                make_outbox, clock):
+    clock.now = -1.
+    outbox = make_outbox()
+
+    for i in range(3):
+        outbox.send('Subject', SENDER, RECEIVERS, 'Body {0}'.format(i))
+
+    clock.now = 0.
+    assert outbox.flush(5.0)
+
+    assert outbox.sent == 3
+    assert outbox.sessions == 1
+    assert server.messages == [1, 1, 1]
+    assert outbox.pending == 0
+    assert spooled(str(tmp_path / 'outbox')) == []
+
+
+def test_failed_delivery_is_retried_with_backoff(server, make_outbox, clock):
+    server.refuse = True
+    outbox = make_outbox(backoff=30.0)
+    outbox.send('Subject', SENDER, RECEIVERS, 'Body')
+
+    assert outbox.flush(5.0)
+    assert outbox.retries == 1
+    assert outbox.pending == 1
+    assert 24.0 <= outbox.next_attempt <= 30.0
+
+    server.refuse = False
+    clock.now = 30.0
+    assert outbox.flush(5.0)
+
+    assert outbox.sent == 1
+    assert outbox.pending == 0
+    assert server.messages == [1]
+
+
+def test_mail_is_given_up_after_max_attempts(tmp_path, server, make_outbox):
+    server.refuse = True
+    outbox = make_outbox(max_attempts=2, backoff=0.)
+    mail_id = outbox.send('Subject', SENDER, RECEIVERS, 'Body')
+
+    assert outbox.flush(5.0)
+
+    assert outbox.retries == 1
+    assert outbox.failed == 1
+    assert outbox.pending == 0
+    assert spooled(str(tmp_path / 'outbox')) == []
+    assert spooled(str(tmp_path / 'outbox' / 'failed')) ==\
+        [mail_id + '.json']
+
+
+def test_spool_error_does_not_stop_worker(monkeypatch, make_outbox, clock):
+    clock.now = -1.
+    outbox = make_outbox(connect=lambda sender: None, backoff=30.0)
+    outbox.send('Subject', SENDER, RECEIVERS, 'Body')
+
+    def full_disk(self, path):
+        raise OSError(28, 'No space left on device')
+
+    # Rescheduling the failed delivery cannot be written to the spool
+    monkeypatch.setattr(SpooledMail, 'save', full_disk)
+    clock.now = 0.
+
+    assert outbox.flush(5.0)
+    assert outbox.pending == 1
+    assert outbox._thread.is_alive()
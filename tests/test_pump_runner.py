@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of pump runs against the gpio simulator."""
+
+import datetime
+import time
+
+import pytest
+import schedule
+
+import pyrigate.gpio as gpio
+import pyrigate.stats as stats
+from pyrigate.gpio.simulator import SimulatorBackend
+from pyrigate.pump import Pump
+from pyrigate.pump_runner import PumpRunner
+from pyrigate.schedule_thread import ScheduleThread
+
+PIN = 4
+
+
+@pytest.fixture
+def simulator():
+    previous = gpio.backend()
+    simulator = SimulatorBackend()
+    gpio.use_backend(simulator)
+    previous_statistics = stats.use_statistics(stats.Statistics())
+
+    yield simulator
+
+    stats.use_statistics(previous_statistics)
+    gpio.use_backend(previous)
+
+
+@pytest.fixture
+def runner():
+    runner = PumpRunner()
+    yield runner
+    runner.stop()
+
+
+@pytest.fixture
+def scheduler():
+    schedule.clear()
+    yield
+    schedule.clear()
+
+
+def test_run_switches_pump_on_and_off(simulator, runner):
+    pump = Pump('main', PIN, 100., runner=runner)
+    run = pump.pump_timed(0.05)
+
+    assert simulator.values[PIN] == gpio.LOW
+    assert run.wait(2.0)
+    assert simulator.values[PIN] == gpio.HIGH
+
+
+def test_run_inside_blocking_batch_is_switched_off(simulator, runner):
+    pump = Pump('main', PIN, 100., runner=runner)
+
+    with gpio.batch():
+        run = pump.pump_timed(0.05)
+        # Blocks for longer than the run, e.g. a 1-Wire conversion
+        time.sleep(0.2)
+
+    assert run.done
+    assert simulator.values[PIN] == gpio.HIGH
+
+
+def test_tick_with_blocking_job_switches_pump_off(simulator, runner,
+                                                  scheduler):
+    pump = Pump('main', PIN, 100., runner=runner)
+    runs = []
+    past = datetime.datetime.now() - datetime.timedelta(seconds=1)
+
+    for job in (schedule.every().hour.do(lambda: runs.append(
+                    pump.pump_timed(0.05))),
+                schedule.every().hour.do(time.sleep, 0.2)):
+        job.next_run = past
+
+    ScheduleThread().tick()
+
+    assert runs[0].wait(2.0)
+    assert simulator.values[PIN] == gpio.HIGH
+    assert [values for _, values in simulator.records] ==\
+        [{PIN: gpio.LOW}, {PIN: gpio.HIGH}]
+
+
+def test_done_callback_of_finished_run_is_called(simulator, runner):
+    pump = Pump('main', PIN, 100., runner=runner)
+    run = pump.pump_timed(0.01)
+    assert run.wait(2.0)
+
+    finished = []
+    run.add_done_callback(finished.append)
+
+    assert finished == [run]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of saving running statistics."""
+
+from pyrigate.stats import Statistics
+
+
+def test_failed_save_is_retried(tmp_path):
+    # The directory is missing at first, e.g. an unmounted drive
+    path = tmp_path / 'data' / 'statistics.json'
+    statistics = Statistics(str(path))
+    statistics.record('pump_volume', 'main', 100.)
+
+    assert not statistics.save()
+
+    path.parent.mkdir()
+    assert statistics.save()
+    assert path.exists()
+    assert not statistics.save()